@@ -19,6 +19,8 @@ class MultiqcModule(BaseMultiqcModule):
     AfterQC module class
     """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
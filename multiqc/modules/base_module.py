@@ -12,11 +12,17 @@ import os
 import re
 import textwrap
 
-from multiqc.utils import report, config, util_functions
+from multiqc.utils import report, config, timings, util_functions
 logger = logging.getLogger(__name__)
 
 class BaseMultiqcModule(object):
 
+    # Modules that only get files through find_log_files() can start parsing while
+    # the file search is still running in the background (--discovery-streaming).
+    # Set this to True in modules that don't read report.files or report.searchfiles
+    # directly, otherwise the module waits until the whole search has finished.
+    streaming_safe = False
+
     def __init__(self, name='base', anchor='base', target=None, href=None, info=None, comment=None, extra=None,
                  autoformat=True, autoformat_type='markdown'):
 
@@ -74,6 +80,7 @@ class BaseMultiqcModule(object):
 
         # Old, depreciated syntax support. Likely to be removed in a future version.
         if isinstance(sp_key, dict):
+            report.wait_for_files()
             report.files[self.name] = list()
             for sf in report.searchfiles:
                 if report.search_file(sp_key, {'fn': sf[0], 'root': sf[1]}):
@@ -88,7 +95,8 @@ class BaseMultiqcModule(object):
             logger.warn("Did not understand find_log_files() search key")
             return
 
-        for f in report.files[sp_key]:
+        # Files are given as soon as they are found if searching in the background
+        for f in report.iter_files(sp_key):
 
             # If path_filters is given, skip unless match
             if path_filters is not None and len(path_filters) > 0:
@@ -101,6 +109,7 @@ class BaseMultiqcModule(object):
 
             # Make a sample name from the filename
             f['s_name'] = self.clean_s_name(f['fn'], f['root'])
+            timings.add_file(sp_key, f.get('filesize'))
             if filehandles or filecontents:
                 try:
                     with io.open (os.path.join(f['root'],f['fn']), "r", encoding='utf-8') as fh:
@@ -108,7 +117,8 @@ class BaseMultiqcModule(object):
                             f['f'] = fh
                             yield f
                         elif filecontents:
-                            f['f'] = fh.read()
+                            with timings.timed('find_log_files', sp_key):
+                                f['f'] = fh.read()
                             yield f
                 except (IOError, OSError, ValueError, UnicodeDecodeError):
                     if config.report_readerrors:
@@ -21,6 +21,8 @@ class MultiqcModule(BaseMultiqcModule):
     generated by BBMap.
     """
 
+    streaming_safe = True
+
     def __init__(self):
         super(MultiqcModule, self).__init__(
             name="BBTools",
@@ -20,6 +20,8 @@ class MultiqcModule(BaseMultiqcModule, StatsReportMixin):
     each script is split into its own file and adds a section to
     the module output if logs are found. """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
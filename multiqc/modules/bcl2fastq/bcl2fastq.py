@@ -9,6 +9,8 @@ from multiqc.plots import bargraph, table
 log = logging.getLogger(__name__)
 
 class MultiqcModule(BaseMultiqcModule):
+    streaming_safe = True
+
     def __init__(self):
         # Initialise the parent object
         super(MultiqcModule, self).__init__(name='bcl2fastq', anchor='bcl2fastq',
@@ -61,6 +61,8 @@ regexes = {
 
 class MultiqcModule(BaseMultiqcModule):
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
@@ -16,6 +16,8 @@ log = logging.getLogger(__name__)
 class MultiqcModule(BaseMultiqcModule):
     """ BUSCO module """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
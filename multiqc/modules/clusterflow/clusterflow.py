@@ -22,6 +22,8 @@ class MultiqcModule(BaseMultiqcModule):
     Cluster Flow module class, parses run logs.
     """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
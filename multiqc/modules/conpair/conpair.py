@@ -17,6 +17,8 @@ class MultiqcModule(BaseMultiqcModule):
     Conpair module class.
     """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
@@ -228,6 +228,8 @@ def custom_module_classes():
 class MultiqcModule(BaseMultiqcModule):
     """ Module class, used for each custom content type """
 
+    streaming_safe = True
+
     def __init__(self, c_id, mod):
 
         modname = mod['config'].get('section_name', c_id.replace('_', ' ').title())
@@ -284,6 +286,9 @@ class MultiqcModule(BaseMultiqcModule):
         else:
             log.warning("Error - custom content plot type '{}' not recognised for content ID {}".format(mod['config'].get('plot_type'), c_id))
 
+# Custom content only finds files with find_log_files(), so can start during a background search
+custom_module_classes.streaming_safe = True
+
 
 def _find_file_header(f):
     # Collect commented out header lines
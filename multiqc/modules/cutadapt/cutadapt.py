@@ -21,6 +21,8 @@ class MultiqcModule(BaseMultiqcModule):
     (which contain cutadapt logs)
     """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
@@ -13,6 +13,8 @@ log = logging.getLogger(__name__)
 
 class MultiqcModule(BaseMultiqcModule):
 
+    streaming_safe = True
+
     def __init__(self):
         # Initialise the parent object
         super(MultiqcModule, self).__init__(
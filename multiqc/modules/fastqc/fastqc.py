@@ -28,6 +28,8 @@ log = logging.getLogger(__name__)
 
 class MultiqcModule(BaseMultiqcModule):
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
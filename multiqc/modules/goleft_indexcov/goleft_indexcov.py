@@ -14,6 +14,8 @@ from multiqc.modules.base_module import BaseMultiqcModule
 log = logging.getLogger(__name__)
 
 class MultiqcModule(BaseMultiqcModule):
+    streaming_safe = True
+
     def __init__(self):
         super(MultiqcModule, self).__init__(name='goleft indexcov', anchor='goleft_indexcov',
                                             href='https://github.com/brentp/goleft/tree/master/indexcov',
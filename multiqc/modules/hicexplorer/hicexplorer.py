@@ -9,6 +9,8 @@ log = logging.getLogger(__name__)
 
 
 class MultiqcModule(BaseMultiqcModule):
+    streaming_safe = True
+
     def __init__(self):
         # Initialise the parent object
         super(MultiqcModule, self).__init__(name='HiCExplorer', anchor='hicexplorer',
@@ -17,6 +17,8 @@ log = logging.getLogger(__name__)
 class MultiqcModule(BaseMultiqcModule):
     """ HISAT2 module, parses stderr logs. """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
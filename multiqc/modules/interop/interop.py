@@ -10,6 +10,8 @@ import re
 log = logging.getLogger(__name__)
 
 class MultiqcModule(BaseMultiqcModule):
+    streaming_safe = True
+
     def __init__(self):
         # Initialise the parent object
         super(MultiqcModule, self).__init__(name='Illumina InterOp Statistics', anchor='interop',
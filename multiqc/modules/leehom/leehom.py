@@ -17,6 +17,8 @@ class MultiqcModule(BaseMultiqcModule):
     leeHom module class, parses stderr logs.
     """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
@@ -18,6 +18,8 @@ class MultiqcModule(BaseMultiqcModule):
     Peddy module class, parses stderr logs.
     """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
@@ -18,6 +18,8 @@ class MultiqcModule(BaseMultiqcModule):
     BamQC, RNASeq and Counts.. This module is split into separate
     files to reflect this and help with code organisation. """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
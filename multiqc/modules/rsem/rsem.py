@@ -18,6 +18,8 @@ class MultiqcModule(BaseMultiqcModule):
     RSEM module class, parses .cnt file .
     """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
@@ -17,6 +17,8 @@ class MultiqcModule(BaseMultiqcModule):
     into its own file and adds a section to the module ooutput if
     logs are found."""
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
@@ -19,6 +19,8 @@ class MultiqcModule(BaseMultiqcModule):
     Slamdunk module class, parses slamdunk logs.
     """
 
+    streaming_safe = True
+
     def __init__(self):
 
         # Initialise the parent object
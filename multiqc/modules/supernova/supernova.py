@@ -16,6 +16,8 @@ log = logging.getLogger(__name__)
 
 class MultiqcModule(BaseMultiqcModule):
 
+    streaming_safe = True
+
     def __init__(self):
         super(MultiqcModule, self).__init__(name='Supernova', anchor='supernova',
         href="https://www.10xgenomics.com/",
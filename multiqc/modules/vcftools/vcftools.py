@@ -16,6 +16,8 @@ log = logging.getLogger(__name__)
 
 
 class MultiqcModule(BaseMultiqcModule, Relatedness2Mixin, TsTvByCountMixin, TsTvByQualMixin, TsTvSummaryMixin):
+    streaming_safe = True
+
     def __init__(self):
         super(MultiqcModule, self).__init__(
             name='VCFTools',
@@ -3,10 +3,8 @@
 """ MultiQC functions to plot a bargraph """
 
 from __future__ import print_function
-import base64
 from collections import OrderedDict
 import inspect
-import io
 import logging
 import math
 import os
@@ -14,7 +12,7 @@ import random
 import re
 import sys
 
-from multiqc.utils import config, report, util_functions
+from multiqc.utils import config, report, util_functions, timings, plot_pool
 logger = logging.getLogger(__name__)
 
 try:
@@ -40,6 +38,7 @@ def get_template_mod():
         _template_mod = config.avail_templates[config.template].load()
     return _template_mod
 
+@timings.timed_function('plots')
 def plot (data, cats=None, pconfig=None):
     """ Plot a horizontal bar graph. Expects a 2D dict of sample
     data. Also can take info about categories. There are quite a
@@ -192,7 +191,7 @@ def highcharts_bargraph (plotdata, plotsamples=None, pconfig=None):
     # Sanitise plot ID and check for duplicates
     pconfig['id'] = report.save_htmlid(pconfig['id'])
 
-    html = '<div class="mqc_hcplot_plotgroup">'
+    html = ['<div class="mqc_hcplot_plotgroup">']
 
     # Counts / Percentages / Log Switches
     if pconfig.get('cpswitch') is not False or pconfig.get('logswitch') is True:
@@ -212,20 +211,20 @@ def highcharts_bargraph (plotdata, plotsamples=None, pconfig=None):
         c_label = pconfig.get('cpswitch_counts_label', 'Counts')
         p_label = pconfig.get('cpswitch_percent_label', 'Percentages')
         l_label = pconfig.get('logswitch_label', 'Log10')
-        html += '<div class="btn-group hc_switch_group"> \n'
-        html += '<button class="btn btn-default btn-sm {c_a}" data-action="set_numbers" data-target="{id}" data-ylab="{c_l}">{c_l}</button> \n'.format(id=pconfig['id'], c_a=c_active, c_l=c_label)
+        html.append('<div class="btn-group hc_switch_group"> \n')
+        html.append('<button class="btn btn-default btn-sm {c_a}" data-action="set_numbers" data-target="{id}" data-ylab="{c_l}">{c_l}</button> \n'.format(id=pconfig['id'], c_a=c_active, c_l=c_label))
         if pconfig.get('cpswitch', True) is True:
-            html += '<button class="btn btn-default btn-sm {p_a}" data-action="set_percent" data-target="{id}" data-ylab="{p_l}">{p_l}</button> \n'.format(id=pconfig['id'], p_a=p_active, p_l=p_label)
+            html.append('<button class="btn btn-default btn-sm {p_a}" data-action="set_percent" data-target="{id}" data-ylab="{p_l}">{p_l}</button> \n'.format(id=pconfig['id'], p_a=p_active, p_l=p_label))
         if pconfig.get('logswitch') is True:
-            html += '<button class="btn btn-default btn-sm {l_a}" data-action="set_log" data-target="{id}" data-ylab="{l_l}">{l_l}</button> \n'.format(id=pconfig['id'], l_a=l_active, l_l=l_label)
+            html.append('<button class="btn btn-default btn-sm {l_a}" data-action="set_log" data-target="{id}" data-ylab="{l_l}">{l_l}</button> \n'.format(id=pconfig['id'], l_a=l_active, l_l=l_label))
             pconfig['reversedStacks'] = True
-        html += '</div> '
+        html.append('</div> ')
         if len(plotdata) > 1:
-            html += ' &nbsp; &nbsp; '
+            html.append(' &nbsp; &nbsp; ')
 
     # Buttons to cycle through different datasets
     if len(plotdata) > 1:
-        html += '<div class="btn-group hc_switch_group">\n'
+        html.append('<div class="btn-group hc_switch_group">\n')
         for k, p in enumerate(plotdata):
             active = 'active' if k == 0 else ''
             try:
@@ -243,13 +242,13 @@ def highcharts_bargraph (plotdata, plotsamples=None, pconfig=None):
                 ymax = 'data-ymax="{}"'.format(pconfig['data_labels'][k]['ymax'])
             except:
                 ymax = ''
-            html += '<button class="btn btn-default btn-sm {a}" data-action="set_data" {y} {ym} data-newdata="{k}" data-target="{id}">{n}</button>\n'.format(a=active, id=pconfig['id'], n=name, y=ylab, ym=ymax, k=k)
-        html += '</div>\n\n'
+            html.append('<button class="btn btn-default btn-sm {a}" data-action="set_data" {y} {ym} data-newdata="{k}" data-target="{id}">{n}</button>\n'.format(a=active, id=pconfig['id'], n=name, y=ylab, ym=ymax, k=k))
+        html.append('</div>\n\n')
 
     # Plot HTML
-    html += """<div class="hc-plot-wrapper">
-        <div id="{id}" class="hc-plot not_rendered hc-bar-plot"><small>loading..</small></div>
-    </div></div>""".format(id=pconfig['id']);
+    html.append("""<div class="hc-plot-wrapper">
+        <div id="{id}" class="hc-plot not_rendered hc-bar-plot" data-plotdata="{id}"><small>loading..</small></div>
+    </div></div>""".format(id=pconfig['id']))
 
     report.num_hc_plots += 1
 
@@ -260,7 +259,7 @@ def highcharts_bargraph (plotdata, plotsamples=None, pconfig=None):
         'config': pconfig
     }
 
-    return html
+    return ''.join(html)
 
 
 def matplotlib_bargraph (plotdata, plotsamples, pconfig=None):
@@ -291,14 +290,10 @@ def matplotlib_bargraph (plotdata, plotsamples, pconfig=None):
         pid = report.save_htmlid(pid, skiplint=True)
         pids.append(pid)
 
-    html = '<p class="text-info"><small><span class="glyphicon glyphicon-picture" aria-hidden="true"></span> ' + \
+    html = ['<p class="text-info"><small><span class="glyphicon glyphicon-picture" aria-hidden="true"></span> ' + \
           'Flat image plot. Toolbox functions such as highlighting / hiding samples will not work ' + \
-          '(see the <a href="http://multiqc.info/docs/#flat--interactive-plots" target="_blank">docs</a>).</small></p>'
-    html += '<div class="mqc_mplplot_plotgroup" id="{}">'.format(pconfig['id'])
-
-    # Same defaults as HighCharts for consistency
-    default_colors = ['#7cb5ec', '#434348', '#90ed7d', '#f7a35c', '#8085e9',
-                      '#f15c80', '#e4d354', '#2b908f', '#f45b5b', '#91e8e1']
+          '(see the <a href="http://multiqc.info/docs/#flat--interactive-plots" target="_blank">docs</a>).</small></p>']
+    html.append('<div class="mqc_mplplot_plotgroup" id="{}">'.format(pconfig['id']))
 
     # Counts / Percentages Switch
     if pconfig.get('cpswitch') is not False and not config.simple_output:
@@ -311,16 +306,16 @@ def matplotlib_bargraph (plotdata, plotsamples, pconfig=None):
             pconfig['stacking'] = 'percent'
         c_label = pconfig.get('cpswitch_counts_label', 'Counts')
         p_label = pconfig.get('cpswitch_percent_label', 'Percentages')
-        html += '<div class="btn-group mpl_switch_group mqc_mplplot_bargraph_setcountspcnt"> \n\
+        html.append('<div class="btn-group mpl_switch_group mqc_mplplot_bargraph_setcountspcnt"> \n\
             <button class="btn btn-default btn-sm {c_a} counts">{c_l}</button> \n\
             <button class="btn btn-default btn-sm {p_a} pcnt">{p_l}</button> \n\
-        </div> '.format(c_a=c_active, p_a=p_active, c_l=c_label, p_l=p_label)
+        </div> '.format(c_a=c_active, p_a=p_active, c_l=c_label, p_l=p_label))
         if len(plotdata) > 1:
-            html += ' &nbsp; &nbsp; '
+            html.append(' &nbsp; &nbsp; ')
 
     # Buttons to cycle through different datasets
     if len(plotdata) > 1 and not config.simple_output:
-        html += '<div class="btn-group mpl_switch_group mqc_mplplot_bargraph_switchds">\n'
+        html.append('<div class="btn-group mpl_switch_group mqc_mplplot_bargraph_switchds">\n')
         for k, p in enumerate(plotdata):
             pid = pids[k]
             active = 'active' if k == 0 else ''
@@ -328,8 +323,8 @@ def matplotlib_bargraph (plotdata, plotsamples, pconfig=None):
                 name = pconfig['data_labels'][k]
             except:
                 name = k+1
-            html += '<button class="btn btn-default btn-sm {a}" data-target="#{pid}">{n}</button>\n'.format(a=active, pid=pid, n=name)
-        html += '</div>\n\n'
+            html.append('<button class="btn btn-default btn-sm {a}" data-target="#{pid}">{n}</button>\n'.format(a=active, pid=pid, n=name))
+        html.append('</div>\n\n')
 
     # Go through datasets creating plots
     for pidx, pdata in enumerate(plotdata):
@@ -366,132 +361,133 @@ def matplotlib_bargraph (plotdata, plotsamples, pconfig=None):
                 if pconfig.get('cpswitch_c_active', True) is not True:
                     hide_plot = True
 
-            # Set up figure
-            plt_height = len(plotsamples[pidx]) / 2.3
-            plt_height = max(6, plt_height) # At least 6" tall
-            plt_height = min(30, plt_height) # Cap at 30" tall
-            bar_width = 0.8
-
-            fig = plt.figure(figsize=(14, plt_height), frameon=False)
-            axes = fig.add_subplot(111)
-            y_ind = range(len(plotsamples[pidx]))
-
-            # Count totals for each sample
-            if plot_pct is True:
-                s_totals = [0 for _ in pdata[0]['data']]
-                for series_idx, d in enumerate(pdata):
-                    for sample_idx, v in enumerate(d['data']):
-                        s_totals[sample_idx] += v
-
-            # Plot bars
-            dlabels = []
-            for idx, d in enumerate(pdata):
-                # Plot percentages
-                values = d['data']
-                if len(values) < len(y_ind):
-                    values.extend([0] * (len(y_ind) - len(values)))
-                if plot_pct is True:
-                    for (key,var) in enumerate(values):
-                        s_total = s_totals[key]
-                        if s_total == 0:
-                            values[key] = 0
-                        else:
-                            values[key] = (float(var+0.0)/float(s_total))*100
-
-                # Get offset for stacked bars
-                if idx == 0:
-                    prevdata = [0] * len(plotsamples[pidx])
-                else:
-                    for i, p in enumerate(prevdata):
-                        prevdata[i] += pdata[idx-1]['data'][i]
-                # Default colour index
-                cidx = idx
-                while cidx >= len(default_colors):
-                    cidx -= len(default_colors)
-                # Save the name of this series
-                dlabels.append(d['name'])
-                # Add the series of bars to the plot
-                axes.barh(
-                    y_ind,
-                    values,
-                    bar_width,
-                    left = prevdata,
-                    color = d.get('color', default_colors[cidx]),
-                    align = 'center',
-                    linewidth = pconfig.get('borderWidth', 0)
-                )
-
-            # Tidy up axes
-            axes.tick_params(labelsize=8, direction='out', left=False, right=False, top=False, bottom=False)
-            axes.set_xlabel(pconfig.get('ylab', '')) # I know, I should fix the fact that the config is switched
-            axes.set_ylabel(pconfig.get('xlab', ''))
-            axes.set_yticks(y_ind) # Specify where to put the labels
-            axes.set_yticklabels(plotsamples[pidx]) # Set y axis sample name labels
-            axes.set_ylim((-0.5, len(y_ind)-0.5)) # Reduce padding around plot area
-            if plot_pct is True:
-                axes.set_xlim((0, 100))
-                # Add percent symbols
-                vals = axes.get_xticks()
-                axes.set_xticklabels(['{:.0f}%'.format(x) for x in vals])
-            else:
-                default_xlimits = axes.get_xlim()
-                axes.set_xlim((pconfig.get('ymin', default_xlimits[0]),pconfig.get('ymax', default_xlimits[1])))
-            if 'title' in pconfig:
-                top_gap = 1 + (0.5 / plt_height)
-                plt.text(0.5, top_gap, pconfig['title'], horizontalalignment='center', fontsize=16, transform=axes.transAxes)
-            axes.grid(True, zorder=0, which='both', axis='x', linestyle='-', color='#dedede', linewidth=1)
-            axes.set_axisbelow(True)
-            axes.spines['right'].set_visible(False)
-            axes.spines['top'].set_visible(False)
-            axes.spines['bottom'].set_visible(False)
-            axes.spines['left'].set_visible(False)
-            plt.gca().invert_yaxis() # y axis is reverse sorted otherwise
-
-            # Hide some labels if we have a lot of samples
-            show_nth = max(1, math.ceil(len(pdata[0]['data'])/150))
-            for idx, label in enumerate(axes.get_yticklabels()):
-                if idx % show_nth != 0:
-                    label.set_visible(False)
-
-            # Legend
-            bottom_gap = -1 * (1 - ((plt_height - 1.5) / plt_height))
-            lgd = axes.legend(dlabels, loc='lower center', bbox_to_anchor=(0, bottom_gap, 1, .102), ncol=5, mode='expand', fontsize=8, frameon=False)
-
             # Should this plot be hidden on report load?
             hidediv = ''
             if pidx > 0 or hide_plot:
                 hidediv = ' style="display:none;"'
 
-            # Save the plot to the data directory if export is requested
-            if config.export_plots:
-                for fformat in config.export_plot_formats:
-                    # Make the directory if it doesn't already exist
-                    plot_dir = os.path.join(config.plots_dir, fformat)
-                    if not os.path.exists(plot_dir):
-                        os.makedirs(plot_dir)
-                    # Save the plot
-                    plot_fn = os.path.join(plot_dir, '{}.{}'.format(pid, fformat))
-                    fig.savefig(plot_fn, format=fformat, bbox_extra_artists=(lgd,), bbox_inches='tight')
-
-            # Output the figure to a base64 encoded string
-            if getattr(get_template_mod(), 'base64_plots', True) is True:
-                img_buffer = io.BytesIO()
-                fig.savefig(img_buffer, format='png', bbox_inches='tight')
-                b64_img = base64.b64encode(img_buffer.getvalue()).decode('utf8')
-                img_buffer.close()
-                html += '<div class="mqc_mplplot" id="{}"{}><img src="data:image/png;base64,{}" /></div>'.format(pid, hidediv, b64_img)
+            # Draw the figure, in another process if flat plots are drawn in parallel
+            embed = getattr(get_template_mod(), 'base64_plots', True) is True
+            b64_img = plot_pool.add(pid, mpl_bargraph_figure, (pdata, plotsamples[pidx], pconfig, plot_pct), embed)
+
+            # Embed the base64 encoded image
+            if embed:
+                html.append('<div class="mqc_mplplot" id="{}"{}><img src="data:image/png;base64,{}" /></div>'.format(pid, hidediv, b64_img))
 
             # Link to the saved image
             else:
                 plot_relpath = os.path.join(config.plots_dir_name, 'png', '{}.png'.format(pid))
-                html += '<div class="mqc_mplplot" id="{}"{}><img src="{}" /></div>'.format(pid, hidediv, plot_relpath)
-
-            plt.close(fig)
+                html.append('<div class="mqc_mplplot" id="{}"{}><img src="{}" /></div>'.format(pid, hidediv, plot_relpath))
 
 
     # Close wrapping div
-    html += '</div>'
+    html.append('</div>')
 
     report.num_mpl_plots += 1
 
-    return html
+    return ''.join(html)
+
+
+def mpl_bargraph_figure (pdata, samples, pconfig, plot_pct):
+    """
+    Make the MatPlotLib figure for one dataset of a bar graph, as counts or
+    percentages. Returns the figure and the keyword arguments to save it with.
+    Used by plot_pool, so can be run in another process.
+    """
+    # Same defaults as HighCharts for consistency
+    default_colors = ['#7cb5ec', '#434348', '#90ed7d', '#f7a35c', '#8085e9',
+                      '#f15c80', '#e4d354', '#2b908f', '#f45b5b', '#91e8e1']
+
+    # Set up figure
+    plt_height = len(samples) / 2.3
+    plt_height = max(6, plt_height) # At least 6" tall
+    plt_height = min(30, plt_height) # Cap at 30" tall
+    bar_width = 0.8
+
+    fig = plt.figure(figsize=(14, plt_height), frameon=False)
+    axes = fig.add_subplot(111)
+    y_ind = range(len(samples))
+
+    # Count totals for each sample
+    if plot_pct is True:
+        s_totals = [0 for _ in samples]
+        for series_idx, d in enumerate(pdata):
+            for sample_idx, v in enumerate(d['data']):
+                s_totals[sample_idx] += v
+
+    # Plot bars
+    dlabels = []
+    for idx, d in enumerate(pdata):
+        # Plot percentages. Values are copied so that the plot data isn't changed
+        values = list(d['data'])
+        if len(values) < len(y_ind):
+            values.extend([0] * (len(y_ind) - len(values)))
+        if plot_pct is True:
+            for (key,var) in enumerate(values):
+                s_total = s_totals[key]
+                if s_total == 0:
+                    values[key] = 0
+                else:
+                    values[key] = (float(var+0.0)/float(s_total))*100
+
+        # Get offset for stacked bars
+        if idx == 0:
+            prevdata = [0] * len(samples)
+        else:
+            for i, p in enumerate(prevdata):
+                prevdata[i] += prevvalues[i]
+        prevvalues = values
+        # Default colour index
+        cidx = idx
+        while cidx >= len(default_colors):
+            cidx -= len(default_colors)
+        # Save the name of this series
+        dlabels.append(d['name'])
+        # Add the series of bars to the plot
+        axes.barh(
+            y_ind,
+            values,
+            bar_width,
+            left = prevdata,
+            color = d.get('color', default_colors[cidx]),
+            align = 'center',
+            linewidth = pconfig.get('borderWidth', 0)
+        )
+
+    # Tidy up axes
+    axes.tick_params(labelsize=8, direction='out', left=False, right=False, top=False, bottom=False)
+    axes.set_xlabel(pconfig.get('ylab', '')) # I know, I should fix the fact that the config is switched
+    axes.set_ylabel(pconfig.get('xlab', ''))
+    axes.set_yticks(y_ind) # Specify where to put the labels
+    axes.set_yticklabels(samples) # Set y axis sample name labels
+    axes.set_ylim((-0.5, len(y_ind)-0.5)) # Reduce padding around plot area
+    if plot_pct is True:
+        axes.set_xlim((0, 100))
+        # Add percent symbols
+        vals = axes.get_xticks()
+        axes.set_xticklabels(['{:.0f}%'.format(x) for x in vals])
+    else:
+        default_xlimits = axes.get_xlim()
+        axes.set_xlim((pconfig.get('ymin', default_xlimits[0]),pconfig.get('ymax', default_xlimits[1])))
+    if 'title' in pconfig:
+        top_gap = 1 + (0.5 / plt_height)
+        plt.text(0.5, top_gap, pconfig['title'], horizontalalignment='center', fontsize=16, transform=axes.transAxes)
+    axes.grid(True, zorder=0, which='both', axis='x', linestyle='-', color='#dedede', linewidth=1)
+    axes.set_axisbelow(True)
+    axes.spines['right'].set_visible(False)
+    axes.spines['top'].set_visible(False)
+    axes.spines['bottom'].set_visible(False)
+    axes.spines['left'].set_visible(False)
+    plt.gca().invert_yaxis() # y axis is reverse sorted otherwise
+
+    # Hide some labels if we have a lot of samples
+    show_nth = max(1, math.ceil(len(pdata[0]['data'])/150))
+    for idx, label in enumerate(axes.get_yticklabels()):
+        if idx % show_nth != 0:
+            label.set_visible(False)
+
+    # Legend
+    bottom_gap = -1 * (1 - ((plt_height - 1.5) / plt_height))
+    lgd = axes.legend(dlabels, loc='lower center', bbox_to_anchor=(0, bottom_gap, 1, .102), ncol=5, mode='expand', fontsize=8, frameon=False)
+
+    return fig, {'bbox_extra_artists': (lgd,), 'bbox_inches': 'tight'}
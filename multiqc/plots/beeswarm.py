@@ -5,13 +5,14 @@
 import logging
 import random
 
-from multiqc.utils import report
+from multiqc.utils import report, timings
 from multiqc.plots import table_object
 
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@timings.timed_function('plots')
 def plot (data, headers=None, pconfig=None):
     """ Helper HTML for a beeswarm plot.
     :param data: A list of data dicts
@@ -58,21 +59,9 @@ def make_plot(dt):
             });
 
             # Add the data
-            thisdata = []
-            these_snames = []
-            for (s_name, samp) in dt.data[idx].items():
-                if k in samp:
-
-                    val = samp[k]
-
-                    if 'modify' in header and callable(header['modify']):
-                        val = header['modify'](val)
-
-                    thisdata.append(val)
-                    these_snames.append(s_name)
-
-            data.append(thisdata)
-            s_names.append(these_snames)
+            column = dt.get_column(idx, k)
+            data.append(list(column.vals))
+            s_names.append(list(column.s_names))
 
     if len(s_names) == 0:
         logger.warning('Tried to make beeswarm plot, but had no data')
@@ -80,7 +69,7 @@ def make_plot(dt):
 
     # Plot HTML
     html = """<div class="hc-plot-wrapper">
-        <div id="{bid}" class="hc-plot not_rendered hc-beeswarm-plot"><small>loading..</small></div>
+        <div id="{bid}" class="hc-plot not_rendered hc-beeswarm-plot" data-plotdata="{bid}"><small>loading..</small></div>
     </div>""".format(bid=bs_id)
 
     report.num_hc_plots += 1
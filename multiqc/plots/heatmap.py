@@ -3,15 +3,18 @@
 """ MultiQC functions to plot a heatmap """
 
 from __future__ import print_function
+import base64
 import logging
+import numpy as np
 import random
 
-from multiqc.utils import report
+from multiqc.utils import config, report, timings
 
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@timings.timed_function('plots')
 def plot (data, xcats, ycats=None, pconfig=None):
     """ Plot a 2D heatmap.
     :param data: List of lists, each a representing a row of values.
@@ -40,11 +43,34 @@ def highcharts_heatmap (data, xcats, ycats, pconfig=None):
     if pconfig is None:
         pconfig = {}
 
+    max_cells = pconfig.get('max_cells', config.heatmap_max_cells)
+    pconfig['max_cells'] = max_cells
+
     # Reformat the data for highcharts
-    pdata = []
-    for i, arr in enumerate(data):
-        for j, val in enumerate(arr):
-            pdata.append([j,i,val])
+    try:
+        matrix, present = heatmap_matrix(data)
+    except (ValueError, TypeError) as e:
+        logger.debug("Could not make a NumPy matrix for heatmap: {}".format(e))
+        matrix = None
+        pdata = []
+        for i, arr in enumerate(data):
+            for j, val in enumerate(arr):
+                pdata.append([j,i,val])
+    else:
+        if pconfig.get('cluster'):
+            cluster_max = pconfig.get('cluster_max', config.heatmap_cluster_max)
+            matrix, present, xcats, ycats = cluster_matrix(matrix, present, xcats, ycats, cluster_max)
+        if matrix.size > max_cells:
+            # Too many cells to draw - the browser draws the means of blocks of cells instead
+            finite = matrix[np.isfinite(matrix)]
+            if len(finite) > 0:
+                if pconfig.get('min') is None:
+                    pconfig['min'] = float(finite.min())
+                if pconfig.get('max') is None:
+                    pconfig['max'] = float(finite.max())
+            pdata = None
+        else:
+            pdata = matrix_triples(matrix, present)
 
     # Get the plot ID
     if pconfig.get('id') is None:
@@ -60,21 +86,131 @@ def highcharts_heatmap (data, xcats, ycats, pconfig=None):
     html += """<div class="btn-group hc_switch_group">
         <button type="button" class="mqc_heatmap_sortHighlight btn btn-default btn-sm" data-target="#{id}" disabled="disabled">
             <span class="glyphicon glyphicon-sort-by-attributes-alt"></span> Sort by highlight
-        </button>
-    </div>""".format(id=pconfig['id'])
+        </button>""".format(id=pconfig['id'])
+    if pdata is None:
+        html += """
+        <button type="button" class="mqc_heatmap_overview btn btn-default btn-sm" data-target="#{id}" style="display:none;">
+            <span class="glyphicon glyphicon-zoom-out"></span> Back to overview
+        </button>""".format(id=pconfig['id'])
+    html += '\n    </div>'
 
     # The plot div
-    html += '<div class="hc-plot-wrapper"><div id="{id}" class="hc-plot not_rendered hc-heatmap"><small>loading..</small></div></div></div> \n'.format(id=pconfig['id'])
+    html += '<div class="hc-plot-wrapper"><div id="{id}" class="hc-plot not_rendered hc-heatmap" data-plotdata="{id}"><small>loading..</small></div></div></div> \n'.format(id=pconfig['id'])
 
     report.num_hc_plots += 1
 
-    report.plot_data[pconfig['id']] = {
-        'plot_type': 'heatmap',
-        'data': pdata,
-        'xcats': xcats,
-        'ycats': ycats,
-        'config': pconfig
-    }
+    if pdata is None:
+        # Little-endian float32 cells, row by row. Missing values are NaN.
+        report.plot_data[pconfig['id']] = {
+            'plot_type': 'heatmap',
+            'matrix': base64.b64encode(matrix.astype('<f4').tobytes()).decode('ascii'),
+            'shape': list(matrix.shape),
+            'xcats': xcats,
+            'ycats': ycats,
+            'config': pconfig
+        }
+    else:
+        report.plot_data[pconfig['id']] = {
+            'plot_type': 'heatmap',
+            'data': pdata,
+            'xcats': xcats,
+            'ycats': ycats,
+            'config': pconfig
+        }
 
     return html
 
+
+def heatmap_matrix(data):
+    """
+    Make a float matrix from a list of rows. Missing values are NaN.
+    Returns the matrix and a boolean matrix of which cells were given,
+    as rows can be different lengths.
+    """
+    num_cols = max([ len(row) for row in data ]) if len(data) > 0 else 0
+    matrix = np.full((len(data), num_cols), np.nan)
+    present = np.ones(matrix.shape, dtype=bool)
+    for i, row in enumerate(data):
+        matrix[i, :len(row)] = np.array(row, dtype=float)
+        present[i, len(row):] = False
+    return matrix, present
+
+
+def matrix_triples(matrix, present):
+    """ HighCharts [x, y, value] points for each cell, row by row """
+    ys, xs = np.nonzero(present)
+    vals = matrix[ys, xs]
+    return [ list(p) for p in zip(xs.tolist(), ys.tolist(), vals.tolist()) ]
+
+
+def cluster_matrix(matrix, present, xcats, ycats, cluster_max=None):
+    """
+    Reorder the rows and columns of a heatmap with hierarchical clustering.
+    Square matrices with the same x and y labels (eg. correlations) keep the
+    same order on both axes, so that the diagonal stays in place. Clustering
+    needs memory for every pair of rows, so axes with more than cluster_max
+    rows or columns keep their order.
+    """
+    filled = np.where(np.isfinite(matrix), matrix, 0)
+    def axis_order(vals, axis_name):
+        if cluster_max is not None and vals.shape[0] > cluster_max:
+            logger.warning("Not clustering heatmap {} as there are more than {} (heatmap_cluster_max)".format(axis_name, cluster_max))
+            return np.arange(vals.shape[0])
+        return cluster_order(vals)
+    row_order = axis_order(filled, 'rows')
+    if matrix.shape[0] == matrix.shape[1] and list(xcats) == list(ycats):
+        col_order = row_order
+    else:
+        col_order = axis_order(filled.T, 'columns')
+    matrix = matrix[row_order][:, col_order]
+    present = present[row_order][:, col_order]
+    xcats = [ xcats[i] for i in col_order ] if len(xcats) == len(col_order) else xcats
+    ycats = [ ycats[i] for i in row_order ] if len(ycats) == len(row_order) else ycats
+    return matrix, present, xcats, ycats
+
+
+def cluster_order(vals):
+    """
+    Order of the rows of a matrix after average linkage hierarchical
+    clustering with euclidean distances, reading the leaves of the tree
+    from left to right.
+    """
+    n = vals.shape[0]
+    if n < 3:
+        return np.arange(n)
+    # Pairwise euclidean distances
+    sq = (vals * vals).sum(axis=1)
+    dist = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2 * vals.dot(vals.T), 0))
+    np.fill_diagonal(dist, np.inf)
+    # Closest cluster to each cluster
+    nearest = dist.argmin(axis=1)
+    nearest_dist = dist[np.arange(n), nearest]
+    sizes = np.ones(n)
+    active = np.ones(n, dtype=bool)
+    leaves = [ [i] for i in range(n) ]
+    for step in range(n - 1):
+        i = int(nearest_dist.argmin())
+        j = int(nearest[i])
+        # Merge cluster j into cluster i, with the size-weighted mean distances
+        merged = (sizes[i] * dist[i] + sizes[j] * dist[j]) / (sizes[i] + sizes[j])
+        merged[i] = np.inf
+        merged[~active] = np.inf
+        dist[i, :] = merged
+        dist[:, i] = merged
+        dist[j, :] = np.inf
+        dist[:, j] = np.inf
+        sizes[i] += sizes[j]
+        active[j] = False
+        leaves[i] = leaves[i] + leaves[j]
+        leaves[j] = None
+        nearest_dist[j] = np.inf
+        # Find new nearest clusters for rows that pointed at i or j, or are now closer to i
+        stale = active & ((nearest == i) | (nearest == j))
+        stale[i] = True
+        for k in np.nonzero(stale)[0]:
+            nearest[k] = dist[k].argmin()
+            nearest_dist[k] = dist[k, nearest[k]]
+        closer = active & (merged < nearest_dist)
+        nearest[closer] = i
+        nearest_dist[closer] = merged[closer]
+    return np.array(leaves[int(np.nonzero(active)[0][0])])
@@ -4,14 +4,14 @@
 
 from __future__ import print_function
 from collections import OrderedDict
-import base64
 import io
 import logging
+import numpy as np
 import os
 import random
 import sys
 
-from multiqc.utils import config, report, util_functions
+from multiqc.utils import config, report, util_functions, timings, plot_pool
 logger = logging.getLogger(__name__)
 
 try:
@@ -37,6 +37,7 @@ def get_template_mod():
         _template_mod = config.avail_templates[config.template].load()
     return _template_mod
 
+@timings.timed_function('plots')
 def plot (data, pconfig=None):
     """ Plot a line graph with X,Y data.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -166,11 +167,11 @@ def highcharts_linegraph (plotdata, pconfig=None):
     pconfig['id'] = report.save_htmlid(pconfig['id'])
 
     # Build the HTML for the page
-    html = '<div class="mqc_hcplot_plotgroup">'
+    html = ['<div class="mqc_hcplot_plotgroup">']
 
     # Buttons to cycle through different datasets
     if len(plotdata) > 1:
-        html += '<div class="btn-group hc_switch_group">\n'
+        html.append('<div class="btn-group hc_switch_group">\n')
         for k, p in enumerate(plotdata):
             active = 'active' if k == 0 else ''
             try:
@@ -189,11 +190,11 @@ def highcharts_linegraph (plotdata, pconfig=None):
                 xlab = 'data-xlab="{}"'.format(pconfig['data_labels'][k]['xlab'])
             except:
                 xlab = ''
-            html += '<button class="btn btn-default btn-sm {a}" data-action="set_data" {y} {ym} {x} data-newdata="{k}" data-target="{id}">{n}</button>\n'.format(a=active, id=pconfig['id'], n=name, y=ylab, ym=ymax, x=xlab, k=k)
-        html += '</div>\n\n'
+            html.append('<button class="btn btn-default btn-sm {a}" data-action="set_data" {y} {ym} {x} data-newdata="{k}" data-target="{id}">{n}</button>\n'.format(a=active, id=pconfig['id'], n=name, y=ylab, ym=ymax, x=xlab, k=k))
+        html.append('</div>\n\n')
 
     # The plot div
-    html += '<div class="hc-plot-wrapper"><div id="{id}" class="hc-plot not_rendered hc-line-plot"><small>loading..</small></div></div></div> \n'.format(id=pconfig['id'])
+    html.append('<div class="hc-plot-wrapper"><div id="{id}" class="hc-plot not_rendered hc-line-plot" data-plotdata="{id}"><small>loading..</small></div></div></div> \n'.format(id=pconfig['id']))
 
     report.num_hc_plots += 1
 
@@ -203,7 +204,7 @@ def highcharts_linegraph (plotdata, pconfig=None):
         'config': pconfig
     }
 
-    return html
+    return ''.join(html)
 
 
 def matplotlib_linegraph (plotdata, pconfig=None):
@@ -233,18 +234,14 @@ def matplotlib_linegraph (plotdata, pconfig=None):
         pid = report.save_htmlid(pid, skiplint=True)
         pids.append(pid)
 
-    html = '<p class="text-info"><small><span class="glyphicon glyphicon-picture" aria-hidden="true"></span> ' + \
+    html = ['<p class="text-info"><small><span class="glyphicon glyphicon-picture" aria-hidden="true"></span> ' + \
           'Flat image plot. Toolbox functions such as highlighting / hiding samples will not work ' + \
-          '(see the <a href="http://multiqc.info/docs/#flat--interactive-plots" target="_blank">docs</a>).</small></p>'
-    html += '<div class="mqc_mplplot_plotgroup" id="{}">'.format(pconfig['id'])
-
-    # Same defaults as HighCharts for consistency
-    default_colors = ['#7cb5ec', '#434348', '#90ed7d', '#f7a35c', '#8085e9',
-                      '#f15c80', '#e4d354', '#2b908f', '#f45b5b', '#91e8e1']
+          '(see the <a href="http://multiqc.info/docs/#flat--interactive-plots" target="_blank">docs</a>).</small></p>']
+    html.append('<div class="mqc_mplplot_plotgroup" id="{}">'.format(pconfig['id']))
 
     # Buttons to cycle through different datasets
     if len(plotdata) > 1 and not config.simple_output:
-        html += '<div class="btn-group mpl_switch_group mqc_mplplot_bargraph_switchds">\n'
+        html.append('<div class="btn-group mpl_switch_group mqc_mplplot_bargraph_switchds">\n')
         for k, p in enumerate(plotdata):
             pid = pids[k]
             active = 'active' if k == 0 else ''
@@ -252,8 +249,8 @@ def matplotlib_linegraph (plotdata, pconfig=None):
                 name = pconfig['data_labels'][k]['name']
             except:
                 name = k+1
-            html += '<button class="btn btn-default btn-sm {a}" data-target="#{pid}">{n}</button>\n'.format(a=active, pid=pid, n=name)
-        html += '</div>\n\n'
+            html.append('<button class="btn btn-default btn-sm {a}" data-target="#{pid}">{n}</button>\n'.format(a=active, pid=pid, n=name))
+        html.append('</div>\n\n')
 
     # Go through datasets creating plots
     for pidx, pdata in enumerate(plotdata):
@@ -283,163 +280,164 @@ def matplotlib_linegraph (plotdata, pconfig=None):
 
         # Custom tsv output if the x axis varies
         if not sharedcats and config.data_format == 'tsv':
-            fout = ''
+            fout = list()
             for d in pdata:
-                fout += "\t"+"\t".join([str(x[0]) for x in d['data']])
-                fout += "\n{}\t".format(d['name'])
-                fout += "\t".join([str(x[1]) for x in d['data']])
-                fout += "\n"
+                fout.append("\t"+"\t".join([str(x[0]) for x in d['data']]))
+                fout.append("\n{}\t".format(d['name']))
+                fout.append("\t".join([str(x[1]) for x in d['data']]))
+                fout.append("\n")
+            fout = ''.join(fout)
             with io.open (os.path.join(config.data_dir, '{}.txt'.format(pid)), 'w', encoding='utf-8') as f:
                 print( fout.encode('utf-8', 'ignore').decode('utf-8'), file=f )
         else:
             util_functions.write_data_file(fdata, pid)
 
-        # Set up figure
-        fig = plt.figure(figsize=(14, 6), frameon=False)
-        axes = fig.add_subplot(111)
+        # Should this plot be hidden on report load?
+        hidediv = ''
+        if pidx > 0:
+            hidediv = ' style="display:none;"'
 
-        # Go through data series
-        for idx, d in enumerate(pdata):
+        # Draw the figure, in another process if flat plots are drawn in parallel
+        embed = getattr(get_template_mod(), 'base64_plots', True) is True
+        b64_img = plot_pool.add(pid, mpl_linegraph_figure, (pdata, pconfig, pidx), embed)
 
-            # Default colour index
-            cidx = idx
-            while cidx >= len(default_colors):
-                cidx -= len(default_colors)
+        # Embed the base64 encoded image
+        if embed:
+            html.append('<div class="mqc_mplplot" id="{}"{}><img src="data:image/png;base64,{}" /></div>'.format(pid, hidediv, b64_img))
 
-            # Line style
-            linestyle = 'solid'
-            if d.get('dashStyle', None) == 'Dash':
-                linestyle = 'dashed'
+        # Save to a file and link <img>
+        else:
+            plot_relpath = os.path.join(config.plots_dir_name, 'png', '{}.png'.format(pid))
+            html.append('<div class="mqc_mplplot" id="{}"{}><img src="{}" /></div>'.format(pid, hidediv, plot_relpath))
 
-            # Reformat data (again)
-            try:
-                axes.plot([x[0] for x in d['data']], [x[1] for x in d['data']], label=d['name'], color=d.get('color', default_colors[cidx]), linestyle=linestyle, linewidth=1, marker=None)
-            except TypeError:
-                # Categorical data on x axis
-                axes.plot(d['data'], label=d['name'], color=d.get('color', default_colors[cidx]), linewidth=1, marker=None)
 
-        # Tidy up axes
-        axes.tick_params(labelsize=8, direction='out', left=False, right=False, top=False, bottom=False)
-        axes.set_xlabel(pconfig.get('xlab', ''))
-        axes.set_ylabel(pconfig.get('ylab', ''))
+    # Close wrapping div
+    html.append('</div>')
 
-        # Dataset specific y label
-        try:
-            axes.set_ylabel(pconfig['data_labels'][pidx]['ylab'])
-        except:
-            pass
+    report.num_mpl_plots += 1
 
-        # Axis limits
-        default_ylimits = axes.get_ylim()
-        ymin = default_ylimits[0]
-        if 'ymin' in pconfig:
-            ymin = pconfig['ymin']
-        elif 'yCeiling' in pconfig:
-            ymin = min(pconfig['yCeiling'], default_ylimits[0])
-        ymax = default_ylimits[1]
-        if 'ymax' in pconfig:
-            ymax = pconfig['ymax']
-        elif 'yFloor' in pconfig:
-            ymax = max(pconfig['yCeiling'], default_ylimits[1])
-        if (ymax - ymin) < pconfig.get('yMinRange', 0):
-            ymax = ymin + pconfig['yMinRange']
-        axes.set_ylim((ymin, ymax))
-
-        # Dataset specific ymax
-        try:
-            axes.set_ylim((ymin, pconfig['data_labels'][pidx]['ymax']))
-        except:
-            pass
+    return ''.join(html)
 
-        default_xlimits = axes.get_xlim()
-        xmin = default_xlimits[0]
-        if 'xmin' in pconfig:
-            xmin = pconfig['xmin']
-        elif 'xCeiling' in pconfig:
-            xmin = min(pconfig['xCeiling'], default_xlimits[0])
-        xmax = default_xlimits[1]
-        if 'xmax' in pconfig:
-            xmax = pconfig['xmax']
-        elif 'xFloor' in pconfig:
-            xmax = max(pconfig['xCeiling'], default_xlimits[1])
-        if (xmax - xmin) < pconfig.get('xMinRange', 0):
-            xmax = xmin + pconfig['xMinRange']
-        axes.set_xlim((xmin, xmax))
-
-        # Plot title
-        if 'title' in pconfig:
-            plt.text(0.5, 1.05, pconfig['title'], horizontalalignment='center', fontsize=16, transform=axes.transAxes)
-        axes.grid(True, zorder=10, which='both', axis='y', linestyle='-', color='#dedede', linewidth=1)
-
-        # X axis categories, if specified
-        if 'categories' in pconfig:
-            axes.set_xticks([i for i,v in enumerate(pconfig['categories'])])
-            axes.set_xticklabels(pconfig['categories'])
-
-        # Axis lines
-        xlim = axes.get_xlim()
-        axes.plot([xlim[0], xlim[1]], [0, 0], linestyle='-', color='#dedede', linewidth=2)
-        axes.set_axisbelow(True)
-        axes.spines['right'].set_visible(False)
-        axes.spines['top'].set_visible(False)
-        axes.spines['bottom'].set_visible(False)
-        axes.spines['left'].set_visible(False)
-
-        # Background colours, if specified
-        if 'yPlotBands' in pconfig:
-            xlim = axes.get_xlim()
-            for pb in pconfig['yPlotBands']:
-                axes.barh(pb['from'], xlim[1], height = pb['to']-pb['from'], left=xlim[0], color=pb['color'], linewidth=0, zorder=0)
-        if 'xPlotBands' in pconfig:
-            ylim = axes.get_ylim()
-            for pb in pconfig['xPlotBands']:
-                axes.bar(pb['from'], ylim[1], width = pb['to']-pb['from'], bottom=ylim[0], color=pb['color'], linewidth=0, zorder=0)
-
-        # Tight layout - makes sure that legend fits in and stuff
-        if len(pdata) <= 15:
-            axes.legend(loc='lower center', bbox_to_anchor=(0, -0.22, 1, .102), ncol=5, mode='expand', fontsize=8, frameon=False)
-            plt.tight_layout(rect=[0,0.08,1,0.92])
-        else:
-            plt.tight_layout(rect=[0,0,1,0.92])
 
-        # Should this plot be hidden on report load?
-        hidediv = ''
-        if pidx > 0:
-            hidediv = ' style="display:none;"'
+def mpl_linegraph_figure (pdata, pconfig, pidx):
+    """
+    Make the MatPlotLib figure for one dataset of a line graph. Returns the
+    figure and the keyword arguments to save it with. Used by plot_pool,
+    so can be run in another process.
+    """
+    # Same defaults as HighCharts for consistency
+    default_colors = ['#7cb5ec', '#434348', '#90ed7d', '#f7a35c', '#8085e9',
+                      '#f15c80', '#e4d354', '#2b908f', '#f45b5b', '#91e8e1']
 
-        # Save the plot to the data directory if export is requests
-        if config.export_plots:
-            for fformat in config.export_plot_formats:
-                # Make the directory if it doesn't already exist
-                plot_dir = os.path.join(config.plots_dir, fformat)
-                if not os.path.exists(plot_dir):
-                    os.makedirs(plot_dir)
-                # Save the plot
-                plot_fn = os.path.join(plot_dir, '{}.{}'.format(pid, fformat))
-                fig.savefig(plot_fn, format=fformat, bbox_inches='tight')
-
-        # Output the figure to a base64 encoded string
-        if getattr(get_template_mod(), 'base64_plots', True) is True:
-            img_buffer = io.BytesIO()
-            fig.savefig(img_buffer, format='png', bbox_inches='tight')
-            b64_img = base64.b64encode(img_buffer.getvalue()).decode('utf8')
-            img_buffer.close()
-            html += '<div class="mqc_mplplot" id="{}"{}><img src="data:image/png;base64,{}" /></div>'.format(pid, hidediv, b64_img)
+    # Set up figure
+    fig = plt.figure(figsize=(14, 6), frameon=False)
+    axes = fig.add_subplot(111)
 
-        # Save to a file and link <img>
-        else:
-            plot_relpath = os.path.join(config.plots_dir_name, 'png', '{}.png'.format(pid))
-            html += '<div class="mqc_mplplot" id="{}"{}><img src="{}" /></div>'.format(pid, hidediv, plot_relpath)
+    # Go through data series
+    for idx, d in enumerate(pdata):
 
-        plt.close(fig)
+        # Default colour index
+        cidx = idx
+        while cidx >= len(default_colors):
+            cidx -= len(default_colors)
 
+        # Line style
+        linestyle = 'solid'
+        if d.get('dashStyle', None) == 'Dash':
+            linestyle = 'dashed'
 
-    # Close wrapping div
-    html += '</div>'
+        # Reformat data (again)
+        try:
+            axes.plot([x[0] for x in d['data']], [x[1] for x in d['data']], label=d['name'], color=d.get('color', default_colors[cidx]), linestyle=linestyle, linewidth=1, marker=None)
+        except TypeError:
+            # Categorical data on x axis
+            axes.plot(d['data'], label=d['name'], color=d.get('color', default_colors[cidx]), linewidth=1, marker=None)
 
-    report.num_mpl_plots += 1
+    # Tidy up axes
+    axes.tick_params(labelsize=8, direction='out', left=False, right=False, top=False, bottom=False)
+    axes.set_xlabel(pconfig.get('xlab', ''))
+    axes.set_ylabel(pconfig.get('ylab', ''))
 
-    return html
+    # Dataset specific y label
+    try:
+        axes.set_ylabel(pconfig['data_labels'][pidx]['ylab'])
+    except:
+        pass
+
+    # Axis limits
+    default_ylimits = axes.get_ylim()
+    ymin = default_ylimits[0]
+    if 'ymin' in pconfig:
+        ymin = pconfig['ymin']
+    elif 'yCeiling' in pconfig:
+        ymin = min(pconfig['yCeiling'], default_ylimits[0])
+    ymax = default_ylimits[1]
+    if 'ymax' in pconfig:
+        ymax = pconfig['ymax']
+    elif 'yFloor' in pconfig:
+        ymax = max(pconfig['yCeiling'], default_ylimits[1])
+    if (ymax - ymin) < pconfig.get('yMinRange', 0):
+        ymax = ymin + pconfig['yMinRange']
+    axes.set_ylim((ymin, ymax))
+
+    # Dataset specific ymax
+    try:
+        axes.set_ylim((ymin, pconfig['data_labels'][pidx]['ymax']))
+    except:
+        pass
+
+    default_xlimits = axes.get_xlim()
+    xmin = default_xlimits[0]
+    if 'xmin' in pconfig:
+        xmin = pconfig['xmin']
+    elif 'xCeiling' in pconfig:
+        xmin = min(pconfig['xCeiling'], default_xlimits[0])
+    xmax = default_xlimits[1]
+    if 'xmax' in pconfig:
+        xmax = pconfig['xmax']
+    elif 'xFloor' in pconfig:
+        xmax = max(pconfig['xCeiling'], default_xlimits[1])
+    if (xmax - xmin) < pconfig.get('xMinRange', 0):
+        xmax = xmin + pconfig['xMinRange']
+    axes.set_xlim((xmin, xmax))
+
+    # Plot title
+    if 'title' in pconfig:
+        plt.text(0.5, 1.05, pconfig['title'], horizontalalignment='center', fontsize=16, transform=axes.transAxes)
+    axes.grid(True, zorder=10, which='both', axis='y', linestyle='-', color='#dedede', linewidth=1)
+
+    # X axis categories, if specified
+    if 'categories' in pconfig:
+        axes.set_xticks([i for i,v in enumerate(pconfig['categories'])])
+        axes.set_xticklabels(pconfig['categories'])
+
+    # Axis lines
+    xlim = axes.get_xlim()
+    axes.plot([xlim[0], xlim[1]], [0, 0], linestyle='-', color='#dedede', linewidth=2)
+    axes.set_axisbelow(True)
+    axes.spines['right'].set_visible(False)
+    axes.spines['top'].set_visible(False)
+    axes.spines['bottom'].set_visible(False)
+    axes.spines['left'].set_visible(False)
+
+    # Background colours, if specified
+    if 'yPlotBands' in pconfig:
+        xlim = axes.get_xlim()
+        for pb in pconfig['yPlotBands']:
+            axes.barh(pb['from'], xlim[1], height = pb['to']-pb['from'], left=xlim[0], color=pb['color'], linewidth=0, zorder=0)
+    if 'xPlotBands' in pconfig:
+        ylim = axes.get_ylim()
+        for pb in pconfig['xPlotBands']:
+            axes.bar(pb['from'], ylim[1], width = pb['to']-pb['from'], bottom=ylim[0], color=pb['color'], linewidth=0, zorder=0)
+
+    # Tight layout - makes sure that legend fits in and stuff
+    if len(pdata) <= 15:
+        axes.legend(loc='lower center', bbox_to_anchor=(0, -0.22, 1, .102), ncol=5, mode='expand', fontsize=8, frameon=False)
+        plt.tight_layout(rect=[0,0.08,1,0.92])
+    else:
+        plt.tight_layout(rect=[0,0,1,0.92])
+
+    return fig, {'bbox_inches': 'tight'}
 
 
 def smooth_line_data(data, numpoints, sumcounts=True):
@@ -475,3 +473,112 @@ def smooth_line_data(data, numpoints, sumcounts=True):
                 p = 0
                 binvals = []
     return smoothed
+
+
+def downsample_plot(pdata):
+    """
+    Downsample the long series of an interactive line graph (an entry of
+    report.plot_data) for the report JSON. report.plot_data, the data files and
+    flat plots keep every point. Returns the plot data, copied if anything was
+    downsampled, and the number of series downsampled.
+    """
+    pconfig = pdata.get('config', {})
+    max_points = pconfig.get('downsample_points', config.linegraph_downsample_points)
+    if 'categories' in pconfig or max_points in [None, False] or max_points < 3:
+        return pdata, 0
+    method = pconfig.get('downsample_method', config.linegraph_downsample_method)
+    num_downsampled = 0
+    datasets = list()
+    for dataset in pdata['datasets']:
+        series_list = list()
+        for series in dataset:
+            if len(series.get('data', [])) > max_points:
+                pairs = downsample_pairs(series['data'], max_points, method)
+                if len(pairs) < len(series['data']):
+                    series = dict(series, data=pairs)
+                    num_downsampled += 1
+            series_list.append(series)
+        datasets.append(series_list)
+    if num_downsampled == 0:
+        return pdata, 0
+    return dict(pdata, datasets=datasets), num_downsampled
+
+def downsample_pairs(pairs, numpoints, method='lttb'):
+    """
+    Pick up to numpoints of a list of [x, y] pairs, sorted by x, so that the
+    line keeps its shape. The first and last points are always kept.
+    Methods are 'lttb' (Largest-Triangle-Three-Buckets) and 'minmax'
+    (lowest and highest point in each bucket). Series that aren't all
+    numbers are returned unchanged.
+    """
+    try:
+        xy = np.array(pairs, dtype=float)
+    except (TypeError, ValueError):
+        return pairs
+    if xy.ndim != 2 or xy.shape[1] != 2 or not np.isfinite(xy).all():
+        return pairs
+    if method == 'minmax':
+        idx = minmax_indices(xy[:, 0], xy[:, 1], numpoints)
+    else:
+        idx = lttb_indices(xy[:, 0], xy[:, 1], numpoints)
+    return [ pairs[i] for i in idx ]
+
+def bucket_matrix(vals, num_buckets):
+    """ Split the values into rows of a matrix, one per bucket. The last
+    row is padded with NaN. Returns the matrix and the bucket size. """
+    size = int(np.ceil(len(vals) / float(num_buckets)))
+    padded = np.full(size * num_buckets, np.nan)
+    padded[:len(vals)] = vals
+    return padded.reshape(num_buckets, size), size
+
+def minmax_indices(x, y, numpoints):
+    """ Index of the lowest and highest point in each bucket, in order """
+    if len(y) <= numpoints:
+        return np.arange(len(y))
+    # Two points per bucket, plus the first and last points
+    num_buckets = (numpoints - 2) // 2
+    if num_buckets < 1:
+        return np.array([0, len(y) - 1])
+    inner = y[1:-1]
+    num_buckets = min(num_buckets, len(inner))
+    buckets, size = bucket_matrix(inner, num_buckets)
+    # Drop rows that are only padding
+    buckets = buckets[~np.isnan(buckets).all(axis=1)]
+    offsets = np.arange(buckets.shape[0]) * size + 1
+    mins = np.nanargmin(buckets, axis=1) + offsets
+    maxs = np.nanargmax(buckets, axis=1) + offsets
+    idx = np.unique(np.concatenate(([0], mins, maxs, [len(y) - 1])))
+    return idx
+
+def lttb_indices(x, y, numpoints):
+    """
+    Largest-Triangle-Three-Buckets. Picks the point in each bucket that makes
+    the largest triangle with the point picked in the last bucket and the
+    average of the next bucket. Areas are worked out for a whole bucket at once.
+    """
+    n = len(y)
+    if n <= numpoints:
+        return np.arange(n)
+    num_buckets = numpoints - 2
+    if num_buckets < 1:
+        return np.array([0, n - 1])
+    # Bucket edges for the points between the first and the last
+    edges = np.floor(np.linspace(1, n - 1, num_buckets + 1)).astype(int)
+    # Average of each bucket, with the last point after the last bucket
+    csum_x = np.concatenate(([0.0], np.cumsum(x)))
+    csum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.maximum(edges[1:] - edges[:-1], 1)
+    avg_x = np.append((csum_x[edges[1:]] - csum_x[edges[:-1]]) / counts, x[-1])
+    avg_y = np.append((csum_y[edges[1:]] - csum_y[edges[:-1]]) / counts, y[-1])
+    idx = np.zeros(num_buckets + 2, dtype=int)
+    idx[-1] = n - 1
+    a = 0
+    for b in range(num_buckets):
+        start, end = edges[b], max(edges[b + 1], edges[b] + 1)
+        bx = x[start:end]
+        by = y[start:end]
+        # Twice the triangle area, from the cross product
+        area = np.abs((x[a] - avg_x[b + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[b + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        idx[b + 1] = a
+    return np.unique(idx)
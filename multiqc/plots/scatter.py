@@ -5,12 +5,13 @@
 import logging
 import random
 
-from multiqc.utils import report
+from multiqc.utils import report, timings
 
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@timings.timed_function('plots')
 def plot (data, pconfig=None):
     """ Plot a scatter plot with X,Y data.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -106,7 +107,7 @@ def highcharts_scatter_plot (plotdata, pconfig=None):
         html += '</div>\n\n'
 
     # The plot div
-    html += '<div class="hc-plot-wrapper"><div id="{id}" class="hc-plot not_rendered hc-scatter-plot"><small>loading..</small></div></div></div> \n'.format(id=pconfig['id'])
+    html += '<div class="hc-plot-wrapper"><div id="{id}" class="hc-plot not_rendered hc-scatter-plot" data-plotdata="{id}"><small>loading..</small></div></div></div> \n'.format(id=pconfig['id'])
 
     report.num_hc_plots += 1
 
@@ -4,14 +4,16 @@
 
 from collections import defaultdict, OrderedDict
 import logging
+import numpy as np
 import random
 
-from multiqc.utils import config, report, util_functions, mqc_colour
+from multiqc.utils import config, report, util_functions, mqc_colour, timings
 from multiqc.plots import table_object, beeswarm
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@timings.timed_function('plots')
 def plot (data, headers=None, pconfig=None):
     """ Return HTML for a MultiQC table.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -62,6 +64,15 @@ def make_table (dt):
     if table_title is None:
         table_title = table_id.replace("_", " ").title()
 
+    # Big tables are virtual: the rows are saved with the plot data and
+    # only the rows scrolled into view are added to the page by the browser
+    s_names = set([ s_name for d in dt.data for s_name in d.keys() ])
+    virtual = dt.pconfig.get('virtual')
+    if virtual is None:
+        virtual = config.virtual_table_rows not in [None, False] and len(s_names) >= config.virtual_table_rows
+    virtual = virtual and not config.simple_output
+    t_columns = OrderedDict()
+
     for idx, k, header in dt.get_headers_in_order():
 
         rid = header['rid']
@@ -122,178 +133,161 @@ def make_table (dt):
         else:
             c_scale = mqc_colour.mqc_colour_scale(header['scale'], header['dmin'], header['dmax'])
 
-        # Add the data table cells
-        for (s_name, samp) in dt.data[idx].items():
-            if k in samp:
-                val = samp[k]
-                kname = '{}_{}'.format(header['namespace'], rid)
-                dt.raw_vals[s_name][kname] = val
-
-                if 'modify' in header and callable(header['modify']):
-                    val = header['modify'](val)
-
-                try:
-                    dmin = header['dmin']
-                    dmax = header['dmax']
-                    percentage = ((float(val) - dmin) / (dmax - dmin)) * 100
-                    percentage = min(percentage, 100)
-                    percentage = max(percentage, 0)
-                except (ZeroDivisionError,ValueError):
-                    percentage = 0
-
-                try:
-                    valstring = str(header['format'].format(val))
-                except ValueError:
-                    try:
-                        valstring = str(header['format'].format(float(val)))
-                    except ValueError:
-                        valstring = str(val)
-                except:
-                    valstring = str(val)
-
-                # This is horrible, but Python locale settings are worse
-                if config.thousandsSep_format is None:
-                    config.thousandsSep_format = '<span class="mqc_thousandSep"></span>'
-                if config.decimalPoint_format is None:
-                    config.decimalPoint_format = '.'
-                valstring = valstring.replace('.', 'DECIMAL').replace(',', 'THOUSAND')
-                valstring = valstring.replace('DECIMAL', config.decimalPoint_format).replace('THOUSAND', config.thousandsSep_format)
-
-                # Percentage suffixes etc
-                valstring += header.get('suffix', '')
-
-                # Conditional formatting
-                cmatches = { cfck: False for cfc in config.table_cond_formatting_colours for cfck in cfc }
-                # Find general rules followed by column-specific rules
-                for cfk in ['all_columns', rid]:
-                    if cfk in config.table_cond_formatting_rules:
-                        # Loop through match types
-                        for ftype in cmatches.keys():
-                            # Loop through array of comparison types
-                            for cmp in config.table_cond_formatting_rules[cfk].get(ftype, []):
-                                try:
-                                    # Each comparison should be a dict with single key: val
-                                    if 's_eq' in cmp and str(cmp['s_eq']).lower() == str(val).lower():
-                                        cmatches[ftype] = True
-                                    if 's_contains' in cmp and str(cmp['s_contains']).lower() in str(val).lower():
-                                        cmatches[ftype] = True
-                                    if 's_ne' in cmp and str(cmp['s_ne']).lower() != str(val).lower():
-                                        cmatches[ftype] = True
-                                    if 'eq' in cmp and cmp['eq'] == val:
-                                        cmatches[ftype] = True
-                                    if 'ne' in cmp and cmp['ne'] != val:
-                                        cmatches[ftype] = True
-                                    if 'gt' in cmp and cmp['gt'] < val:
-                                        cmatches[ftype] = True
-                                    if 'lt' in cmp and cmp['lt'] > val:
-                                        cmatches[ftype] = True
-                                except:
-                                    log.warn("Not able to apply table conditional formatting to '{}' ({})".format(val, cmp))
-                # Apply HTML in order of config keys
-                for cfc in config.table_cond_formatting_colours:
-                    for cfck in cfc: # should always be one, but you never know
-                        if cmatches[cfck]:
-                            valstring = '<span class="badge" style="background-color:{}">{}</span>'.format(cfc[cfck], valstring)
-
-                # Build HTML
-                if not header['scale']:
-                    if s_name not in t_rows:
-                        t_rows[s_name] = dict()
-                    t_rows[s_name][rid] = '<td class="{rid} {h}">{v}</td>'.format(rid=rid, h=hide, v=valstring)
-                else:
-                    if c_scale is not None:
-                        col = ' background-color:{};'.format(c_scale.get_colour(val))
-                    else:
-                        col = ''
-                    bar_html = '<span class="bar" style="width:{}%;{}"></span>'.format(percentage, col)
-                    val_html = '<span class="val">{}</span>'.format(valstring)
-                    wrapper_html = '<div class="wrapper">{}{}</div>'.format(bar_html, val_html)
-
-                    if s_name not in t_rows:
-                        t_rows[s_name] = dict()
-                    t_rows[s_name][rid] = '<td class="data-coloured {rid} {h}">{c}</td>'.format(rid=rid, h=hide, c=wrapper_html)
+        # Add the data table cells. Values, colours and strings are made for the whole column at once.
+        column = dt.get_column(idx, k)
+        kname = '{}_{}'.format(header['namespace'], rid)
+        for s_name, val in zip(column.s_names, column.raw):
+            dt.raw_vals[s_name][kname] = val
+
+        # This is horrible, but Python locale settings are worse
+        if config.thousandsSep_format is None:
+            config.thousandsSep_format = '<span class="mqc_thousandSep"></span>'
+        if config.decimalPoint_format is None:
+            config.decimalPoint_format = '.'
+        valstrings = column.formatted(header['format'], config.decimalPoint_format, config.thousandsSep_format)
+
+        # Percentage suffixes etc
+        suffix = header.get('suffix', '')
+        if suffix != '':
+            valstrings = [ v + suffix for v in valstrings ]
+
+        # Conditional formatting
+        cmatches = OrderedDict([ (cfck, None) for cfc in config.table_cond_formatting_colours for cfck in cfc ])
+        # Find general rules followed by column-specific rules
+        for cfk in ['all_columns', rid]:
+            if cfk in config.table_cond_formatting_rules:
+                # Loop through match types
+                for ftype in cmatches.keys():
+                    rules = config.table_cond_formatting_rules[cfk].get(ftype, [])
+                    if len(rules) > 0:
+                        matches = column.cond_matches(rules)
+                        cmatches[ftype] = matches if cmatches[ftype] is None else cmatches[ftype] | matches
+        # Apply HTML in order of config keys
+        for cfc in config.table_cond_formatting_colours:
+            for cfck in cfc: # should always be one, but you never know
+                if cmatches[cfck] is not None:
+                    for i in np.flatnonzero(cmatches[cfck]):
+                        valstrings[i] = '<span class="badge" style="background-color:{}">{}</span>'.format(cfc[cfck], valstrings[i])
+
+        # Save the column for a virtual table instead of building HTML
+        if virtual:
+            t_columns[rid] = virtual_column(column, valstrings, header, c_scale)
+            cells = [None] * len(valstrings)
+
+        # Build HTML
+        elif not header['scale']:
+            cells = [ '<td class="{rid} {h}">{v}</td>'.format(rid=rid, h=hide, v=v) for v in valstrings ]
+        else:
+            percentages = column.percentages(header['dmin'], header['dmax'])
+            if c_scale is not None:
+                cols = [ ' background-color:{};'.format(c) for c in column.colours(c_scale) ]
+            else:
+                cols = [''] * len(valstrings)
+            cells = [
+                '<td class="data-coloured {rid} {h}"><div class="wrapper"><span class="bar" style="width:{p}%;{c}"></span><span class="val">{v}</span></div></td>'
+                .format(rid=rid, h=hide, p=p, c=c, v=v) for p, c, v in zip(percentages, cols, valstrings)
+            ]
+        for s_name, cell in zip(column.s_names, cells):
+            if s_name not in t_rows:
+                t_rows[s_name] = dict()
+            t_rows[s_name][rid] = cell
 
         # Remove header if we don't have any filled cells for it
         if sum([len(rows) for rows in t_rows.values()]) == 0:
             t_headers.pop(rid, None)
             t_modal_headers.pop(rid, None)
+            t_columns.pop(rid, None)
             logger.debug('Removing header {} from general stats table, as no data'.format(k))
 
     #
     # Put everything together
     #
 
-    # Buttons above the table
-    html = ''
+    # Buttons above the table. HTML is collected in a list and joined at the end.
+    html = list()
     if not config.simple_output:
 
         # Copy Table Button
-        html += """
-        <button type="button" class="mqc_table_copy_btn btn btn-default btn-sm" data-clipboard-target="#{tid}">
+        html.append("""
+        <button type="button" class="{cbc} btn btn-default btn-sm" data-clipboard-target="#{tid}" data-target="#{tid}">
             <span class="glyphicon glyphicon-copy"></span> Copy table
         </button>
-        """.format(tid=table_id)
+        """.format(tid=table_id, cbc='mqc_table_copy_btn_virtual' if virtual else 'mqc_table_copy_btn'))
 
         # Configure Columns Button
         if len(t_headers) > 1:
-            html += """
+            html.append("""
             <button type="button" class="mqc_table_configModal_btn btn btn-default btn-sm" data-toggle="modal" data-target="#{tid}_configModal">
                 <span class="glyphicon glyphicon-th"></span> Configure Columns
             </button>
-            """.format(tid=table_id)
+            """.format(tid=table_id))
 
         # Sort By Highlight button
-        html += """
+        html.append("""
         <button type="button" class="mqc_table_sortHighlight btn btn-default btn-sm" data-target="#{tid}" data-direction="desc" style="display:none;">
             <span class="glyphicon glyphicon-sort-by-attributes-alt"></span> Sort by highlight
         </button>
-        """.format(tid=table_id)
+        """.format(tid=table_id))
 
         # Scatter Plot Button
         if len(t_headers) > 1:
-            html += """
+            html.append("""
             <button type="button" class="mqc_table_makeScatter btn btn-default btn-sm" data-toggle="modal" data-target="#tableScatterModal" data-table="#{tid}">
                 <span class="glyphicon glyphicon glyphicon-stats"></span> Plot
             </button>
-            """.format(tid=table_id)
+            """.format(tid=table_id))
 
         # "Showing x of y columns" text
-        html += """
+        html.append("""
         <small id="{tid}_numrows_text" class="mqc_table_numrows_text">Showing <sup id="{tid}_numrows" class="mqc_table_numrows">{nrows}</sup>/<sub>{nrows}</sub> rows and <sup id="{tid}_numcols" class="mqc_table_numcols">{ncols_vis}</sup>/<sub>{ncols}</sub> columns.</small>
-        """.format(tid=table_id, nrows=len(t_rows), ncols_vis = (len(t_headers)+1)-hidden_cols, ncols=len(t_headers))
+        """.format(tid=table_id, nrows=len(t_rows), ncols_vis = (len(t_headers)+1)-hidden_cols, ncols=len(t_headers)))
 
     # Build the table itself
-    collapse_class = 'mqc-table-collapse' if len(t_rows) > 10 and config.collapse_tables else ''
-    html += """
+    # Virtual tables always scroll, so that only some of the rows are shown
+    collapse = len(t_rows) > 10 and (config.collapse_tables or virtual)
+    collapse_class = 'mqc-table-collapse' if collapse else ''
+    html.append("""
         <div id="{tid}_container" class="mqc_table_container">
             <div class="table-responsive mqc-table-responsive {cc}">
-                <table id="{tid}" class="table table-condensed mqc_table" data-title="{title}">
-        """.format( tid=table_id, title=table_title, cc=collapse_class)
+                <table id="{tid}" class="table table-condensed mqc_table{vc}" data-title="{title}">
+        """.format( tid=table_id, title=table_title, cc=collapse_class, vc=' mqc_table_virtual' if virtual else ''))
 
     # Build the header row
     col1_header = dt.pconfig.get('col1_header', 'Sample Name')
-    html += '<thead><tr><th class="rowheader">{}</th>{}</tr></thead>'.format(col1_header, ''.join(t_headers.values()))
+    html.append('<thead><tr><th class="rowheader">{}</th>{}</tr></thead>'.format(col1_header, ''.join(t_headers.values())))
 
     # Build the table body
-    html += '<tbody>'
+    html.append('<tbody>')
     t_row_keys = t_rows.keys()
     if dt.pconfig.get('sortRows') is not False:
         t_row_keys = sorted(t_row_keys)
+    if virtual:
+        logger.debug('Making virtual table {}, {} samples'.format(table_id, len(t_rows)))
+        t_row_keys = list(t_row_keys)
+        idx = dict([ (s_name, i) for i, s_name in enumerate(t_row_keys) ])
+        for col in t_columns.values():
+            col.set_order(idx)
+        report.plot_data[table_id] = {
+            'plot_type': 'table',
+            'samples': t_row_keys,
+            'columns': list(t_columns.keys()),
+            'data': dict([ (rid, col.to_dict()) for rid, col in t_columns.items() ])
+        }
+        t_row_keys = []
     for s_name in t_row_keys:
-        html += '<tr>'
+        html.append('<tr>')
         # Sample name row header
-        html += '<th class="rowheader" data-original-sn="{sn}">{sn}</th>'.format(sn=s_name)
-        for k in t_headers:
-            html += t_rows[s_name].get(k, empty_cells[k])
-        html += '</tr>'
-    html += '</tbody></table></div>'
-    if len(t_rows) > 10 and config.collapse_tables:
-        html += '<div class="mqc-table-expand"><span class="glyphicon glyphicon-chevron-down" aria-hidden="true"></span></div>'
-    html += '</div>'
+        html.append('<th class="rowheader" data-original-sn="{sn}">{sn}</th>'.format(sn=s_name))
+        html.extend([ t_rows[s_name].get(k, empty_cells[k]) for k in t_headers ])
+        html.append('</tr>')
+    html.append('</tbody></table></div>')
+    if collapse:
+        html.append('<div class="mqc-table-expand"><span class="glyphicon glyphicon-chevron-down" aria-hidden="true"></span></div>')
+    html.append('</div>')
 
     # Build the bootstrap modal to customise columns and order
     if not config.simple_output:
-        html += """
+        html.append("""
     <!-- MultiQC Table Columns Modal -->
     <div class="modal fade" id="{tid}_configModal" tabindex="-1">
       <div class="modal-dialog modal-lg">
@@ -326,7 +320,7 @@ def make_table (dt):
             </table>
         </div>
         <div class="modal-footer"> <button type="button" class="btn btn-default" data-dismiss="modal">Close</button> </div>
-    </div> </div> </div>""".format( tid=table_id, title=table_title, trows=''.join(t_modal_headers.values()) )
+    </div> </div> </div>""".format( tid=table_id, title=table_title, trows=''.join(t_modal_headers.values()) ))
 
     # Save the raw values to a file if requested
     if dt.pconfig.get('save_file') is True:
@@ -334,4 +328,50 @@ def make_table (dt):
         util_functions.write_data_file(dt.raw_vals, fn )
         report.saved_raw_data[fn] = dt.raw_vals
 
-    return html
+    return ''.join(html)
+
+
+
+class virtual_column (object):
+    """ The cells of one column of a virtual table, as lists with one value
+    for every sample in the table (None for empty cells). Bar widths are
+    rounded and colours are saved once with an index for each cell,
+    to keep the plot data small. """
+
+    def __init__ (self, column, valstrings, header, c_scale):
+        self.s_names = column.s_names
+        self.valstrings = valstrings
+        # Numbers are sorted as numbers, anything else as text
+        nums, mask = column.numbers()
+        self.sortvals = [ float(n) if ok and np.isfinite(n) else str(v) for n, ok, v in zip(nums.tolist(), mask, column.vals) ]
+        self.bars = None
+        self.colours = None
+        if header['scale']:
+            self.bars = [ round(p, 2) for p in column.percentages(header['dmin'], header['dmax']) ]
+            if c_scale is not None:
+                self.colours = column.colours(c_scale)
+        self.order = None
+
+    def set_order(self, idx):
+        """ Position of each cell in the table rows, from {sample name: row} """
+        self.order = [ idx[s_name] for s_name in self.s_names ]
+
+    def fill(self, vals):
+        filled = [None] * (max(self.order) + 1 if len(self.order) > 0 else 0)
+        for i, v in zip(self.order, vals):
+            filled[i] = v
+        return filled
+
+    def to_dict(self):
+        d = {
+            'vals': self.fill(self.valstrings),
+            'sort': self.fill(self.sortvals)
+        }
+        if self.bars is not None:
+            d['bars'] = self.fill(self.bars)
+        if self.colours is not None:
+            palette = sorted(set(self.colours))
+            pidx = dict([ (c, i) for i, c in enumerate(palette) ])
+            d['palette'] = palette
+            d['colours'] = self.fill([ pidx[c] for c in self.colours ])
+        return d
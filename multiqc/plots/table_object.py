@@ -4,6 +4,7 @@
 
 from collections import defaultdict, OrderedDict
 import logging
+import numpy as np
 import re
 
 from multiqc.utils import config, report
@@ -27,6 +28,7 @@ class datatable (object):
         if type(headers) is not list:
             headers = [headers]
 
+        self.columns = dict()
         sectcols = ['55,126,184', '77,175,74', '152,78,163', '255,127,0', '228,26,28', '255,255,51', '166,86,40', '247,129,191', '153,153,153']
         shared_keys = defaultdict(lambda: dict())
 
@@ -147,19 +149,15 @@ class datatable (object):
 
                 # Figure out the min / max if not supplied
                 if setdmax or setdmin:
-                    for s_name, samp in data[idx].items():
-                        try:
-                            val = float(samp[k])
-                            if callable(headers[idx][k]['modify']):
-                                val = float(headers[idx][k]['modify'](val))
-                            if setdmax:
-                                headers[idx][k]['dmax'] = max(headers[idx][k]['dmax'], val)
-                            if setdmin:
-                                headers[idx][k]['dmin'] = min(headers[idx][k]['dmin'], val)
-                        except ValueError:
-                            val = samp[k] # couldn't convert to float - keep as a string
-                        except KeyError:
-                            pass # missing data - skip
+                    column = datacolumn(data[idx], k, headers[idx][k]['modify'])
+                    self.columns[(idx, k)] = column
+                    nums = column.limit_values()
+                    nums = nums[~np.isnan(nums)]
+                    if len(nums) > 0:
+                        if setdmax and nums.max() > headers[idx][k]['dmax']:
+                            headers[idx][k]['dmax'] = float(nums.max())
+                        if setdmin and nums.min() < headers[idx][k]['dmin']:
+                            headers[idx][k]['dmin'] = float(nums.min())
                     # Limit auto-generated scales with floor, ceiling and minRange.
                     if headers[idx][k]['ceiling'] is not None and headers[idx][k]['max'] is None:
                         headers[idx][k]['dmax'] = min(headers[idx][k]['dmax'], float(headers[idx][k]['ceiling']))
@@ -204,6 +202,12 @@ class datatable (object):
         self.headers = headers
         self.pconfig = pconfig
 
+    def get_column(self, idx, k):
+        """ Get the datacolumn for a header key of a table section """
+        if (idx, k) not in self.columns:
+            self.columns[(idx, k)] = datacolumn(self.data[idx], k, self.headers[idx][k].get('modify'))
+        return self.columns[(idx, k)]
+
     def get_headers_in_order(self):
         """Gets the headers in the order they want to be displayed.
            Returns a list of triplets: (idx, key, header_info)
@@ -214,3 +218,148 @@ class datatable (object):
             for idx, k in self.headers_in_order[bucket]:
                 res.append( (idx, k, self.headers[idx][k]) )
         return res
+
+
+class datacolumn (object):
+    """ One column of a table section. Holds the values for the samples that
+    have them, in table order, with the values as a NumPy float array and a mask
+    of which ones are numbers. Limits, percentages, colours and cell strings
+    are made for the whole column at once. """
+
+    def __init__ (self, data, k, modify=None):
+        self.s_names = [ s_name for s_name, samp in data.items() if k in samp ]
+        self.raw = [ data[s_name][k] for s_name in self.s_names ]
+        self.modify = modify if callable(modify) else None
+        self._vals = None
+        self._nums = None
+
+    @property
+    def vals(self):
+        """ Values after the header 'modify' function """
+        if self._vals is None:
+            if self.modify is None:
+                self._vals = list(self.raw)
+            else:
+                self._vals = [ self.modify(val) for val in self.raw ]
+        return self._vals
+
+    def limit_values(self):
+        """ Values used to find the scale limits. The raw value is made
+        a float before it is modified, values that aren't numbers are skipped """
+        nums = list()
+        for val in self.raw:
+            try:
+                val = float(val)
+                if self.modify is not None:
+                    val = float(self.modify(val))
+            except (ValueError, KeyError):
+                continue # couldn't convert to float - keep as a string
+            nums.append(val)
+        return np.array(nums, dtype=float)
+
+    def numbers(self):
+        """ Modified values as floats, with a mask of which could be converted """
+        if self._nums is None:
+            nums = np.zeros(len(self.vals), dtype=float)
+            mask = np.zeros(len(self.vals), dtype=bool)
+            for i, val in enumerate(self.vals):
+                try:
+                    nums[i] = float(val)
+                    mask[i] = True
+                except ValueError:
+                    pass
+            self._nums = (nums, mask)
+        return self._nums
+
+    def percentages(self, dmin, dmax):
+        """ Bar widths for each value between dmin and dmax, from 0 to 100 """
+        nums, mask = self.numbers()
+        if dmax - dmin == 0:
+            return [0] * len(nums)
+        pcts = (((nums - dmin) / (dmax - dmin)) * 100).tolist()
+        # Keep the same types as min(percentage, 100) and max(percentage, 0)
+        return [ (100 if p > 100 else (0 if p < 0 else p)) if ok else 0 for p, ok in zip(pcts, mask) ]
+
+    def colours(self, c_scale):
+        """ Colour for each value from a mqc_colour_scale """
+        return c_scale.get_colour_list(self.vals)
+
+    def formatted(self, fmt, decimal_point, thousands_sep):
+        """ Format each value as a string, swapping in the decimal point
+        and thousands separator """
+        strs = [ format_value(fmt, val) for val in self.vals ]
+        # Swap the separators for the whole column in one go
+        sep = '\x00'
+        joined = sep.join(strs)
+        if joined.count(sep) != max(len(strs) - 1, 0):
+            joined = None
+        for old, new in [('.', 'DECIMAL'), (',', 'THOUSAND'), ('DECIMAL', decimal_point), ('THOUSAND', thousands_sep)]:
+            if joined is not None:
+                joined = joined.replace(old, new)
+            else:
+                strs = [ v.replace(old, new) for v in strs ]
+        if joined is not None:
+            strs = joined.split(sep) if len(strs) > 0 else []
+        return strs
+
+    def cond_matches(self, rules):
+        """
+        Which values match a list of conditional formatting comparisons,
+        as a boolean array. Each comparison is a dict, eg. {'gt': 10}
+        """
+        matches = np.zeros(len(self.vals), dtype=bool)
+        vals = np.empty(len(self.vals), dtype=object)
+        vals[:] = self.vals
+        lower_vals = None
+        for cmp in rules:
+            try:
+                cmp_matches = np.zeros(len(vals), dtype=bool)
+                if any([ c in cmp for c in ['s_eq', 's_contains', 's_ne'] ]) and lower_vals is None:
+                    lower_vals = [ str(val).lower() for val in self.vals ]
+                if 's_eq' in cmp:
+                    cmp_matches |= [ str(cmp['s_eq']).lower() == val for val in lower_vals ]
+                if 's_contains' in cmp:
+                    cmp_matches |= [ str(cmp['s_contains']).lower() in val for val in lower_vals ]
+                if 's_ne' in cmp:
+                    cmp_matches |= [ str(cmp['s_ne']).lower() != val for val in lower_vals ]
+                for c, op in [('eq', lambda a, b: a == b), ('ne', lambda a, b: a != b), ('gt', lambda a, b: a < b), ('lt', lambda a, b: a > b)]:
+                    if c in cmp:
+                        res = op(cmp[c], vals)
+                        if not isinstance(res, np.ndarray) or res.shape != vals.shape:
+                            raise TypeError("Could not compare column values with {}".format(cmp[c]))
+                        cmp_matches |= res.astype(bool)
+                matches |= cmp_matches
+            except Exception:
+                # Go through one value at a time to warn about the ones that don't work
+                for i, val in enumerate(self.vals):
+                    try:
+                        if 's_eq' in cmp and str(cmp['s_eq']).lower() == str(val).lower():
+                            matches[i] = True
+                        if 's_contains' in cmp and str(cmp['s_contains']).lower() in str(val).lower():
+                            matches[i] = True
+                        if 's_ne' in cmp and str(cmp['s_ne']).lower() != str(val).lower():
+                            matches[i] = True
+                        if 'eq' in cmp and cmp['eq'] == val:
+                            matches[i] = True
+                        if 'ne' in cmp and cmp['ne'] != val:
+                            matches[i] = True
+                        if 'gt' in cmp and cmp['gt'] < val:
+                            matches[i] = True
+                        if 'lt' in cmp and cmp['lt'] > val:
+                            matches[i] = True
+                    except:
+                        logger.warn("Not able to apply table conditional formatting to '{}' ({})".format(val, cmp))
+        return matches
+
+
+def format_value(fmt, val):
+    """ Format a table value, falling back to a float and then the plain value """
+    try:
+        return str(fmt.format(val))
+    except ValueError:
+        try:
+            return str(fmt.format(float(val)))
+        except ValueError:
+            return str(val)
+    except:
+        return str(val)
@@ -0,0 +1,213 @@
+////////////////////////////////////////////////
+// MultiQC Plot Data
+//
+// The data for each plot is compressed and base64 encoded separately.
+// Plots are only decompressed when they are first used. zlib data is
+// decompressed natively in the background by browsers with
+// DecompressionStream, others use the small inflate function below.
+////////////////////////////////////////////////
+
+// Global plot data variable
+mqc_plots = {};
+
+// Decoders for each compression backend in MultiQC (report.compression_backends)
+mqc_plotdata_decoders = {
+  'zlib': function(b64){ return mqc_plotdata_decode(b64); },
+  'lzstring': function(b64){ return JSON.parse(LZString.decompressFromBase64(b64)); }
+};
+
+// Set up the plot data. Each plot is decompressed the first time that it's used.
+function mqc_plotdata_init(compressed, compression){
+  window.mqc_plotdata_compression = compression === undefined ? 'zlib' : compression;
+  var decode = mqc_plotdata_decoders[mqc_plotdata_compression];
+  $.each(compressed, function(target, b64){
+    Object.defineProperty(mqc_plots, target, {
+      configurable: true,
+      enumerable: true,
+      get: function(){ return mqc_plotdata_set(target, decode(b64)); },
+      set: function(value){ mqc_plotdata_set(target, value); }
+    });
+  });
+  window.mqc_plots_compressed = compressed;
+}
+
+// Replace the lazy getter with the plot data
+function mqc_plotdata_set(target, value){
+  Object.defineProperty(mqc_plots, target, {
+    configurable: true,
+    enumerable: true,
+    writable: true,
+    value: value
+  });
+  return value;
+}
+
+// Is the data for a plot still compressed?
+function mqc_plotdata_compressed(target){
+  var d = Object.getOwnPropertyDescriptor(mqc_plots, target);
+  return d !== undefined && d.get !== undefined;
+}
+
+// Call callback once the data for a plot is ready. Decompresses
+// zlib data with DecompressionStream if the browser has it.
+function mqc_plotdata_ready(target, callback){
+  if(!mqc_plotdata_compressed(target) || mqc_plotdata_compression != 'zlib' ||
+      window.DecompressionStream === undefined || window.Response === undefined){
+    setTimeout(callback, 0);
+    return;
+  }
+  var bytes = mqc_base64_bytes(mqc_plots_compressed[target]);
+  var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+  new Response(stream).text().then(function(json_string){
+    if(mqc_plotdata_compressed(target)){
+      mqc_plotdata_set(target, JSON.parse(json_string));
+    }
+  }).catch(function(e){
+    console.log('Could not decompress plot data for '+target+' in the background: '+e);
+  }).then(callback);
+}
+
+// Decompress zlib data for a plot straight away
+function mqc_plotdata_decode(b64){
+  var bytes = mqc_inflate(mqc_base64_bytes(b64));
+  // The JSON is all ASCII, so bytes are characters
+  var parts = [];
+  for(var i = 0; i < bytes.length; i += 32768){
+    parts.push(String.fromCharCode.apply(null, bytes.subarray(i, i + 32768)));
+  }
+  return JSON.parse(parts.join(''));
+}
+
+function mqc_base64_bytes(b64){
+  var bin = atob(b64);
+  var bytes = new Uint8Array(bin.length);
+  for(var i = 0; i < bin.length; i++){
+    bytes[i] = bin.charCodeAt(i);
+  }
+  return bytes;
+}
+
+// Inflate zlib data (RFC 1950 / 1951). The checksum is not checked.
+var mqc_inflate = (function(){
+  var LEN_BASE = [3,4,5,6,7,8,9,10,11,13,15,17,19,23,27,31,35,43,51,59,67,83,99,115,131,163,195,227,258];
+  var LEN_EXTRA = [0,0,0,0,0,0,0,0,1,1,1,1,2,2,2,2,3,3,3,3,4,4,4,4,5,5,5,5,0];
+  var DIST_BASE = [1,2,3,4,5,7,9,13,17,25,33,49,65,97,129,193,257,385,513,769,1025,1537,2049,3073,4097,6145,8193,12289,16385,24577];
+  var DIST_EXTRA = [0,0,0,0,1,1,2,2,3,3,4,4,5,5,6,6,7,7,8,8,9,9,10,10,11,11,12,12,13,13];
+  var CODE_ORDER = [16,17,18,0,8,7,9,6,10,5,11,4,12,3,13,2,14,1,15];
+
+  // Huffman tree: number of codes of each length and the symbols sorted by code
+  function tree(lengths, start, num){
+    var t = { counts: new Uint16Array(16), symbols: new Uint16Array(num) };
+    var offsets = new Uint16Array(16);
+    var i;
+    for(i = 0; i < num; i++){ t.counts[lengths[start + i]]++; }
+    t.counts[0] = 0;
+    for(i = 1; i < 16; i++){ offsets[i] = offsets[i - 1] + t.counts[i - 1]; }
+    for(i = 0; i < num; i++){
+      if(lengths[start + i]){ t.symbols[offsets[lengths[start + i]]++] = i; }
+    }
+    return t;
+  }
+
+  var fixed_lengths = new Uint8Array(320);
+  for(var i = 0; i < 320; i++){
+    fixed_lengths[i] = i < 144 ? 8 : i < 256 ? 9 : i < 280 ? 7 : i < 288 ? 8 : 5;
+  }
+  var fixed_lit = tree(fixed_lengths, 0, 288);
+  var fixed_dist = tree(fixed_lengths, 288, 30);
+
+  return function(src){
+    var pos = 2; // Skip the zlib header
+    var tag = 0;
+    var bitcount = 0;
+    var out = new Uint8Array(src.length * 4 + 1024);
+    var len = 0;
+
+    function bits(num){
+      var val = 0;
+      for(var b = 0; b < num; b++){
+        if(!bitcount--){ tag = src[pos++]; bitcount = 7; }
+        val |= (tag & 1) << b;
+        tag >>>= 1;
+      }
+      return val;
+    }
+    function symbol(t){
+      var sum = 0, cur = 0, l = 0;
+      do {
+        if(!bitcount--){ tag = src[pos++]; bitcount = 7; }
+        cur = 2 * cur + (tag & 1);
+        tag >>>= 1;
+        l++;
+        sum += t.counts[l];
+        cur -= t.counts[l];
+      } while(cur >= 0);
+      return t.symbols[sum + cur];
+    }
+    function reserve(n){
+      if(len + n > out.length){
+        var bigger = new Uint8Array(Math.max(out.length * 2, len + n));
+        bigger.set(out);
+        out = bigger;
+      }
+    }
+
+    var last = 0;
+    while(!last){
+      last = bits(1);
+      var type = bits(2);
+      if(type == 0){
+        // Stored block - skip to the next byte boundary
+        bitcount = 0;
+        var n = src[pos] | (src[pos + 1] << 8);
+        pos += 4;
+        reserve(n);
+        out.set(src.subarray(pos, pos + n), len);
+        pos += n;
+        len += n;
+        continue;
+      }
+      var lit = fixed_lit, dist = fixed_dist;
+      if(type == 2){
+        var hlit = bits(5) + 257, hdist = bits(5) + 1, hclen = bits(4) + 4;
+        var lengths = new Uint8Array(hlit + hdist);
+        var code_lengths = new Uint8Array(19);
+        for(var c = 0; c < hclen; c++){ code_lengths[CODE_ORDER[c]] = bits(3); }
+        var codes = tree(code_lengths, 0, 19);
+        for(var num = 0; num < hlit + hdist; ){
+          var sym = symbol(codes);
+          if(sym < 16){ lengths[num++] = sym; continue; }
+          var fill = 0, rep;
+          if(sym == 16){ fill = lengths[num - 1]; rep = bits(2) + 3; }
+          else if(sym == 17){ rep = bits(3) + 3; }
+          else { rep = bits(7) + 11; }
+          while(rep--){ lengths[num++] = fill; }
+        }
+        lit = tree(lengths, 0, hlit);
+        dist = tree(lengths, hlit, hdist);
+      } else if(type != 1){
+        throw new Error('Invalid deflate block type');
+      }
+      for(;;){
+        var s = symbol(lit);
+        if(s < 256){
+          reserve(1);
+          out[len++] = s;
+        } else if(s == 256){
+          break;
+        } else {
+          s -= 257;
+          var length = bits(LEN_EXTRA[s]) + LEN_BASE[s];
+          var d = symbol(dist);
+          var offset = bits(DIST_EXTRA[d]) + DIST_BASE[d];
+          reserve(length);
+          for(var k = 0; k < length; k++){
+            out[len] = out[len - offset];
+            len++;
+          }
+        }
+      }
+    }
+    return out.subarray(0, len);
+  };
+})();
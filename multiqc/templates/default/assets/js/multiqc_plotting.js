@@ -2,9 +2,6 @@
 // HighCharts Plotting Code
 ////////////////////////////////////////////////
 
-// Global plot data variable
-mqc_plots = {};
-
 // Initialise the toolbox filters
 window.mqc_highlight_f_texts = [];
 window.mqc_highlight_f_cols = [];
@@ -23,8 +20,8 @@ $(function () {
   // Show loading warning
   $('.mqc_loading_warning').show();
 
-  // Decompress the JSON plot data
-  mqc_plots = JSON.parse(LZString.decompressFromBase64(mqc_compressed_plotdata));
+  // Set up the compressed plot data, plots are decompressed when they are first drawn
+  mqc_plotdata_init(mqc_compressed_plotdata, mqc_plotdata_compression);
 
   // HighCharts Defaults
   window.HCDefaults = $.extend(true, {}, Highcharts.getOptions(), {});
@@ -43,14 +40,17 @@ $(function () {
         contextButton: {
           menuItems: null,
           onclick: function () {
-            // Tick only this plot in the toolbox and slide out
-            $('#mqc_export_selectplots input').prop('checked', false);
-            $('#mqc_export_selectplots input[value="'+this.renderTo.id+'"]').prop('checked', true);
-            // Special case - Table scatter plots are in a modal, need to close this first
-            if(this.renderTo.id == 'tableScatterPlot'){
-              $('#tableScatterModal').modal('hide');
-            }
-            mqc_toolbox_openclose('#mqc_exportplots', true);
+            var target = this.renderTo.id;
+            // Make sure the plot is drawn, then tick only this plot in the toolbox and slide out
+            mqc_render_plots([target], function(){
+              $('#mqc_export_selectplots input').prop('checked', false);
+              $('#mqc_export_selectplots input[value="'+target+'"]').prop('checked', true);
+              // Special case - Table scatter plots are in a modal, need to close this first
+              if(target == 'tableScatterPlot'){
+                $('#tableScatterModal').modal('hide');
+              }
+              mqc_toolbox_openclose('#mqc_exportplots', true);
+            });
           },
           text: '<span style="color:#999999;">Export Plot</span>',
           symbol: 'url(data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAABIAAAASCAYAAABWzo5XAAAAAXNSR0IArs4c6QAAAAlwSFlzAAALEwAACxMBAJqcGAAAAVlpVFh0WE1MOmNvbS5hZG9iZS54bXAAAAAAADx4OnhtcG1ldGEgeG1sbnM6eD0iYWRvYmU6bnM6bWV0YS8iIHg6eG1wdGs9IlhNUCBDb3JlIDUuNC4wIj4KICAgPHJkZjpSREYgeG1sbnM6cmRmPSJodHRwOi8vd3d3LnczLm9yZy8xOTk5LzAyLzIyLXJkZi1zeW50YXgtbnMjIj4KICAgICAgPHJkZjpEZXNjcmlwdGlvbiByZGY6YWJvdXQ9IiIKICAgICAgICAgICAgeG1sbnM6dGlmZj0iaHR0cDovL25zLmFkb2JlLmNvbS90aWZmLzEuMC8iPgogICAgICAgICA8dGlmZjpPcmllbnRhdGlvbj4xPC90aWZmOk9yaWVudGF0aW9uPgogICAgICA8L3JkZjpEZXNjcmlwdGlvbj4KICAgPC9yZGY6UkRGPgo8L3g6eG1wbWV0YT4KTMInWQAAAXNJREFUOBHNUsuqwkAMPX2g4kJd+wOCuKgL//8btAXXIogvtOhCax9xzkBqveLg8gamHZKck+RMgP9mnquh5XIpaZrC8zx0Oh1EUfQ1P3QRkeR6vcL3fdxuN1cqnERhGIKHREEQOIl8V1RE0DyuXCeRC/g39iFeHMdSlqUV+HK5oCgKeyew1+vZEauqwnQ6fcN+aJTnObbbLdrtttWGL0bjiBT/fr9jMBhYX/PzxsrA4/EQ8+zY7/dotVpgdRoFZ5F+v4/ZbPaBCw+Hg8znc5s8Ho8J9kxV04DAxCwZg6aAJWEO7XQ6yWKxQJZlGI1Gr+fXEZhkls8zCTUZfexkMpmg2+2+dUMci1qNlKS5K0YjC0iSRDgSO1EfiblfxOmpxaaDr3Q8HqWpC1+NFbnhu91OSMKC5/OZ19pqIoq5Xq+xWq3qIAnoZxFdCQ3Sx65o9WisqsYENb0rofr1T3Iexi1qs9mIgjTp1z9JhsPhq/qvwG95Tw3FukJt8JteAAAAAElFTkSuQmCC)',
@@ -61,21 +61,27 @@ $(function () {
     }
   });
 
+  // Render plots when they scroll near to the viewport
+  if(window.IntersectionObserver !== undefined){
+    mqc_lazy_render_init();
+  }
   // Render plots on page load
-  $('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').each(function(){
-    var target = $(this).attr('id');
-    // Only one point per dataset, so multiply limit by arbitrary number.
-    var max_num = num_datasets_plot_limit * 50;
-    // Deferring each plot call prevents browser from locking up
-    setTimeout(function(){
-        plot_graph(target, undefined, max_num);
-        if($('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').length == 0){
-          $('.mqc_loading_warning').hide();
-        }
-    }, 50);
-  });
-  if($('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').length == 0){
-    $('.mqc_loading_warning').hide();
+  else {
+    $('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').each(function(){
+      var target = $(this).attr('id');
+      // Only one point per dataset, so multiply limit by arbitrary number.
+      var max_num = num_datasets_plot_limit * 50;
+      // Deferring each plot call prevents browser from locking up
+      mqc_plotdata_ready($(this).data('plotdata') || target, function(){
+          plot_graph(target, undefined, max_num);
+          if($('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').length == 0){
+            $('.mqc_loading_warning').hide();
+          }
+      });
+    });
+    if($('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').length == 0){
+      $('.mqc_loading_warning').hide();
+    }
   }
 
   // Render a plot when clicked
@@ -219,8 +225,191 @@ $(function () {
     plot_heatmap(target);
   });
 
+  // Zoom back out of a big heatmap
+  $('.mqc_heatmap_overview').click(function(e){
+    e.preventDefault();
+    var target = $(this).data('target').substr(1);
+    delete mqc_heatmap_zoom[target];
+    $(this).blur();
+    plot_heatmap(target);
+  });
+
 });
 
+// Only decompress and draw plots when they scroll near to the viewport,
+// so that big reports don't have to draw every plot when the page loads
+function mqc_lazy_render_init(){
+  var waiting = 0;
+  var observer = new IntersectionObserver(function(entries){
+    $.each(entries, function(idx, entry){
+      var plot = $(entry.target);
+      if(!entry.isIntersecting || !plot.is(':visible')){ return true; }
+      observer.unobserve(entry.target);
+      if(!plot.hasClass('not_rendered') || plot.hasClass('gt_max_num_ds')){ return true; }
+      var target = plot.attr('id');
+      // Only one point per dataset, so multiply limit by arbitrary number.
+      var max_num = num_datasets_plot_limit * 50;
+      waiting += 1;
+      mqc_plotdata_ready(plot.data('plotdata') || target, function(){
+        plot_graph(target, undefined, max_num);
+        waiting -= 1;
+        if(waiting == 0){ $('.mqc_loading_warning').hide(); }
+      });
+    });
+    if(waiting == 0){ $('.mqc_loading_warning').hide(); }
+  }, { rootMargin: '500px 0px' });
+  $('.hc-plot.not_rendered').each(function(){
+    observer.observe(this);
+  });
+  if($('.hc-plot.not_rendered').length == 0){
+    $('.mqc_loading_warning').hide();
+  }
+}
+
+// Draw any of these plots that haven't been drawn yet, eg. because they haven't
+// been scrolled into view, then call callback. Used before exporting plots.
+function mqc_render_plots(targets, callback){
+  var waiting = 1;
+  var done = function(){
+    waiting -= 1;
+    if(waiting == 0){ callback(); }
+  };
+  $.each(targets, function(idx, target){
+    var plot = $('#'+target);
+    if(!plot.hasClass('hc-plot') || !plot.hasClass('not_rendered')){ return true; }
+    waiting += 1;
+    mqc_plotdata_ready(plot.data('plotdata') || target, function(){
+      plot_graph(target);
+      done();
+    });
+  });
+  done();
+}
+
+// Big heatmaps are saved as a matrix of float32 values. Decode it once.
+var mqc_heatmap_matrices = {};
+// Where a big heatmap is zoomed in, {target: {x: column, y: row}}
+var mqc_heatmap_zoom = {};
+
+// Work out the cells to draw for a big heatmap. Samples are sorted by
+// highlight and hidden, then if there are still more than config['max_cells']
+// cells the mean of each block of cells is drawn, unless zoomed in.
+function heatmap_matrix_view(target, config, xcats, ycats){
+  var pdata = mqc_plots[target];
+  if(mqc_heatmap_matrices[target] === undefined){
+    mqc_heatmap_matrices[target] = new Float32Array(mqc_base64_bytes(pdata['matrix']).buffer);
+  }
+  var values = mqc_heatmap_matrices[target];
+  var ncols = pdata['shape'][1];
+
+  // Which filter matches a sample name, or -1
+  function f_match(name, f_texts, regex_mode){
+    var matched = -1;
+    $.each(f_texts, function(idx, f_text){
+      if(f_text == ''){ return true; }
+      if((regex_mode && name.match(f_text)) || (!regex_mode && name.indexOf(f_text) > -1)){
+        matched = idx;
+      }
+    });
+    return matched;
+  }
+  function axis_order(cats){
+    var idx = [];
+    for(var i = 0; i < cats.length; i++){
+      var hide = f_match(cats[i], window.mqc_hide_f_texts, window.mqc_hide_regex_mode) > -1;
+      if(window.mqc_hide_mode == 'show' && window.mqc_hide_f_texts.length > 0){ hide = !hide; }
+      if(!hide){ idx.push(i); }
+    }
+    // Sort by highlight, keeping the order within each highlight
+    if(config['sortHighlights'] == true && window.mqc_highlight_f_texts.length > 0){
+      var rank = {};
+      $.each(idx, function(n, i){
+        var hl = f_match(cats[i], window.mqc_highlight_f_texts, window.mqc_highlight_regex_mode);
+        rank[i] = hl > -1 ? window.mqc_highlight_f_texts.length - hl : 0;
+      });
+      idx = idx.map(function(i, n){ return [i, n]; })
+        .sort(function(a, b){ return (rank[b[0]] - rank[a[0]]) || (a[1] - b[1]); })
+        .map(function(a){ return a[0]; });
+    }
+    return idx;
+  }
+  var xidx = axis_order(xcats);
+  var yidx = axis_order(ycats);
+
+  // Report / hide the plot if we're hiding stuff
+  var wrapper = $('#'+target).closest('.hc-plot-wrapper');
+  wrapper.parent().find('.samples-hidden-warning').remove();
+  wrapper.show();
+  var num_hidden = Math.max(xcats.length - xidx.length, ycats.length - yidx.length);
+  if(num_hidden > 0){
+    var alert = '<div class="samples-hidden-warning alert alert-warning"><span class="glyphicon glyphicon-info-sign"></span> <strong>Warning:</strong> '+num_hidden+' samples hidden. <a href="#mqc_hidesamples" class="alert-link" onclick="mqc_toolbox_openclose(\'#mqc_hidesamples\', true); return false;">See toolbox.</a></div>';
+    wrapper.before(alert);
+  }
+  if(xidx.length == 0 || yidx.length == 0){
+    wrapper.hide();
+    return false;
+  }
+
+  // Size of the blocks of cells needed to get down to max_cells
+  var max_cells = config['max_cells'] === undefined ? 62500 : config['max_cells'];
+  var step = 1;
+  while(Math.ceil(xidx.length / step) * Math.ceil(yidx.length / step) > max_cells){ step++; }
+
+  // Zoomed in - show a window of cells around the clicked block
+  var zoom = mqc_heatmap_zoom[target];
+  $('.mqc_heatmap_overview[data-target="#'+target+'"]').toggle(zoom !== undefined && step > 1);
+  if(zoom !== undefined && step > 1){
+    var width = Math.ceil(xidx.length / step);
+    var height = Math.ceil(yidx.length / step);
+    var x0 = Math.max(0, Math.min(xidx.length - width, Math.round(zoom['x'] - width / 2)));
+    var y0 = Math.max(0, Math.min(yidx.length - height, Math.round(zoom['y'] - height / 2)));
+    xidx = xidx.slice(x0, x0 + width);
+    yidx = yidx.slice(y0, y0 + height);
+    step = 1;
+  }
+
+  // Block labels and the mean of the values in each block
+  function block_cats(cats, idx){
+    var labels = [];
+    for(var b = 0; b < idx.length; b += step){
+      var n = Math.min(step, idx.length - b);
+      labels.push(n > 1 ? cats[idx[b]]+' (+'+(n - 1)+')' : cats[idx[b]]);
+    }
+    return labels;
+  }
+  var nbx = Math.ceil(xidx.length / step);
+  var nby = Math.ceil(yidx.length / step);
+  var sums = new Float64Array(nbx * nby);
+  var counts = new Uint32Array(nbx * nby);
+  for(var y = 0; y < yidx.length; y++){
+    var row = yidx[y] * ncols;
+    var brow = Math.floor(y / step) * nbx;
+    for(var x = 0; x < xidx.length; x++){
+      var val = values[row + xidx[x]];
+      if(val === val){ // not NaN
+        var b = brow + Math.floor(x / step);
+        sums[b] += val;
+        counts[b] += 1;
+      }
+    }
+  }
+  var data = [];
+  for(var by = 0; by < nby; by++){
+    for(var bx = 0; bx < nbx; bx++){
+      var b = by * nbx + bx;
+      if(counts[b] > 0){
+        data.push([bx, by, sums[b] / counts[b]]);
+      }
+    }
+  }
+  return {
+    'data': data,
+    'xcats': block_cats(xcats, xidx),
+    'ycats': block_cats(ycats, yidx),
+    'step': step
+  };
+}
+
 // Call to render any plot
 function plot_graph(target, ds, max_num){
   if(mqc_plots[target] === undefined){ return false; }
@@ -1157,9 +1346,12 @@ function plot_heatmap(target, ds){
 
   // Make a clone of the data, so that we can mess with it,
   // while keeping the original data in tact
-  var data = JSON.parse(JSON.stringify(mqc_plots[target]['data']));
   var xcats = JSON.parse(JSON.stringify(mqc_plots[target]['xcats']));
   var ycats = JSON.parse(JSON.stringify(mqc_plots[target]['ycats']));
+  var is_matrix = mqc_plots[target]['matrix'] !== undefined;
+  if(!is_matrix){
+    var data = JSON.parse(JSON.stringify(mqc_plots[target]['data']));
+  }
 
   // Rename samples
   if(window.mqc_rename_f_texts.length > 0){
@@ -1185,9 +1377,19 @@ function plot_heatmap(target, ds){
     }
   }
 
+  // Big heatmaps - sort, hide and average blocks of cells
+  var view = undefined;
+  if(is_matrix){
+    view = heatmap_matrix_view(target, config, xcats, ycats);
+    if(view === false){ return false; }
+    data = view['data'];
+    xcats = view['xcats'];
+    ycats = view['ycats'];
+  }
+
   // Sort samples by highlight
   $('.mqc_heatmap_sortHighlight').attr('disabled', false);
-  if(config['sortHighlights'] == true){
+  if(config['sortHighlights'] == true && !is_matrix){
     if(window.mqc_highlight_f_texts.length > 0){
       // Collect the highlighting indices
       var xcat_hl = Array();
@@ -1240,9 +1442,11 @@ function plot_heatmap(target, ds){
 
   // Hide samples
   var num_total = Math.max(xcats.length, ycats.length);
-  $('#'+target).closest('.hc-plot-wrapper').parent().find('.samples-hidden-warning').remove();
-  $('#'+target).closest('.hc-plot-wrapper').show();
-  if(window.mqc_hide_f_texts.length > 0){
+  if(!is_matrix){
+    $('#'+target).closest('.hc-plot-wrapper').parent().find('.samples-hidden-warning').remove();
+    $('#'+target).closest('.hc-plot-wrapper').show();
+  }
+  if(window.mqc_hide_f_texts.length > 0 && !is_matrix){
     var remove = Array();
     var i = xcats.length;
     var xhidden = 0;
@@ -1424,6 +1628,16 @@ function plot_heatmap(target, ds){
             mouseOver: function() {
               // Stop highcharts making squares blue on hover
               this.pointAttr.hover.fill = this.color;
+            },
+            click: function() {
+              // Zoom in on a block of cells in a big heatmap
+              if(view !== undefined && view['step'] > 1){
+                mqc_heatmap_zoom[target] = {
+                  x: (this.x + 0.5) * view['step'],
+                  y: (this.y + 0.5) * view['step']
+                };
+                plot_heatmap(target);
+              }
             }
           }
         },
@@ -1438,6 +1652,9 @@ function plot_heatmap(target, ds){
     title: {
       text: config['title'],
     },
+    subtitle: {
+      text: view !== undefined && view['step'] > 1 ? 'Mean of blocks of up to '+view['step']+' &times; '+view['step']+' cells. Click a block to zoom in.' : undefined
+    },
     xAxis: {
       endOnTick: false,
       maxPadding: 0,
@@ -17,17 +17,29 @@ $(function () {
     var strip_non_numeric = function(node){
       return node.innerText.replace(/[^\d.-]/g, '');
     }
-    $('.mqc_table').tablesorter({sortInitialOrder: 'desc', textExtraction: strip_non_numeric});
+    $('.mqc_table:not(.mqc_table_virtual)').tablesorter({sortInitialOrder: 'desc', textExtraction: strip_non_numeric});
 
     // Update tablesorter if samples renamed
     $(document).on('mqc_renamesamples', function(e, f_texts, t_texts, regex_mode){
-      $('.mqc_table').trigger('update');
+      $('.mqc_table:not(.mqc_table_virtual)').trigger('update');
     });
 
+    // Virtual tables - wait for the plot data to be loaded
+    if($('.mqc_table_virtual').length > 0){
+      setTimeout(function(){
+        $('.mqc_table_virtual').each(function(){
+          mqc_vtable_init($(this).attr('id'));
+        });
+      }, 0);
+    }
+
     // Copy table contents to clipboard
     var clipboard = new Clipboard('.mqc_table_copy_btn');
     clipboard.on('success', function(e) { e.clearSelection(); });
-    $('.mqc_table_copy_btn').click(function(){
+    new Clipboard('.mqc_table_copy_btn_virtual', {
+      text: function(trigger){ return mqc_vtable_text($(trigger).data('target').replace(/^#/, '')); }
+    });
+    $('.mqc_table_copy_btn, .mqc_table_copy_btn_virtual').click(function(){
       var btn = $(this);
       btn.addClass('active').html('<span class="glyphicon glyphicon-copy"></span> Copied!');
       setTimeout(function(){
@@ -47,7 +59,12 @@ $(function () {
     // Expand tables to full height
     $('.mqc-table-expand').click(function(){
       if($(this).find('span').hasClass('glyphicon-chevron-down')){
-        $(this).parent().find('.mqc-table-responsive').css('max-height', 'none');
+        // Virtual tables need to scroll, so only make them as tall as the window
+        if($(this).parent().find('.mqc_table_virtual').length > 0){
+          $(this).parent().find('.mqc-table-responsive').css('max-height', Math.max(500, $(window).height() - 100)+'px').scroll();
+        } else {
+          $(this).parent().find('.mqc-table-responsive').css('max-height', 'none');
+        }
         $(this).find('span').removeClass('glyphicon-chevron-down').addClass('glyphicon-chevron-up');
       } else {
         $(this).parent().find('.mqc-table-responsive').css('max-height', '400px');
@@ -80,6 +97,12 @@ $(function () {
           $(target+'_configModal_table .'+cclass).addClass('text-muted');
         }
       });
+      // Virtual tables work out which rows to show from the data
+      if($(target).hasClass('mqc_table_virtual')){
+        mqc_vtable_update(target.replace(/^#/, ''));
+        $(target+'_numcols').text( $(target+' thead th:visible').length - 1 );
+        return;
+      }
       // Hide empty rows
       $(target+' tbody tr').show();
       $(target+' tbody tr').each(function(){
@@ -120,8 +143,8 @@ $(function () {
     // highlight samples
     $(document).on('mqc_highlights', function(e, f_texts, f_cols, regex_mode){
       $('.mqc_table_sortHighlight').hide();
-      $('.mqc_table tbody th').removeClass('highlighted').removeData('highlight');
-      $('.mqc_table tbody th').each(function(i){
+      $('.mqc_table:not(.mqc_table_virtual) tbody th').removeClass('highlighted').removeData('highlight');
+      $('.mqc_table:not(.mqc_table_virtual) tbody th').each(function(i){
         var th = $(this);
         var thtext = $(this).text();
         var thiscol = '#333';
@@ -134,12 +157,23 @@ $(function () {
         });
         $(this).css('color', thiscol);
       });
+      $.each(mqc_vtables, function(tid, vt){
+        if(mqc_vtable_highlight(tid, f_texts, f_cols, regex_mode)){
+          $('.mqc_table_sortHighlight').show();
+        }
+      });
     });
 
     // Sort MultiQC tables by highlight
     $('.mqc_table_sortHighlight').click(function(e){
       e.preventDefault();
       var target = $(this).data('target');
+      // Virtual tables are sorted in the data
+      if($(target).hasClass('mqc_table_virtual')){
+        mqc_vtable_sort_highlight(target.replace(/^#/, ''), $(this).data('direction'));
+        $(this).data('direction', $(this).data('direction') == 'desc' ? 'asc' : 'desc');
+        return;
+      }
       // collect highlighted rows
       var hrows = $(target+' tbody th.highlighted').parent().detach();
       hrows = hrows.sort(function (a, b) {
@@ -157,7 +191,10 @@ $(function () {
 
     // Rename samples
     $(document).on('mqc_renamesamples', function(e, f_texts, t_texts, regex_mode){
-      $(".mqc_table tbody th").each(function(){
+      $.each(mqc_vtables, function(tid, vt){
+        mqc_vtable_rename(tid, f_texts, t_texts, regex_mode);
+      });
+      $(".mqc_table:not(.mqc_table_virtual) tbody th").each(function(){
         var s_name = $(this).data('original-sn');
         $.each(f_texts, function(idx, f_text){
           if(regex_mode){
@@ -175,7 +212,10 @@ $(function () {
     $(document).on('mqc_hidesamples', function(e, f_texts, regex_mode){
 
       // Hide rows in MultiQC tables
-      $(".mqc_table tbody th").each(function(){
+      $.each(mqc_vtables, function(tid, vt){
+        mqc_vtable_hide(tid, f_texts, regex_mode);
+      });
+      $(".mqc_table:not(.mqc_table_virtual) tbody th").each(function(){
         var match = false;
         var hfilter = $(this).text();
         $.each(f_texts, function(idx, f_text){
@@ -194,11 +234,13 @@ $(function () {
       });
       $('.mqc_table_numrows').each(function(){
         var tid = $(this).attr('id').replace('_numrows','');
-        $(this).text( $('#'+tid+' tbody tr:visible').length );
+        if(mqc_vtables[tid] === undefined){
+          $(this).text( $('#'+tid+' tbody tr:visible').length );
+        }
       });
 
       // Hide empty columns
-      $('.mqc_table').each(function(){
+      $('.mqc_table:not(.mqc_table_virtual)').each(function(){
         var table = $(this);
         var gsthidx = 0;
         table.find("thead th, tbody tr td").show();
@@ -281,7 +323,10 @@ $(function () {
         },
         'datasets': [[]]
       };
-      $(tid+' tbody tr').each(function(e){
+      if(mqc_vtables[tid.replace(/^#/, '')] !== undefined){
+        mqc_vtable_scatter(tid.replace(/^#/, ''), col1, col2, mqc_plots['tableScatterPlot']['datasets'][0]);
+      }
+      $(tid+':not(.mqc_table_virtual) tbody tr').each(function(e){
         var s_name = $(this).children('th.rowheader').text();
         var val_1 = $(this).children('td.'+col1).text().replace(/[^\d\.]/g,'');
         var val_2 = $(this).children('td.'+col2).text().replace(/[^\d\.]/g,'');
@@ -348,3 +393,307 @@ function change_mqc_table_col_order(table){
     }
   });
 }
+
+
+////////////////////////////////////////////////
+// Virtual tables
+// Big tables have their rows saved in mqc_plots instead of the page.
+// Only the rows scrolled into view (plus a few either side) are added
+// to the table body. Sorting, hiding and renaming samples work on the
+// data and then redraw these rows.
+////////////////////////////////////////////////
+
+var mqc_vtables = {};
+var mqc_vtable_buffer = 20;
+
+function mqc_vtable_init(tid){
+  var pdata = mqc_plots[tid];
+  if(pdata === undefined || pdata['plot_type'] != 'table'){ return false; }
+  var num_rows = pdata['samples'].length;
+  var vt = {
+    'data': pdata,
+    'names': pdata['samples'].slice(),
+    'order': [],
+    'hidden': [],
+    'empty': [],
+    'highlight': [],
+    'rows': [],
+    'sort_col': undefined,
+    'sort_dir': undefined,
+    'row_height': 30,
+    'first': -1,
+    'last': -1
+  };
+  for(var i = 0; i < num_rows; i++){
+    vt['order'].push(i);
+    vt['hidden'].push(false);
+    vt['empty'].push(false);
+    vt['highlight'].push(undefined);
+  }
+  mqc_vtables[tid] = vt;
+
+  // Draw more rows when scrolling
+  var container = $('#'+tid).closest('.mqc-table-responsive');
+  container.scroll(function(){ mqc_vtable_draw(tid); });
+
+  // Sort by clicking the column headers
+  $('#'+tid+' thead th').click(function(){
+    var col = $(this).hasClass('rowheader') ? null : $(this).attr('id').replace(/^header_/, '');
+    var dir = 'desc';
+    if(vt['sort_col'] === col && vt['sort_dir'] == 'desc'){ dir = 'asc'; }
+    $('#'+tid+' thead th').removeClass('headerSortDown headerSortUp');
+    $(this).addClass(dir == 'desc' ? 'headerSortDown' : 'headerSortUp');
+    mqc_vtable_sort(tid, col, dir);
+  });
+
+  // Apply any toolbox filters that were set before the table was ready
+  mqc_vtable_rename(tid, window.mqc_rename_f_texts, window.mqc_rename_t_texts, window.mqc_rename_regex_mode, false);
+  mqc_vtable_highlight(tid, window.mqc_highlight_f_texts, window.mqc_highlight_f_cols, window.mqc_highlight_regex_mode, false);
+  if(window.mqc_hide_f_texts.length > 0 || window.mqc_hide_mode == 'show'){
+    mqc_vtable_hide(tid, window.mqc_hide_f_texts, window.mqc_hide_regex_mode, false);
+  }
+  mqc_vtable_update(tid);
+}
+
+// Visible columns in the order of the table header
+function mqc_vtable_columns(tid){
+  var cols = [];
+  $('#'+tid+' thead th').each(function(){
+    if($(this).hasClass('rowheader')){ return true; }
+    cols.push({
+      'rid': $(this).attr('id').replace(/^header_/, ''),
+      'hidden': $(this).hasClass('hidden'),
+      'empty': $(this).css('display') == 'none'
+    });
+  });
+  return cols;
+}
+
+// Work out which rows are shown, update the counts and redraw
+function mqc_vtable_update(tid){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return false; }
+  var data = vt['data']['data'];
+  var cols = mqc_vtable_columns(tid);
+
+  // Hide empty rows
+  for(var i = 0; i < vt['data']['samples'].length; i++){
+    var hasVal = false;
+    for(var j = 0; j < cols.length; j++){
+      if(cols[j]['hidden'] || cols[j]['empty']){ continue; }
+      var val = data[cols[j]['rid']]['vals'][i];
+      if(val !== null && val !== undefined && val !== ''){ hasVal = true; break; }
+    }
+    vt['empty'][i] = !hasVal;
+  }
+
+  vt['rows'] = [];
+  for(var k = 0; k < vt['order'].length; k++){
+    var r = vt['order'][k];
+    if(!vt['hidden'][r] && !vt['empty'][r]){
+      vt['rows'].push(r);
+    }
+  }
+  $('#'+tid+'_numrows').text(vt['rows'].length);
+  mqc_vtable_draw(tid, true);
+}
+
+// Add the rows that are in view to the table body
+function mqc_vtable_draw(tid, force){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return false; }
+  var container = $('#'+tid).closest('.mqc-table-responsive');
+  var num_rows = vt['rows'].length;
+  var view_rows = Math.ceil(container.height() / vt['row_height']);
+  var first = Math.floor(container.scrollTop() / vt['row_height']) - mqc_vtable_buffer;
+  first = Math.max(0, Math.min(first, num_rows - view_rows - mqc_vtable_buffer));
+  var last = Math.min(num_rows, first + view_rows + (2 * mqc_vtable_buffer));
+  if(!force && first == vt['first'] && last == vt['last']){ return true; }
+  vt['first'] = first;
+  vt['last'] = last;
+
+  var data = vt['data']['data'];
+  var cols = mqc_vtable_columns(tid);
+  var html = ['<tr class="mqc_table_vspacer" style="height:'+(first * vt['row_height'])+'px;"></tr>'];
+  for(var k = first; k < last; k++){
+    var i = vt['rows'][k];
+    var hl = vt['highlight'][i];
+    html.push('<tr><th class="rowheader'+(hl !== undefined ? ' highlighted' : '')+'" data-original-sn="'+vt['data']['samples'][i]+'"');
+    html.push(' style="color:'+(hl !== undefined ? hl['col'] : '#333')+';">'+vt['names'][i]+'</th>');
+    for(var j = 0; j < cols.length; j++){
+      var rid = cols[j]['rid'];
+      var col = data[rid];
+      var cclass = rid + (cols[j]['hidden'] ? ' hidden' : '');
+      var style = cols[j]['empty'] ? ' style="display:none;"' : '';
+      var val = col['vals'][i];
+      if(val === null || val === undefined){
+        html.push('<td class="data-coloured '+cclass+'"'+style+'></td>');
+      } else if(col['bars'] === undefined){
+        html.push('<td class="'+cclass+'"'+style+'>'+val+'</td>');
+      } else {
+        var bg = col['colours'] !== undefined ? ' background-color:'+col['palette'][col['colours'][i]]+';' : '';
+        html.push('<td class="data-coloured '+cclass+'"'+style+'><div class="wrapper"><span class="bar" style="width:'+col['bars'][i]+'%;'+bg+'"></span><span class="val">'+val+'</span></div></td>');
+      }
+    }
+    html.push('</tr>');
+  }
+  html.push('<tr class="mqc_table_vspacer" style="height:'+((num_rows - last) * vt['row_height'])+'px;"></tr>');
+  $('#'+tid+' tbody').html(html.join(''));
+
+  // Use the real row height for the spacers once there are rows to measure
+  var row = $('#'+tid+' tbody tr:not(.mqc_table_vspacer)').first();
+  if(row.length > 0 && row.outerHeight() > 0 && Math.abs(row.outerHeight() - vt['row_height']) > 0.5){
+    vt['row_height'] = row.outerHeight();
+    mqc_vtable_draw(tid, true);
+  }
+}
+
+// Sort the rows by a column, or by sample name if col is null
+function mqc_vtable_sort(tid, col, dir){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return false; }
+  vt['sort_col'] = col;
+  vt['sort_dir'] = dir;
+  var vals = col === null ? vt['names'] : vt['data']['data'][col]['sort'];
+  var sign = dir == 'desc' ? -1 : 1;
+  // Position in the current order, to keep ties where they are
+  var pos = [];
+  for(var k = 0; k < vt['order'].length; k++){ pos[vt['order'][k]] = k; }
+  vt['order'].sort(function(a, b){
+    var va = vals[a], vb = vals[b];
+    // Empty cells always go last, then numbers before text
+    var ea = (va === null || va === undefined), eb = (vb === null || vb === undefined);
+    if(ea || eb){
+      if(ea && eb){ return pos[a] - pos[b]; }
+      return ea ? 1 : -1;
+    }
+    if(typeof va != typeof vb){ return typeof va == 'number' ? -1 : 1; }
+    if(va < vb){ return -1 * sign; }
+    if(va > vb){ return sign; }
+    return pos[a] - pos[b];
+  });
+  mqc_vtable_update(tid);
+}
+
+// Move highlighted rows to the top (desc) or the bottom (asc) of the table
+function mqc_vtable_sort_highlight(tid, dir){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return false; }
+  var hrows = [];
+  var rows = [];
+  $.each(vt['order'], function(k, i){
+    if(vt['highlight'][i] !== undefined){ hrows.push(i); } else { rows.push(i); }
+  });
+  hrows.sort(function(a, b){ return vt['highlight'][a]['idx'] - vt['highlight'][b]['idx']; });
+  if(dir == 'desc'){
+    vt['order'] = hrows.reverse().concat(rows);
+  } else {
+    vt['order'] = rows.concat(hrows);
+  }
+  $('#'+tid+' thead th').removeClass('headerSortDown headerSortUp');
+  vt['sort_col'] = undefined;
+  mqc_vtable_update(tid);
+}
+
+// Returns true if any samples were highlighted
+function mqc_vtable_highlight(tid, f_texts, f_cols, regex_mode, redraw){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return false; }
+  var found = false;
+  for(var i = 0; i < vt['names'].length; i++){
+    var s_name = vt['names'][i];
+    vt['highlight'][i] = undefined;
+    $.each(f_texts, function(idx, f_text){
+      if((regex_mode && s_name.match(f_text)) || (!regex_mode && s_name.indexOf(f_text) > -1)){
+        vt['highlight'][i] = { 'idx': idx, 'col': f_cols[idx] };
+        found = true;
+      }
+    });
+  }
+  if(redraw !== false){ mqc_vtable_draw(tid, true); }
+  return found;
+}
+
+function mqc_vtable_rename(tid, f_texts, t_texts, regex_mode, redraw){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return false; }
+  $.each(vt['data']['samples'], function(i, s_name){
+    $.each(f_texts, function(idx, f_text){
+      if(regex_mode){
+        var re = new RegExp(f_text,"g");
+        s_name = s_name.replace(re, t_texts[idx]);
+      } else {
+        s_name = s_name.replace(f_text, t_texts[idx]);
+      }
+    });
+    vt['names'][i] = s_name;
+  });
+  if(redraw !== false){ mqc_vtable_draw(tid, true); }
+}
+
+// Hide samples, then hide columns with no values for the samples left
+function mqc_vtable_hide(tid, f_texts, regex_mode, redraw){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return false; }
+  for(var i = 0; i < vt['names'].length; i++){
+    var s_name = vt['names'][i];
+    var match = false;
+    $.each(f_texts, function(idx, f_text){
+      if((regex_mode && s_name.match(f_text)) || (!regex_mode && s_name.indexOf(f_text) > -1)){
+        match = true;
+      }
+    });
+    if(window.mqc_hide_mode == 'show'){
+      match = !match;
+    }
+    vt['hidden'][i] = match;
+  }
+  $.each(vt['data']['data'], function(rid, col){
+    var count = 0;
+    for(var i = 0; i < col['vals'].length; i++){
+      if(!vt['hidden'][i] && col['vals'][i] !== null && col['vals'][i] !== ''){ count += 1; break; }
+    }
+    if(count == 0){
+      $('#'+tid+' thead th#header_'+rid).hide();
+    } else {
+      $('#'+tid+' thead th#header_'+rid).show();
+    }
+  });
+  $('#'+tid+'_numcols').text( $('#'+tid+' thead th:visible').length - 1 );
+  if(redraw !== false){ mqc_vtable_update(tid); }
+}
+
+// Tab-separated text of the shown rows and columns, for copying the table
+function mqc_vtable_text(tid){
+  var vt = mqc_vtables[tid];
+  if(vt === undefined){ return ''; }
+  var cols = $.grep(mqc_vtable_columns(tid), function(c){ return !c['hidden'] && !c['empty']; });
+  var strip = $('<div>');
+  var lines = [];
+  var header = [$('#'+tid+' thead th.rowheader').text()];
+  $.each(cols, function(j, c){ header.push($('#'+tid+' thead th#header_'+c['rid']).text().trim()); });
+  lines.push(header.join('\t'));
+  $.each(vt['rows'], function(k, i){
+    var line = [vt['names'][i]];
+    $.each(cols, function(j, c){
+      var val = vt['data']['data'][c['rid']]['vals'][i];
+      line.push(val === null || val === undefined ? '' : strip.html(val).text());
+    });
+    lines.push(line.join('\t'));
+  });
+  return lines.join('\n');
+}
+
+// Add x/y pairs for two columns to a scatter plot dataset
+function mqc_vtable_scatter(tid, col1, col2, dataset){
+  var vt = mqc_vtables[tid];
+  var data = vt['data']['data'];
+  if(data[col1] === undefined || data[col2] === undefined){ return false; }
+  $.each(vt['rows'], function(k, i){
+    var x = data[col1]['sort'][i];
+    var y = data[col2]['sort'][i];
+    if(typeof x == 'number' && typeof y == 'number'){
+      dataset.push({ 'name': vt['names'][i], 'x': x, 'y': y });
+    }
+  });
+}
@@ -53,9 +53,10 @@ $(function () {
     }
   });
 
-  // Listener to re-plot graphs if config loaded
+  // Listener to re-plot graphs if config loaded. Plots that haven't
+  // been drawn yet will use the config when they scroll into view.
   $(document).on('mqc_config_loaded', function(e){
-    $('.hc-plot').each(function(){
+    $('.hc-plot:not(.not_rendered)').each(function(){
       var target = $(this).attr('id');
       plot_graph(target, undefined, num_datasets_plot_limit);
     });
@@ -210,106 +211,110 @@ $(function () {
     // Export the plots
     $('#mqc_exportplots').submit(function(e){
       e.preventDefault();
-      var skipped_plots = 0;
-      ////// EXPORT PLOT IMAGES
-      //////
-      if($('#mqc_image_download').is(':visible')){
-        var ft = $('#mqc_export_ft').val();
-        var f_scale = parseInt($('#mqc_export_scaling').val());
-        var f_width = parseInt($('#mqc_exp_width').val()) / f_scale;
-        var f_height = parseInt($('#mqc_exp_height').val()) / f_scale;
-        $('#mqc_export_selectplots input:checked').each(function(){
-          var fname = $(this).val();
-          var hc = $('#'+fname).highcharts();
-          var cfg = {
-            type: ft,
-            filename: fname,
-            sourceWidth: f_width,
-            sourceHeight: f_height,
-            scale: f_scale
-          };
-          if(hc !== undefined){
-            hc.exportChartLocal(cfg);
-          } else if($('#'+fname).hasClass('has-custom-export')){
-            $('#'+fname).trigger('mqc_plotexport_image', cfg);
-          } else {
-            skipped_plots += 1;
+      // Plots that haven't been scrolled into view need to be drawn first
+      var targets = $('#mqc_export_selectplots input:checked').map(function(){ return $(this).val(); }).get();
+      mqc_render_plots(targets, function(){
+        var skipped_plots = 0;
+        ////// EXPORT PLOT IMAGES
+        //////
+        if($('#mqc_image_download').is(':visible')){
+          var ft = $('#mqc_export_ft').val();
+          var f_scale = parseInt($('#mqc_export_scaling').val());
+          var f_width = parseInt($('#mqc_exp_width').val()) / f_scale;
+          var f_height = parseInt($('#mqc_exp_height').val()) / f_scale;
+          $('#mqc_export_selectplots input:checked').each(function(){
+            var fname = $(this).val();
+            var hc = $('#'+fname).highcharts();
+            var cfg = {
+              type: ft,
+              filename: fname,
+              sourceWidth: f_width,
+              sourceHeight: f_height,
+              scale: f_scale
+            };
+            if(hc !== undefined){
+              hc.exportChartLocal(cfg);
+            } else if($('#'+fname).hasClass('has-custom-export')){
+              $('#'+fname).trigger('mqc_plotexport_image', cfg);
+            } else {
+              skipped_plots += 1;
+            }
+          });
+          if(skipped_plots > 0){
+            alert("Warning: "+skipped_plots+" plots skipped.\n\nNote that it is not currently possible to export dot plot images from reports. Data exports do work.");
           }
-        });
-        if(skipped_plots > 0){
-          alert("Warning: "+skipped_plots+" plots skipped.\n\nNote that it is not currently possible to export dot plot images from reports. Data exports do work.");
         }
-      }
-      ////// EXPORT PLOT DATA
-      //////
-      else if($('#mqc_data_download').is(':visible')){
-        $('#mqc_export_selectplots input:checked').each(function(){
-          try {
-            var target = $(this).val();
-            var ft = $('#mqc_export_data_ft').val();
-            var fname = target+'.'+ft;
-            var sep = ft == 'tsv' ? "\t" : ',';
-            // Custom plot not in mqc_plots
-            if (mqc_plots[target] == undefined){
-              if($('#'+target).hasClass('has-custom-export')){
-                $('#'+target).trigger('mqc_plotexport_data', { 'target': target, 'ft': ft, 'fname': fname, 'sep': sep });
-              } else {
-                skipped_plots += 1;
-              }
-            }
-            // If JSON then just dump everything
-            else if(ft == 'json'){
-              json_str = JSON.stringify(mqc_plots[target], null, 2);
-              var blob = new Blob([json_str], {type: "text/plain;charset=utf-8"});
-              saveAs(blob, fname);
-            }
-            // Beeswarm plots must be done manually
-            else if(mqc_plots[target]['plot_type'] == 'beeswarm'){
-              // Header line
-              datastring = 'Sample';
-              for(var j=0; j<mqc_plots[target]['categories'].length; j++){
-                datastring += sep+mqc_plots[target]['categories'][j]['description'];
-              }
-              datastring += "\n";
-              // This assumes that the same samples are in all rows
-              // TODO: Check and throw error if this isn't the case
-              var rows = Array();
-              for(var j=0; j<mqc_plots[target]['samples'][0].length; j++){
-                rows[j]=Array(mqc_plots[target]['samples'][0][j]);
-              }
-              for(var j=0; j<mqc_plots[target]['datasets'].length; j++){
-                for(var k=0; k<mqc_plots[target]['datasets'][j].length; k++){
-                  rows[k].push(mqc_plots[target]['datasets'][j][k]);
+        ////// EXPORT PLOT DATA
+        //////
+        else if($('#mqc_data_download').is(':visible')){
+          $('#mqc_export_selectplots input:checked').each(function(){
+            try {
+              var target = $(this).val();
+              var ft = $('#mqc_export_data_ft').val();
+              var fname = target+'.'+ft;
+              var sep = ft == 'tsv' ? "\t" : ',';
+              // Custom plot not in mqc_plots
+              if (mqc_plots[target] == undefined){
+                if($('#'+target).hasClass('has-custom-export')){
+                  $('#'+target).trigger('mqc_plotexport_data', { 'target': target, 'ft': ft, 'fname': fname, 'sep': sep });
+                } else {
+                  skipped_plots += 1;
                 }
               }
-              for(var j=0; j<rows.length; j++){
-                datastring += rows[j].join(sep)+"\n";
+              // If JSON then just dump everything
+              else if(ft == 'json'){
+                json_str = JSON.stringify(mqc_plots[target], null, 2);
+                var blob = new Blob([json_str], {type: "text/plain;charset=utf-8"});
+                saveAs(blob, fname);
               }
-              var blob = new Blob([datastring], {type: "text/plain;charset=utf-8"});
-              saveAs(blob, fname);
-            }
-            // Normal plot - use HighCharts plugin to get the data from the plot
-            else if(ft == 'tsv' || ft == 'csv'){
-              var hc = $('#'+target).highcharts();
-              if(hc !== undefined){
-                hc.update({ exporting: { csv: { itemDelimiter: sep } } });
-                var blob = new Blob([hc.getCSV()], {type: "text/plain;charset=utf-8"});
+              // Beeswarm plots must be done manually
+              else if(mqc_plots[target]['plot_type'] == 'beeswarm'){
+                // Header line
+                datastring = 'Sample';
+                for(var j=0; j<mqc_plots[target]['categories'].length; j++){
+                  datastring += sep+mqc_plots[target]['categories'][j]['description'];
+                }
+                datastring += "\n";
+                // This assumes that the same samples are in all rows
+                // TODO: Check and throw error if this isn't the case
+                var rows = Array();
+                for(var j=0; j<mqc_plots[target]['samples'][0].length; j++){
+                  rows[j]=Array(mqc_plots[target]['samples'][0][j]);
+                }
+                for(var j=0; j<mqc_plots[target]['datasets'].length; j++){
+                  for(var k=0; k<mqc_plots[target]['datasets'][j].length; k++){
+                    rows[k].push(mqc_plots[target]['datasets'][j][k]);
+                  }
+                }
+                for(var j=0; j<rows.length; j++){
+                  datastring += rows[j].join(sep)+"\n";
+                }
+                var blob = new Blob([datastring], {type: "text/plain;charset=utf-8"});
                 saveAs(blob, fname);
+              }
+              // Normal plot - use HighCharts plugin to get the data from the plot
+              else if(ft == 'tsv' || ft == 'csv'){
+                var hc = $('#'+target).highcharts();
+                if(hc !== undefined){
+                  hc.update({ exporting: { csv: { itemDelimiter: sep } } });
+                  var blob = new Blob([hc.getCSV()], {type: "text/plain;charset=utf-8"});
+                  saveAs(blob, fname);
+                } else {
+                  skipped_plots += 1;
+                }
               } else {
                 skipped_plots += 1;
               }
-            } else {
+            } catch(e){
+              console.error(e);
               skipped_plots += 1;
             }
-          } catch(e){
-            console.error(e);
-            skipped_plots += 1;
+          });
+          if(skipped_plots > 0){
+            alert("Warning: Could not export data from "+skipped_plots+" plots.");
           }
-        });
-        if(skipped_plots > 0){
-          alert("Warning: Could not export data from "+skipped_plots+" plots.");
-        }
-      } else { alert("Error - don't know what to export!"); }
+        } else { alert("Error - don't know what to export!"); }
+      });
     });
   } else {
     $('#mqc_exportplots').hide();
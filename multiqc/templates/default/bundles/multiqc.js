@@ -0,0 +1,14 @@
+{# #######################
+  bundles/multiqc.js
+##########################
+
+All of the core JavaScript in one file, written to the shared assets
+directory with --shared-assets. Files are separated with a semicolon
+in case one doesn't end with one.
+
+#}
+{%- from 'asset_files.html' import core_js %}
+{% for js in core_js %}
+{{ include_file(js) }}
+;
+{% endfor %}
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+""" MultiQC data bundle. With the sqlite data format, all of the parsed data
+is saved in one SQLite file in the data directory instead of a file for each
+table. Holds the module data tables, plot data files, general statistics,
+data sources and the interactive plot data, indexed so that single modules,
+tables or samples can be read without loading the rest.
+
+Reading a bundle:
+
+    from multiqc.utils.data_bundle import DataBundle
+    with DataBundle('multiqc_data') as bundle:
+        bundle.tables(module='fastqc')
+        bundle.get('multiqc_fastqc', sample='SAMPLE_1')
+        bundle.sample('SAMPLE_1')
+"""
+
+from __future__ import print_function
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+
+from multiqc.utils import config, timings
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+bundle_fn = 'multiqc_data.sqlite'
+
+schema = [
+    'CREATE TABLE IF NOT EXISTS tables (name TEXT PRIMARY KEY, module TEXT)',
+    'CREATE TABLE IF NOT EXISTS data (tbl TEXT, sample TEXT, field TEXT, value, is_json INTEGER)',
+    'CREATE INDEX IF NOT EXISTS data_tbl_sample ON data (tbl, sample)',
+    'CREATE INDEX IF NOT EXISTS data_sample ON data (sample)',
+    'CREATE TABLE IF NOT EXISTS sources (module TEXT, section TEXT, sample TEXT, source TEXT)',
+    'CREATE INDEX IF NOT EXISTS sources_module ON sources (module)',
+    'CREATE INDEX IF NOT EXISTS sources_sample ON sources (sample)',
+    'CREATE TABLE IF NOT EXISTS plots (id TEXT PRIMARY KEY, plot_type TEXT, data TEXT)'
+]
+
+scalar_types = (int, float, type(''), type(u''))
+
+def get_bundle_fn(data_dir=None):
+    """ Path to the data bundle in a data directory, defaults to config.data_dir """
+    return os.path.join(config.data_dir if data_dir is None else data_dir, bundle_fn)
+
+def connect(path):
+    """ Open a bundle for writing. Modules run in other processes write to the same file. """
+    conn = sqlite3.connect(path, timeout=60)
+    with conn:
+        for sql in schema:
+            conn.execute(sql)
+    return conn
+
+def encode_value(v):
+    """ Numbers, text and nulls are saved as they are, anything else as JSON """
+    if v is None or (isinstance(v, scalar_types) and not isinstance(v, bool)):
+        return (v, 0)
+    return (json.dumps(v, default=str), 1)
+
+def decode_value(v, is_json):
+    return json.loads(v) if is_json else v
+
+def write_table(name, data, module=None):
+    """ Save a 2D dict (sample name: field: value) to the bundle, replacing any table with the same name """
+    if module is None:
+        module = timings.current_module
+    rows = list()
+    for sn in sorted(data.keys()):
+        for k, v in data[sn].items():
+            rows.append((name, str(sn), str(k)) + encode_value(v))
+    conn = connect(get_bundle_fn())
+    try:
+        with conn:
+            conn.execute('DELETE FROM data WHERE tbl = ?', (name,))
+            conn.execute('INSERT OR REPLACE INTO tables VALUES (?, ?)', (name, module))
+            conn.executemany('INSERT INTO data VALUES (?, ?, ?, ?, ?)', rows)
+    finally:
+        conn.close()
+
+def write_sources(data_sources):
+    """ Save report.data_sources (module: section: sample name: source) """
+    rows = list()
+    for mod in data_sources:
+        for sec in data_sources[mod]:
+            for s_name, source in data_sources[mod][sec].items():
+                rows.append((mod, sec, s_name, source))
+    conn = connect(get_bundle_fn())
+    try:
+        with conn:
+            conn.execute('DELETE FROM sources')
+            conn.executemany('INSERT INTO sources VALUES (?, ?, ?, ?)', rows)
+    finally:
+        conn.close()
+
+def write_plots(plot_data):
+    """ Save the data for the interactive plots (report.plot_data), as JSON for each plot """
+    rows = [ (pid, pdata.get('plot_type'), json.dumps(pdata, default=str)) for pid, pdata in plot_data.items() ]
+    conn = connect(get_bundle_fn())
+    try:
+        with conn:
+            conn.execute('DELETE FROM plots')
+            conn.executemany('INSERT INTO plots VALUES (?, ?, ?)', rows)
+    finally:
+        conn.close()
+
+def copy_tables(src_path, names, optional=()):
+    """ Copy tables from an older bundle into this one, eg. for --incremental.
+    Returns False if any of names are missing. Tables in optional are copied if found. """
+    if not os.path.exists(src_path):
+        return False
+    conn = connect(get_bundle_fn())
+    try:
+        conn.execute('ATTACH DATABASE ? AS src', (src_path,))
+        found = set([ r[0] for r in conn.execute('SELECT name FROM src.tables') ])
+        if not set(names) <= found:
+            return False
+        with conn:
+            for name in set(names) | (set(optional) & found):
+                conn.execute('DELETE FROM data WHERE tbl = ?', (name,))
+                conn.execute('INSERT OR REPLACE INTO tables SELECT * FROM src.tables WHERE name = ?', (name,))
+                conn.execute('INSERT INTO data SELECT * FROM src.data WHERE tbl = ?', (name,))
+        return True
+    except sqlite3.Error as e:
+        logger.debug("Could not copy tables from data bundle {}: {}".format(src_path, e))
+        return False
+    finally:
+        conn.close()
+
+
+class DataBundle(object):
+    """
+    Read a MultiQC data bundle. path can be the bundle file or the data
+    directory that holds it. Tables are returned as OrderedDicts of
+    sample name: field: value, the same as the dicts that were saved.
+    """
+
+    def __init__(self, path):
+        if os.path.isdir(path):
+            path = get_bundle_fn(path)
+        if not os.path.exists(path):
+            raise IOError("MultiQC data bundle not found: {}".format(path))
+        self.path = path
+        self.conn = sqlite3.connect(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def modules(self):
+        """ Names of the modules that saved tables """
+        return [ r[0] for r in self.conn.execute('SELECT DISTINCT module FROM tables WHERE module IS NOT NULL ORDER BY module') ]
+
+    def tables(self, module=None):
+        """ Names of the saved tables, for all modules or just one """
+        if module is None:
+            return [ r[0] for r in self.conn.execute('SELECT name FROM tables ORDER BY name') ]
+        return [ r[0] for r in self.conn.execute('SELECT name FROM tables WHERE module = ? ORDER BY name', (module,)) ]
+
+    def samples(self, table=None):
+        """ Sample names in a table, or in any table """
+        if table is None:
+            return [ r[0] for r in self.conn.execute('SELECT DISTINCT sample FROM data ORDER BY sample') ]
+        return [ r[0] for r in self.conn.execute('SELECT DISTINCT sample FROM data WHERE tbl = ? ORDER BY sample', (table,)) ]
+
+    def get(self, table, sample=None):
+        """ A saved table, optionally only the values for one sample """
+        if sample is None:
+            rows = self.conn.execute('SELECT sample, field, value, is_json FROM data WHERE tbl = ? ORDER BY rowid', (table,))
+        else:
+            rows = self.conn.execute('SELECT sample, field, value, is_json FROM data WHERE tbl = ? AND sample = ? ORDER BY rowid', (table, sample))
+        data = OrderedDict()
+        for sn, k, v, is_json in rows:
+            data.setdefault(sn, OrderedDict())[k] = decode_value(v, is_json)
+        return data
+
+    def sample(self, sample, module=None):
+        """ All values for one sample, as table name: field: value """
+        if module is None:
+            rows = self.conn.execute('SELECT tbl, field, value, is_json FROM data WHERE sample = ? ORDER BY rowid', (sample,))
+        else:
+            rows = self.conn.execute('SELECT d.tbl, d.field, d.value, d.is_json FROM data d JOIN tables t ON d.tbl = t.name ' +
+                'WHERE d.sample = ? AND t.module = ? ORDER BY d.rowid', (sample, module))
+        data = OrderedDict()
+        for tbl, k, v, is_json in rows:
+            data.setdefault(tbl, OrderedDict())[k] = decode_value(v, is_json)
+        return data
+
+    def general_stats(self, sample=None):
+        """ The General Statistics table """
+        return self.get('multiqc_general_stats', sample)
+
+    def sources(self, module=None, sample=None):
+        """ The log files that samples were found in, as a list of dicts """
+        sql = 'SELECT module, section, sample, source FROM sources'
+        where = [ (c, v) for c, v in [('module', module), ('sample', sample)] if v is not None ]
+        if len(where) > 0:
+            sql += ' WHERE ' + ' AND '.join([ '{} = ?'.format(c) for c, v in where ])
+        rows = self.conn.execute(sql + ' ORDER BY rowid', [ v for c, v in where ])
+        return [ OrderedDict(zip(['module', 'section', 'sample', 'source'], r)) for r in rows ]
+
+    def plots(self, plot_type=None):
+        """ IDs of the saved interactive plots """
+        if plot_type is None:
+            return [ r[0] for r in self.conn.execute('SELECT id FROM plots ORDER BY rowid') ]
+        return [ r[0] for r in self.conn.execute('SELECT id FROM plots WHERE plot_type = ? ORDER BY rowid', (plot_type,)) ]
+
+    def plot_data(self, pid):
+        """ The data for an interactive plot, as used by the report """
+        row = self.conn.execute('SELECT data FROM plots WHERE id = ?', (pid,)).fetchone()
+        if row is None:
+            raise KeyError(pid)
+        return json.loads(row[0], object_pairs_hook=OrderedDict)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+""" MultiQC module pool. Runs modules in a pool of processes
+and merges the results back into the report, in the same order
+as running the modules one after another. """
+
+from __future__ import print_function
+from collections import defaultdict, OrderedDict
+import multiprocessing
+import os
+import random
+import traceback
+
+from multiqc import config
+from multiqc.modules.base_module import BaseMultiqcModule
+from multiqc.utils import plot_pool, report, timings
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+# Module attributes used by the report templates
+module_attrs = ['name', 'anchor', 'intro', 'comment', 'sections', 'css', 'js']
+
+
+class ModuleWorkerError(Exception):
+    """ A module raised an exception in a worker process. Holds the traceback. """
+    pass
+
+
+def run_module(mod_dict):
+    """ Load and run a module from run_modules. Returns a list of module objects. """
+    this_module = list(mod_dict.keys())[0]
+    mod = config.avail_modules[this_module].load()
+    mod.mod_cust_config = list(mod_dict.values())[0] # feels bad doing this, but seems to work
+    with timings.module(this_module):
+        output = mod()
+    if type(output) != list:
+        output = [output]
+    return output
+
+
+def plain(data):
+    """ Convert nested defaultdicts to dicts so that they can be pickled
+    (their default factory is often a lambda). Keeps the key order. """
+    if isinstance(data, defaultdict):
+        return OrderedDict([ (k, plain(v)) for k, v in data.items() ])
+    if type(data) in (dict, OrderedDict):
+        return type(data)([ (k, plain(v)) for k, v in data.items() ])
+    if isinstance(data, list):
+        return [ plain(v) for v in data ]
+    return data
+
+
+class ModifyResults(object):
+    """
+    Picklable stand-in for a General Stats header 'modify' function, which is
+    usually a lambda or a bound method. Holds the results of the function for
+    each value that the module added, as a raw value and as a float.
+    """
+
+    def __init__(self, func, values):
+        self.results = dict()
+        self.nan_result = None
+        for v in values:
+            self.add(func, v)
+            try:
+                self.add(func, float(v))
+            except (TypeError, ValueError):
+                pass
+
+    def add(self, func, val):
+        try:
+            result = (True, func(val))
+        except Exception as e:
+            result = (False, e)
+        if val != val:
+            self.nan_result = result # NaN can't be looked up in a dict
+        else:
+            try:
+                self.results[val] = result
+            except TypeError:
+                pass # unhashable value
+
+    def __call__(self, val):
+        ok, result = self.nan_result if val != val else self.results[val]
+        if not ok:
+            raise result
+        return result
+
+
+def picklable_headers(data, headers):
+    """ Swap 'modify' functions in General Stats headers for their results """
+    for k, h in headers.items():
+        if callable(h.get('modify')):
+            values = [ samp[k] for samp in data.values() if k in samp ]
+            h['modify'] = ModifyResults(h['modify'], values)
+    return headers
+
+
+def init_worker():
+    """ Forked workers start with the same random state, which is used for plot IDs.
+    Flat plots are drawn straight away, as workers can't start their own pool. """
+    random.seed()
+    plot_pool.use_pool = False
+
+
+def empty_report():
+    """ Empty the report globals that modules add to, so that afterwards they
+    only hold what the next module added. HTML IDs are kept to avoid clashes.
+    Returns the number of HTML IDs so far. """
+    report.general_stats_data = list()
+    report.general_stats_headers = list()
+    report.data_sources = defaultdict(lambda:defaultdict(lambda:defaultdict()))
+    report.plot_data = dict()
+    report.saved_raw_data = dict()
+    report.lint_errors = list()
+    report.num_hc_plots = 0
+    report.num_mpl_plots = 0
+    return len(report.html_ids)
+
+
+def report_state(num_html_ids):
+    """ Copy of the report globals added since empty_report() that can be pickled """
+    return {
+        'general_stats_data': plain(report.general_stats_data),
+        'general_stats_headers': [ picklable_headers(d, plain(h)) for d, h in zip(report.general_stats_data, report.general_stats_headers) ],
+        'data_sources': plain(report.data_sources),
+        'plot_data': plain(report.plot_data),
+        'saved_raw_data': plain(report.saved_raw_data),
+        'html_ids': report.html_ids[num_html_ids:],
+        'lint_errors': report.lint_errors,
+        'num_hc_plots': report.num_hc_plots,
+        'num_mpl_plots': report.num_mpl_plots,
+    }
+
+
+def module_shells(output):
+    """ Copy the module attributes that the report needs, not all of the parsed data """
+    modules = list()
+    for m in output:
+        shell = BaseMultiqcModule.__new__(BaseMultiqcModule)
+        for attr in module_attrs:
+            if hasattr(m, attr):
+                setattr(shell, attr, getattr(m, attr))
+        modules.append(shell)
+    return modules
+
+
+def worker_run(mod_dict):
+    """
+    Run a module in a worker process. The report globals and timings are emptied
+    first, so that afterwards they only hold what this module added. Returns a
+    tuple of (status, result, last found file).
+    """
+    timings.reset()
+    num_html_ids = empty_report()
+    try:
+        output = run_module(mod_dict)
+    except UserWarning:
+        return ('no_samples', timings.records, report.last_found_file)
+    except Exception:
+        return ('error', (traceback.format_exc(), timings.records), report.last_found_file)
+    state = report_state(num_html_ids)
+    state['timings'] = timings.records
+    return ('ok', (module_shells(output), state), report.last_found_file)
+
+
+def merge_state(state):
+    """ Add the report globals from a worker to the report """
+    report.general_stats_data.extend(state['general_stats_data'])
+    report.general_stats_headers.extend(state['general_stats_headers'])
+    for mod, sections in state['data_sources'].items():
+        for section, sources in sections.items():
+            report.data_sources[mod][section].update(sources)
+    report.plot_data.update(state['plot_data'])
+    report.saved_raw_data.update(state['saved_raw_data'])
+    report.html_ids.extend(state['html_ids'])
+    report.lint_errors.extend(state['lint_errors'])
+    report.num_hc_plots += state['num_hc_plots']
+    report.num_mpl_plots += state['num_mpl_plots']
+    if 'timings' in state:
+        timings.merge(state['timings'])
+
+
+class ModuleWorkers(object):
+    """
+    Runs modules in a pool of forked processes. Workers start from the report
+    state when the pool is created, so the file search must be finished.
+
+    Results are merged into the report with get(), which must be called for
+    each module in run_modules order. A worker's results are only used if its
+    HTML IDs don't clash with those of earlier modules, otherwise the module
+    is run again here so that it gets the same IDs as a serial run. Repeated
+    modules always run here, as they share IDs with their earlier runs.
+    Modules with their index in skip are not started.
+    """
+
+    def __init__(self, run_modules, num_workers, skip=()):
+        self.run_modules = run_modules
+        self.results = dict()
+        try:
+            ctx = multiprocessing.get_context('fork')
+        except AttributeError:
+            ctx = multiprocessing # Python 2, forks on all platforms that support it
+        self.pool = ctx.Pool(num_workers, initializer=init_worker)
+        seen = set()
+        for idx, mod_dict in enumerate(run_modules):
+            this_module = list(mod_dict.keys())[0]
+            if this_module in seen or idx in skip:
+                continue
+            seen.add(this_module)
+            self.results[idx] = self.pool.apply_async(worker_run, (mod_dict,))
+        self.pool.close()
+        logger.info("Running {} modules with {} worker processes".format(len(self.results), num_workers))
+
+    def get(self, idx):
+        """
+        Return the output for run_modules[idx] and merge its report globals.
+        Raises UserWarning if no samples were found and ModuleWorkerError if
+        the module broke, like running the module directly.
+        """
+        mod_dict = self.run_modules[idx]
+        this_module = list(mod_dict.keys())[0]
+        if idx not in self.results:
+            return run_module(mod_dict)
+        result = self.results.pop(idx)
+        try:
+            # Wait with a timeout so that KeyboardInterrupt still works
+            while not result.ready():
+                result.wait(1)
+            status, payload, last_found_file = result.get()
+        except Exception as e:
+            # Usually a result that could not be pickled
+            logger.debug("{} - Could not get results from worker, running again: {}".format(this_module, e))
+            return run_module(mod_dict)
+        report.last_found_file = last_found_file
+        if status == 'no_samples':
+            timings.merge(payload)
+            raise UserWarning
+        if status == 'error':
+            timings.merge(payload[1])
+            raise ModuleWorkerError(payload[0])
+        modules, state = payload
+        clashes = set(state['html_ids']) & set(report.html_ids)
+        if len(clashes) > 0:
+            logger.debug("{} - HTML IDs clash with earlier modules, running again: {}".format(this_module, ', '.join(clashes)))
+            return run_module(mod_dict)
+        merge_state(state)
+        return modules
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+def can_fork():
+    """ Module workers are forked so that they share the config and found files """
+    return hasattr(os, 'fork')
@@ -4,15 +4,20 @@ Helper functions to manipulate colours and colour scales
 """
 
 from __future__ import print_function
-import spectra
+import bisect
+import math
 import numpy as np
 import re
+import spectra
 
 # Default logger will be replaced by caller
 import logging
 logger = logging.getLogger(__name__)
 
 
+# Characters removed from values before they are coloured
+non_numeric_re = re.compile(r"[^0-9\.]")
+
 class mqc_colour_scale(object):
 	""" Class to hold a colour scheme. """
 
@@ -38,31 +43,82 @@ class mqc_colour_scale(object):
 			self.minval = float(minval)
 			self.maxval = float(maxval)
 
+		# The scale only depends on the colours and limits, so make it once.
+		# Colours are blended in RGB in the same way as spectra.scale()
+		self.domain = list( np.linspace(self.minval, self.maxval, len(self.colours)) )
+		self.rgb = [ spectra.html(c).rgb for c in self.colours ]
+		self.colour_cache = dict()
+
+	def clean_value(self, val):
+		""" Strip a value down to a number within the scale limits """
+		val = non_numeric_re.sub("", str(val))
+		if val == '':
+			val = self.minval
+		val = float(val)
+		val = max(val, self.minval)
+		val = min(val, self.maxval)
+		return val
+
 	def get_colour(self, val, colformat='hex'):
 		""" Given a value, return a colour within the colour scale """
 		try:
-			# Sanity checks
-			val = re.sub("[^0-9\.]", "", str(val))
-			if val == '':
-				val = self.minval
-			val = float(val)
-			val = max(val, self.minval)
-			val = min(val, self.maxval)
-
-			domain_nums = list( np.linspace(self.minval, self.maxval, len(self.colours)) )
-			my_scale = spectra.scale(self.colours).domain(domain_nums)
-
-			# Weird, I know. I ported this from the original JavaScript for continuity
-			# Seems to work better than adjusting brightness / saturation / luminosity
-			rgb_converter = lambda x: max(0, min(1, 1+((x-1)*0.3)))
-			thecolour = spectra.rgb( *[rgb_converter(v) for v in my_scale(val).rgb] )
-
-			return thecolour.hexcode
+			val = self.clean_value(val)
+			if val not in self.colour_cache:
+				self.colour_cache[val] = self.interpolate(val)
+			return self.colour_cache[val]
 
 		except:
 			# Shouldn't crash all of MultiQC just for colours
 			return ''
 
+	def get_colour_list(self, vals, colformat='hex'):
+		""" Given a list of values, return a list of colours within the colour scale.
+		New values are interpolated all at once with numpy, so this is much faster
+		than calling get_colour() for each value of a long table column. """
+		cleaned = list()
+		for val in vals:
+			try:
+				cleaned.append(self.clean_value(val))
+			except:
+				cleaned.append(None)
+		new_vals = list(set([ v for v in cleaned if v is not None and v not in self.colour_cache ]))
+		if len(new_vals) > 0:
+			for v, colour in zip(new_vals, self.interpolate_array(new_vals)):
+				self.colour_cache[v] = colour
+		return [ '' if v is None else self.colour_cache[v] for v in cleaned ]
+
+	def interpolate(self, val):
+		""" Hex colour for a cleaned value. Same arithmetic as spectra, so the colours are identical """
+		if val < self.domain[0] or val > self.domain[-1]:
+			raise ValueError("Value ({}) not in colour scale domain".format(val))
+		i = max(bisect.bisect_left(self.domain, val, 1) - 1, 0)
+		ratio = float(val - self.domain[i]) / (self.domain[i+1] - self.domain[i])
+		keep = 1.0 - ratio
+		rgb = [ (u * keep) + (v * ratio) for u, v in zip(self.rgb[i], self.rgb[i+1]) ]
+
+		# Weird, I know. I ported this from the original JavaScript for continuity
+		# Seems to work better than adjusting brightness / saturation / luminosity
+		rgb_converter = lambda x: max(0, min(1, 1+((x-1)*0.3)))
+		return "#%02x%02x%02x" % tuple([ int(math.floor(0.5 + rgb_converter(x) * 255)) for x in rgb ])
+
+	def interpolate_array(self, vals):
+		""" Hex colours for a list of cleaned values, as interpolate() """
+		vals = np.asarray(vals, dtype=float)
+		domain = np.asarray(self.domain)
+		in_domain = (vals >= domain[0]) & (vals <= domain[-1])
+		# Use the first segment that contains each value, like spectra.Scale
+		seg = np.searchsorted(domain[1:], vals, side='left')
+		seg = np.clip(seg, 0, len(domain) - 2)
+		x0 = domain[seg]
+		x1 = domain[seg + 1]
+		ratio = ((vals - x0) / (x1 - x0))[:, np.newaxis]
+		keep = 1.0 - ratio
+		colours = np.asarray(self.rgb)
+		rgb = (colours[seg] * keep) + (colours[seg + 1] * ratio)
+		rgb = np.maximum(0, np.minimum(1, 1+((rgb-1)*0.3)))
+		rgb = np.floor(0.5 + rgb * 255).astype(int)
+		return [ "#%02x%02x%02x" % tuple(c) if ok else '' for c, ok in zip(rgb, in_domain) ]
+
 
 	def get_colours(self, name='GnBu'):
 		""" Function to get a colour scale by name
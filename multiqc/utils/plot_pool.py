@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+""" MultiQC plot pool. Draws flat MatPlotLib plots in a pool of processes.
+Plot functions queue their figures and put a placeholder in the HTML, which
+is swapped for the image once all of the figures have been drawn. Each
+figure is drawn once and saved once per format, the PNG is used for both
+the exported file and the image in the report. """
+
+from __future__ import print_function
+from collections import OrderedDict
+import base64
+import io
+import multiprocessing
+import os
+import re
+import traceback
+
+from multiqc import config
+from multiqc.utils import timings
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+# Figures waiting to be drawn, {plot ID: (figure function, args, formats)}
+jobs = OrderedDict()
+# Base64 PNGs of drawn figures, {plot ID: base64 string}
+images = dict()
+# Set to False in worker processes, which can't start their own pool
+use_pool = True
+
+placeholder_re = re.compile(r'%%mqc_mpl_png:([a-zA-Z0-9_-]+)%%')
+
+
+def num_workers():
+    try:
+        return int(config.plot_workers)
+    except (AttributeError, TypeError, ValueError):
+        return 1
+
+
+def deferred():
+    """ Figures are queued if they will be drawn in a pool of processes """
+    return use_pool and num_workers() > 1 and hasattr(os, 'fork')
+
+
+def add(pid, figure_func, args, embed=True):
+    """
+    Draw a figure, or queue it to be drawn later. figure_func(*args) must make
+    the figure and return it with a dict of keyword arguments for savefig().
+    Saves the figure to the exported plot formats if requested. Returns the
+    base64 PNG (or a placeholder for it) if embed is True, otherwise None.
+    """
+    formats = list()
+    if config.export_plots:
+        formats.extend(config.export_plot_formats)
+    if embed and 'png' not in formats:
+        formats.append('png')
+    if deferred():
+        jobs[pid] = (figure_func, args, formats)
+        return '%%mqc_mpl_png:{}%%'.format(pid) if embed else None
+    save_figure(pid, draw_figure(figure_func, args, formats))
+    return images.pop(pid, '') if embed else None
+
+
+def draw_figure(figure_func, args, formats):
+    """ Make a figure and save it to bytes for each format. Run in the worker processes. """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, savefig_kwargs = figure_func(*args)
+    try:
+        saved = OrderedDict()
+        for fformat in formats:
+            buf = io.BytesIO()
+            fig.savefig(buf, format=fformat, **savefig_kwargs)
+            saved[fformat] = buf.getvalue()
+            buf.close()
+    finally:
+        plt.close(fig)
+    return saved
+
+
+def worker_draw(figure_func, args, formats):
+    """ Returns (True, saved figures) or (False, traceback) so that errors can be logged here """
+    try:
+        return (True, draw_figure(figure_func, args, formats))
+    except Exception:
+        return (False, traceback.format_exc())
+
+
+def save_figure(pid, saved):
+    """ Write the exported plot files and keep the PNG to go in the report """
+    if config.export_plots:
+        for fformat in config.export_plot_formats:
+            # Make the directory if it doesn't already exist
+            plot_dir = os.path.join(config.plots_dir, fformat)
+            if not os.path.exists(plot_dir):
+                os.makedirs(plot_dir)
+            # Save the plot
+            plot_fn = os.path.join(plot_dir, '{}.{}'.format(pid, fformat))
+            with io.open(plot_fn, 'wb') as f:
+                f.write(saved[fformat])
+    if 'png' in saved:
+        images[pid] = base64.b64encode(saved['png']).decode('utf8')
+
+
+def run():
+    """ Draw all of the queued figures in a pool of processes """
+    if len(jobs) == 0:
+        return
+    with timings.timed('report', 'flat_plots'):
+        workers = min(num_workers(), len(jobs))
+        logger.info("Drawing {} flat plots with {} worker processes".format(len(jobs), workers))
+        try:
+            ctx = multiprocessing.get_context('fork')
+        except AttributeError:
+            ctx = multiprocessing # Python 2, forks on all platforms that support it
+        pool = ctx.Pool(workers)
+        try:
+            results = OrderedDict([ (pid, pool.apply_async(worker_draw, job)) for pid, job in jobs.items() ])
+            pool.close()
+            for pid, result in results.items():
+                try:
+                    ok, saved = result.get()
+                except Exception as e:
+                    # Usually arguments that could not be pickled - draw it here instead
+                    logger.debug("Could not draw flat plot {} in a worker, drawing it here: {}".format(pid, e))
+                    try:
+                        ok, saved = True, draw_figure(*jobs[pid])
+                    except Exception:
+                        ok, saved = False, traceback.format_exc()
+                if ok:
+                    save_figure(pid, saved)
+                else:
+                    logger.error("############### Error making MatPlotLib figure {}!\n{}".format(pid, saved))
+        finally:
+            pool.terminate()
+            pool.join()
+        jobs.clear()
+
+
+def fill(html):
+    """ Swap figure placeholders in a string for the base64 PNGs """
+    if html is None or '%%mqc_mpl_png:' not in html:
+        return html
+    return placeholder_re.sub(lambda m: images.get(m.group(1), ''), html)
+
+
+def fill_modules(modules):
+    """ Swap the figure placeholders in the HTML of module output """
+    for m in modules:
+        for attr in ['intro', 'comment']:
+            if isinstance(getattr(m, attr, None), (type(''), type(u''))):
+                setattr(m, attr, fill(getattr(m, attr)))
+        for s in getattr(m, 'sections', []):
+            for k, v in s.items():
+                if isinstance(v, (type(''), type(u''))):
+                    s[k] = fill(v)
@@ -6,18 +6,28 @@ helper functions to generate markup for report. """
 
 from __future__ import print_function
 from collections import defaultdict, OrderedDict
+import base64
 import click
 import fnmatch
+import functools
 import io
 import json
 import inspect
 import lzstring
 import mimetypes
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import os
 import re
+import sqlite3
+import threading
+import time
+import traceback
 import yaml
+import zlib
 
 from multiqc import config
+from multiqc.utils import data_bundle, plot_pool, search_cache, util_functions
 logger = config.logger
 
 # Treat defaultdict and OrderedDict as normal dicts for YAML output
@@ -39,16 +49,27 @@ html_ids = list()
 lint_errors = list()
 num_hc_plots = 0
 num_mpl_plots = 0
+plot_compression = 'zlib'
+plot_compressed_data = OrderedDict()
 saved_raw_data = dict()
 last_found_file = None
 
 # Make a dict of discovered files for each seach key
 searchfiles = list()
 files = dict()
-def get_filelist(run_module_names):
+# Used when searching in the background (streaming discovery)
+search_done = threading.Event()
+search_done.set()
+search_error = None
+files_updated = threading.Condition()
+files_complete = set()
+
+def get_filelist(run_module_names, discovery_streaming=False):
     """
     Go through all supplied search directories and assembly a master
     list of files to search. Then fire search functions for each file.
+    If discovery_streaming is set, the search runs in a background thread
+    and modules can start on the files found so far with iter_files().
     """
     # Prep search patterns
     spatterns = [{},{},{},{},{},{},{}]
@@ -88,85 +109,247 @@ def get_filelist(run_module_names):
     if len(ignored_patterns) > 0:
         logger.debug("Ignored search patterns as didn't match running modules: {}".format(', '.join(ignored_patterns)))
 
+    # Compile the search patterns so that each file is only read once
+    matcher = SearchMatcher(spatterns, config.fn_ignore_files, config.fn_ignore_dirs, config.fn_ignore_paths, config.fn_ignore_contents)
+
+    # Load the cache of search results from previous runs if requested
+    cache = None
+    if config.discovery_cache:
+        try:
+            cache = search_cache.SearchCache(spatterns)
+        except (sqlite3.Error, IOError, OSError) as e:
+            logger.warn("Could not open the file search cache, searching all files: {}".format(e))
+
     def add_file(fn, root):
         """
         Function applied to each file found when walking the analysis
-        directories. Runs through all search patterns and returns True
-        if a match is found.
+        directories. Runs through all search patterns and returns the
+        file dict with a list of the search keys that it matched.
         """
         f = {'fn': fn, 'root': root}
 
         # Check that this is a file and not a pipe or anything weird
         if not os.path.isfile(os.path.join(root, fn)):
-            return None
+            return f, []
 
         # Check that we don't want to ignore this file
-        i_matches = [n for n in config.fn_ignore_files if fnmatch.fnmatch(fn, n)]
-        if len(i_matches) > 0:
+        if matcher.ignore_file(fn):
             logger.debug("Ignoring file as matched an ignore pattern: {}".format(fn))
-            return None
+            return f, []
 
         # Limit search to small files, to avoid 30GB FastQ files etc.
         try:
-            f['filesize'] = os.path.getsize(os.path.join(root,fn))
+            fstat = os.stat(os.path.join(root,fn))
+            f['filesize'] = fstat.st_size
+            f['mtime'] = fstat.st_mtime
         except (IOError, OSError, ValueError, UnicodeDecodeError):
+            fstat = None
             logger.debug("Couldn't read file when checking filesize: {}".format(fn))
         else:
             if f['filesize'] > config.log_filesize_limit:
-                return False
+                return f, []
+
+        # Use the result from a previous run if this file hasn't changed
+        if cache is not None and fstat is not None:
+            cache_path = os.path.abspath(os.path.join(root, fn))
+            keys = cache.get(cache_path, fstat.st_size, fstat.st_mtime)
+            if keys is None:
+                keys = matcher.search(f)
+                cache.add(cache_path, fstat.st_size, fstat.st_mtime, keys)
+            return f, keys
 
         # Test file for each search pattern
-        for patterns in spatterns:
-            for key, sps in patterns.items():
-                for sp in sps:
-                    if search_file (sp, f):
-                        # Looks good! Remember this file
-                        files[key].append(f)
-                        # Don't keep searching this file for other modules
-                        if not sp.get('shared', False):
-                            return
-                        # Don't look at other patterns for this module
-                        else:
-                            break
+        return f, matcher.search(f)
 
-    # Go through the analysis directories and get file list
-    for path in config.analysis_dir:
-        if os.path.isfile(path):
-            searchfiles.append([os.path.basename(path), os.path.dirname(path)])
-        elif os.path.isdir(path):
-            for root, dirnames, filenames in os.walk(path, followlinks=True, topdown=True):
-                bname = os.path.basename(root)
-
-                # Skip any sub-directories matching ignore params
-                orig_dirnames = dirnames[:]
-                for n in config.fn_ignore_dirs:
-                    dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(d, n.rstrip(os.sep))]
-                    if len(orig_dirnames) != len(dirnames):
-                        removed_dirs = [os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))]
-                        logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(", ".join(removed_dirs)))
-                        orig_dirnames = dirnames[:]
-                for n in config.fn_ignore_paths:
-                    dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(os.path.join(root, d), n.rstrip(os.sep))]
-                    if len(orig_dirnames) != len(dirnames):
-                        removed_dirs = [os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))]
-                        logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(", ".join(removed_dirs)))
-
-                # Skip *this* directory if matches ignore params
-                d_matches = [n for n in config.fn_ignore_dirs if fnmatch.fnmatch(bname, n.rstrip(os.sep))]
-                if len(d_matches) > 0:
-                    logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(bname))
-                    continue
-                p_matches = [n for n in config.fn_ignore_paths if fnmatch.fnmatch(root, n.rstrip(os.sep))]
-                if len(p_matches) > 0:
-                    logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(root))
-                    continue
-                # Search filenames in this directory
-                for fn in filenames:
-                    searchfiles.append([fn, root])
-    # Search through collected files
-    with click.progressbar(searchfiles, label="Searching {} files..".format(len(searchfiles))) as sfiles:
-        for sf in sfiles:
-            add_file(sf[0], sf[1])
+    def search_all():
+        """
+        Walk the analysis directories, search each file and save the results.
+        Runs in a background thread if discovery_streaming is set.
+        """
+        # Use a pool of threads for directory listings and file searches if requested.
+        # Results are always collected in the same order as a serial run.
+        pool = None
+        if config.discovery_threads is not None and int(config.discovery_threads) > 1:
+            logger.debug("Searching for files using {} threads".format(config.discovery_threads))
+            # Load the mimetypes database before it can be hit by several threads at once
+            if not mimetypes.inited:
+                mimetypes.init()
+            pool = ThreadPool(int(config.discovery_threads))
+
+        def walk_files():
+            """ Yield [fn, root] for each file in the analysis directories """
+            for path in config.analysis_dir:
+                if os.path.isfile(path):
+                    yield [os.path.basename(path), os.path.dirname(path)]
+                elif os.path.isdir(path):
+                    if pool is None:
+                        walker = os.walk(path, followlinks=True, topdown=True)
+                    else:
+                        walker = threaded_walk(path, pool)
+                    for root, dirnames, filenames in walker:
+                        if not matcher.filter_dirs(root, dirnames):
+                            continue
+                        # Search filenames in this directory
+                        for fn in filenames:
+                            yield [fn, root]
+
+        def search_files(sfs):
+            """ Search a list of files, in order """
+            if pool is None:
+                return (add_file(sf[0], sf[1]) for sf in sfs)
+            chunksize = max(1, min(100, len(sfs) // (int(config.discovery_threads) * 4)))
+            return pool.imap(lambda sf: add_file(sf[0], sf[1]), sfs, chunksize)
+
+        def save_results(results):
+            for f, keys in results:
+                for key in keys:
+                    # Looks good! Remember this file
+                    files[key].append(f)
+
+        def release_keys(keys, found):
+            """ Give the files found for some search keys to the modules waiting for them """
+            with files_updated:
+                for key in keys:
+                    files[key].extend([ f for idx, f in sorted(found.pop(key, []), key=lambda x: x[0]) ])
+                    files_complete.add(key)
+                files_updated.notify_all()
+
+        def stream_results():
+            """ Search the files for the first modules first, and give each search key
+            its files as soon as every file that could match it has been searched """
+            searchfiles.extend(walk_files())
+            candidates = [ matcher.candidate_keys(sf[0]) for sf in searchfiles ]
+            remaining = defaultdict(int)
+            for keys in candidates:
+                for key in keys:
+                    remaining[key] += 1
+            release_keys([ key for key in files if remaining[key] == 0 ], {})
+
+            # Files are searched in the order that the modules will run, then in walk order
+            last_rank = len(run_module_names)
+            order = [ idx for idx in range(len(searchfiles)) if len(candidates[idx]) > 0 ]
+            order.sort(key=lambda idx: (min([ mod_rank.get(key.split('/', 1)[0].lower(), last_rank) for key in candidates[idx] ]), idx))
+            found = defaultdict(list)
+            for idx, (f, keys) in zip(order, search_files([ searchfiles[idx] for idx in order ])):
+                for key in keys:
+                    found[key].append((idx, f))
+                complete = list()
+                for key in candidates[idx]:
+                    remaining[key] -= 1
+                    if remaining[key] == 0:
+                        complete.append(key)
+                if len(complete) > 0:
+                    release_keys(complete, found)
+
+        try:
+            if discovery_streaming:
+                stream_results()
+            else:
+                # Get the full file list first, then search with a progress bar
+                searchfiles.extend(walk_files())
+                with click.progressbar(search_files(searchfiles), length=len(searchfiles), label="Searching {} files..".format(len(searchfiles))) as sfiles:
+                    save_results(sfiles)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if matcher.opens_avoided > 0:
+            logger.debug("Skipped reading {} files as matched fn_ignore_contents".format(matcher.opens_avoided))
+
+        # Save any new search results for next time
+        if cache is not None:
+            try:
+                cache.save()
+            except sqlite3.Error as e:
+                logger.warn("Could not save the file search cache: {}".format(e))
+            cache.close()
+
+    if not discovery_streaming:
+        search_all()
+        return
+
+    def search_thread():
+        global search_error
+        try:
+            search_all()
+            logger.info("Finished searching {} files".format(len(searchfiles)))
+        except Exception as e:
+            logger.critical("Error whilst searching for files!\n{}".format(traceback.format_exc()))
+            search_error = e
+        finally:
+            with files_updated:
+                search_done.set()
+                files_updated.notify_all()
+
+    # Position of each module in the run order, custom content runs with its module
+    mod_rank = dict()
+    for idx, mod_name in enumerate(run_module_names):
+        mod_rank.setdefault(mod_name.lower(), idx)
+    for c_id in getattr(config, 'custom_data', {}).keys():
+        if 'custom_content' in mod_rank:
+            mod_rank[c_id.lower()] = mod_rank['custom_content']
+
+    # Search in the background, files for each search key are given to modules when ready
+    logger.info("Searching for files in the background (streaming discovery)")
+    files_complete.clear()
+    search_done.clear()
+    t = threading.Thread(target=search_thread, name='multiqc_search')
+    t.daemon = True
+    t.start()
+
+def iter_files(sp_key):
+    """
+    Yield the files found for a search key. If the file search is running
+    in the background, first wait until every file that could match this
+    search key has been searched.
+    """
+    wait_for_files([sp_key])
+    for f in files[sp_key]:
+        yield f
+
+def wait_for_files(sp_keys=None):
+    """ Wait for a background file search to finish, or just for the given search keys """
+    with files_updated:
+        while not search_done.is_set() and (sp_keys is None or not files_complete.issuperset(sp_keys)):
+            # Wait with a timeout so that KeyboardInterrupt still works
+            files_updated.wait(1)
+
+def threaded_walk(top, pool):
+    """
+    Generator with the same output and order as os.walk(top, topdown=True,
+    followlinks=True). Directory listings are fetched ahead of time by a
+    thread pool. As with os.walk, dirnames can be modified in place to stop
+    sub-directories from being visited.
+    """
+    pending = { top: pool.apply_async(list_dir, (top,)) }
+    stack = [top]
+    while len(stack) > 0:
+        root = stack.pop()
+        listing = pending.pop(root).get()
+        if listing is None:
+            continue
+        dirnames, filenames = listing
+        yield root, dirnames, filenames
+        subdirs = [ os.path.join(root, d) for d in dirnames ]
+        for d in subdirs:
+            pending[d] = pool.apply_async(list_dir, (d,))
+        stack.extend(reversed(subdirs))
+
+def list_dir(top):
+    """ List a directory for threaded_walk(). Returns (dirnames, filenames), or None if unreadable. """
+    try:
+        names = os.listdir(top)
+    except OSError:
+        return None
+    dirnames = list()
+    filenames = list()
+    for name in names:
+        if os.path.isdir(os.path.join(top, name)):
+            dirnames.append(name)
+        else:
+            filenames.append(name)
+    return dirnames, filenames
 
 def search_file (pattern, f):
     """
@@ -233,8 +416,371 @@ def search_file (pattern, f):
 
     return fn_matched and contents_matched
 
+
+# Backreferences and conditionals that refer to a group by number
+numbered_group_ref_re = re.compile(r'\\\d|\(\?\(\d')
+
+class SearchMatcher(object):
+    """
+    Compiled version of the search patterns, split into the same speed
+    tiers as get_filelist(). Gives the same results as calling search_file()
+    for every pattern, but each candidate file is opened at most once and
+    every line is checked against all content patterns of a tier together.
+
+    Files that match ignore_contents (eg. BAM indexes) are never opened for
+    patterns that only have contents, which could match any file. Patterns
+    with a file name are searched as usual when the name matches, so no
+    module's pattern can be hidden by the list. Files whose name can't match
+    any file name pattern and that match ignore_contents are rejected
+    without any pattern checks.
+    Also holds the compiled fn_ignore_files / dirs / paths globs.
+    """
+
+    def __init__(self, spatterns, ignore_files=None, ignore_dirs=None, ignore_paths=None, ignore_contents=None):
+        self.tiers = list()
+        self.max_head_lines = 0
+        self.fn_patterns = list()
+        self.contents_only_keys = set()
+        fn_globs = set()
+        fn_res = set()
+        for patterns in spatterns:
+            tier = list()
+            substrings = set()
+            for key, sps in patterns.items():
+                csps = [ self.compile_pattern(sp) for sp in sps ]
+                self.max_head_lines = max([self.max_head_lines] + [ c['num_lines'] for c in csps if c['has_contents'] and c['num_lines'] ])
+                substrings.update([ c['contents'] for c in csps if c['contents'] is not None ])
+                fn_globs.update([ os.path.normcase(sp['fn']) for sp in sps if sp.get('fn') is not None ])
+                fn_res.update([ sp['fn_re'] for sp in sps if sp.get('fn_re') is not None ])
+                tier.append((key, csps))
+                for c in csps:
+                    if c['fn'] is not None or c['fn_re'] is not None:
+                        self.fn_patterns.append((key, c))
+                    elif c['has_contents']:
+                        self.contents_only_keys.add(key)
+            # One regex to find any of the plain-text content strings in a line
+            contents_any = None
+            if len(substrings) > 0:
+                contents_any = re.compile('|'.join([ re.escape(s) for s in sorted(substrings, key=len, reverse=True) ]))
+            self.tiers.append({'patterns': tier, 'contents_any': contents_any})
+
+        # One regex each for all file name globs and all file name regexes
+        self.fn_glob_any = self.compile_any([ fnmatch.translate(g) for g in sorted(fn_globs) ])
+        self.fn_re_any = self.compile_any(sorted(fn_res))
+
+        # Files matching these globs are not opened for search patterns that only have
+        # contents. Patterns with a file name are always searched if the name matches.
+        self.ignore_contents = self.compile_globs(ignore_contents)
+        self.opens_avoided = 0
+        self.lock = threading.Lock()
+
+        # Files, directories and paths to ignore while walking the analysis directories
+        self.ignore_files_re = self.compile_globs(ignore_files)
+        self.ignore_dirs_re = self.compile_globs([ n.rstrip(os.sep) for n in ignore_dirs or [] ])
+        self.ignore_paths_re = self.compile_globs([ n.rstrip(os.sep) for n in ignore_paths or [] ])
+
+        # Results of the mimetypes binary check, for each file extension
+        self.binary_exts = dict()
+
+    @classmethod
+    def compile_globs(cls, globs):
+        """ Compile a list of fnmatch globs into a single regex """
+        if not globs:
+            return None
+        return cls.compile_any([ fnmatch.translate(os.path.normcase(g)) for g in globs ])
+
+    def ignore_file(self, fn):
+        """ Check whether a file name matches fn_ignore_files """
+        return self.ignore_files_re is not None and self.ignore_files_re.match(os.path.normcase(fn)) is not None
+
+    def filter_dirs(self, root, dirnames):
+        """
+        Remove sub-directories matching ignore params from dirnames (in place).
+        Returns False if the files in this directory should be skipped.
+        """
+        # Skip any sub-directories matching ignore params
+        if self.ignore_dirs_re is not None:
+            removed_dirs = [ os.path.join(root, d) for d in dirnames if self.ignore_dirs_re.match(os.path.normcase(d)) ]
+            if len(removed_dirs) > 0:
+                dirnames[:] = [ d for d in dirnames if not self.ignore_dirs_re.match(os.path.normcase(d)) ]
+                logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(", ".join(removed_dirs)))
+        if self.ignore_paths_re is not None:
+            removed_dirs = [ os.path.join(root, d) for d in dirnames if self.ignore_paths_re.match(os.path.normcase(os.path.join(root, d))) ]
+            if len(removed_dirs) > 0:
+                dirnames[:] = [ d for d in dirnames if not self.ignore_paths_re.match(os.path.normcase(os.path.join(root, d))) ]
+                logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(", ".join(removed_dirs)))
+
+        # Skip *this* directory if matches ignore params
+        if self.ignore_dirs_re is not None and self.ignore_dirs_re.match(os.path.normcase(os.path.basename(root))):
+            logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(os.path.basename(root)))
+            return False
+        if self.ignore_paths_re is not None and self.ignore_paths_re.match(os.path.normcase(root)):
+            logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(root))
+            return False
+        return True
+
+    def is_binary(self, fn):
+        """
+        Use mimetypes to exclude compressed files and images where possible.
+        mimetypes only looks at the last two file extensions, so cache the result for those.
+        """
+        base, ext = os.path.splitext(fn)
+        exts = os.path.splitext(base)[1] + ext
+        if exts not in self.binary_exts:
+            (ftype, encoding) = mimetypes.guess_type('x{}'.format(exts))
+            self.binary_exts[exts] = encoding is not None or (ftype is not None and ftype.startswith('image'))
+        return self.binary_exts[exts]
+
+    @staticmethod
+    def compile_any(regexes):
+        """ Compile a list of regexes into one that matches if any of them match.
+        Returns None if empty. If they can't be combined, they are tried one by one.
+        Regexes that refer to groups by number (eg. \\1) are always tried on their
+        own, as the group numbers change when they are combined. """
+        if len(regexes) == 0:
+            return None
+        numbered_refs = [ r for r in regexes if numbered_group_ref_re.search(r) ]
+        combinable = [ r for r in regexes if r not in numbered_refs ]
+        try:
+            combined = re.compile('|'.join([ '(?:{})'.format(r) for r in combinable ])) if len(combinable) > 0 else None
+        except re.error:
+            return AnyRegex(regexes)
+        if len(numbered_refs) == 0:
+            return combined
+        return AnyRegex(numbered_refs, [combined] if combined is not None else [])
+
+    @staticmethod
+    def compile_pattern(sp):
+        """ Pre-compile the globs and regexes of a single search pattern """
+        c = {
+            'shared': sp.get('shared', False),
+            'max_filesize': sp.get('max_filesize'),
+            'num_lines': sp.get('num_lines'),
+            'fn': None,
+            'fn_re': None,
+            'contents': sp.get('contents'),
+            'contents_re': None,
+            'has_contents': sp.get('contents') is not None or sp.get('contents_re') is not None
+        }
+        if sp.get('fn') is not None:
+            c['fn'] = re.compile(fnmatch.translate(os.path.normcase(sp['fn'])))
+        if sp.get('fn_re') is not None:
+            c['fn_re'] = re.compile(sp['fn_re'])
+        if sp.get('contents_re') is not None:
+            c['contents_re'] = re.compile(sp['contents_re'])
+        return c
+
+    def search(self, f):
+        """
+        Test a file against all search patterns.
+        :param f: dict with the file name (fn), root directory (root) and optionally filesize
+        :return: List of search pattern keys that the file matches, in tier order
+        """
+        found = list()
+
+        # Exclude compressed files and images
+        if self.is_binary(f['fn']):
+            return found
+
+        # Quick checks of the file name against all patterns at once
+        fn_norm = os.path.normcase(f['fn'])
+        any_fn = (self.fn_glob_any is not None and self.fn_glob_any.match(fn_norm) is not None) or \
+                 (self.fn_re_any is not None and self.fn_re_any.match(f['fn']) is not None)
+        skip_contents = self.ignore_contents is not None and self.ignore_contents.match(fn_norm) is not None
+        if not any_fn and skip_contents:
+            with self.lock:
+                self.opens_avoided += 1
+            return found
+
+        head = FileHead(os.path.join(f['root'], f['fn']), self.max_head_lines)
+        contents_skipped = False
+        try:
+            for tier in self.tiers:
+                # Check the file name patterns first, then scan the file for
+                # all content patterns in this tier that could still match
+                fn_matches = dict()
+                to_scan = list()
+                for key, csps in tier['patterns']:
+                    for c in csps:
+                        if c['max_filesize'] is not None and 'filesize' in f and f['filesize'] > c['max_filesize']:
+                            fn_matches[id(c)] = None
+                            continue
+                        fn_matched = any_fn and self.fn_match(c, f['fn'])
+                        fn_matches[id(c)] = fn_matched
+                        if c['has_contents'] and fn_matched:
+                            to_scan.append(c)
+                        elif c['has_contents'] and c['fn'] is None and c['fn_re'] is None:
+                            if skip_contents:
+                                contents_skipped = True
+                            else:
+                                to_scan.append(c)
+                contents_matches = self.scan_contents(head, to_scan, tier['contents_any'])
+
+                for key, csps in tier['patterns']:
+                    for c in csps:
+                        fn_matched = fn_matches[id(c)]
+                        if fn_matched is None:
+                            continue
+                        if c['has_contents']:
+                            matched = id(c) in contents_matches
+                        else:
+                            matched = fn_matched
+                        if matched:
+                            found.append(key)
+                            # Don't keep searching this file for other modules
+                            if not c['shared']:
+                                return found
+                            # Don't look at other patterns for this module
+                            break
+        finally:
+            head.close()
+            if contents_skipped:
+                with self.lock:
+                    self.opens_avoided += 1
+        return found
+
+    def candidate_keys(self, fn):
+        """
+        Search keys that a file could match, judging by its name only. Always
+        includes every key that search() can return for this file.
+        """
+        if self.is_binary(fn):
+            return set()
+        fn_norm = os.path.normcase(fn)
+        any_fn = (self.fn_glob_any is not None and self.fn_glob_any.match(fn_norm) is not None) or \
+                 (self.fn_re_any is not None and self.fn_re_any.match(fn) is not None)
+        skip_contents = self.ignore_contents is not None and self.ignore_contents.match(fn_norm) is not None
+        keys = set() if skip_contents else set(self.contents_only_keys)
+        if any_fn:
+            keys.update([ key for key, c in self.fn_patterns if self.fn_match(c, fn) ])
+        return keys
+
+    @staticmethod
+    def fn_match(c, fn):
+        """ Check whether a file name matches the glob or regex of a compiled pattern """
+        if c['fn'] is not None and c['fn'].match(os.path.normcase(fn)):
+            return True
+        if c['fn_re'] is not None and c['fn_re'].match(fn):
+            return True
+        return False
+
+    @staticmethod
+    def scan_contents(head, csps, contents_any=None):
+        """
+        Scan the lines of a file once for a set of compiled content patterns.
+        :return: set of id()s of the patterns that matched
+        """
+        matched = set()
+        pending = list(csps)
+        if len(pending) == 0:
+            return matched
+        limits = [ c['num_lines'] for c in pending ]
+        max_lines = None if not all(limits) else max(limits)
+        for l, line in enumerate(head.lines(max_lines), 1):
+            # Skip the string comparisons if none of the strings are in this line
+            any_string = contents_any is None or contents_any.search(line) is not None
+            still_pending = list()
+            for c in pending:
+                if c['contents'] is not None:
+                    hit = any_string and c['contents'] in line
+                else:
+                    hit = c['contents_re'].match(line) is not None
+                if hit:
+                    matched.add(id(c))
+                # Stop looking once we've searched enough lines for this pattern
+                elif not c['num_lines'] or l < c['num_lines']:
+                    still_pending.append(c)
+            pending = still_pending
+            if len(pending) == 0:
+                break
+        return matched
+
+
+class AnyRegex(object):
+    """ Matches if any of a list of regexes match. Used when they can't be combined into one. """
+
+    def __init__(self, regexes, compiled=None):
+        self.regexes = list(compiled or []) + [ re.compile(r) for r in regexes ]
+
+    def match(self, string):
+        for r in self.regexes:
+            m = r.match(string)
+            if m is not None:
+                return m
+        return None
+
+
+class FileHead(object):
+    """
+    Lazily reads the lines at the start of a file, so that several searches
+    can share a single file handle. Only the first max_buffer lines are kept
+    (the most that any num_lines search needs), searches for patterns without
+    num_lines read on through the rest of the file without keeping it.
+    """
+
+    def __init__(self, path, max_buffer=None):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.read_lines = list()
+        self.buffer_end = 0 if max_buffer == 0 else None # File position after the last kept line, once the buffer is full
+        self.fh = None
+        self.finished = False
+
+    def lines(self, max_lines=None):
+        """ Yield lines from the start of the file, reading more only if needed """
+        for l, line in enumerate(self.read_lines):
+            if max_lines is not None and l >= max_lines:
+                return
+            yield line
+        if self.finished:
+            return
+        l = len(self.read_lines)
+        if self.buffer_end is not None and self.fh is not None:
+            # An earlier search may have read past the buffer
+            self.fh.seek(self.buffer_end)
+        while max_lines is None or l < max_lines:
+            try:
+                if self.fh is None:
+                    self.fh = io.open(self.path, "r", encoding='utf-8')
+                line = self.fh.readline()
+            except (IOError, OSError, ValueError, UnicodeDecodeError):
+                if config.report_readerrors:
+                    logger.debug("Couldn't read file when looking for output: {}".format(self.path))
+                self.close()
+                return
+            if line == '':
+                # The whole file is in the buffer - no need to read it again
+                if self.buffer_end is None:
+                    self.close()
+                return
+            if self.buffer_end is None:
+                self.read_lines.append(line)
+                if self.max_buffer is not None and len(self.read_lines) >= self.max_buffer:
+                    self.buffer_end = self.fh.tell()
+            l += 1
+            yield line
+
+    def close(self):
+        self.finished = True
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+
 def data_sources_tofile ():
+    if config.data_format == 'sqlite':
+        data_bundle.write_sources(data_sources)
+        return
     fn = 'multiqc_sources.{}'.format(config.data_format_extensions[config.data_format])
+    if config.data_format in util_functions.columnar_formats:
+        columns = OrderedDict([ ('Module', []), ('Section', []), ('Sample Name', []), ('Source', []) ])
+        for mod in data_sources:
+            for sec in data_sources[mod]:
+                for s_name, source in data_sources[mod][sec].items():
+                    for col, val in zip(columns.values(), [mod, sec, s_name, source]):
+                        col.append(val)
+        util_functions.write_columnar(columns, os.path.join(config.data_dir, fn), config.data_format)
+        return
     with io.open (os.path.join(config.data_dir, fn), 'w', encoding='utf-8') as f:
         if config.data_format == 'json':
             jsonstr = json.dumps(data_sources, indent=4, ensure_ascii=False)
@@ -301,10 +847,91 @@ def save_htmlid(html_id, skiplint=False):
     return html_id_clean
 
 
-def compress_json(data):
-    """ Take a Python data object. Convert to JSON and compress using lzstring """
-    json_string = json.dumps(data).encode('utf-8', 'ignore').decode('utf-8')
-    # JSON.parse() doesn't handle `NaN`, but it does handle `null`.
-    json_string = json_string.replace('NaN', 'null');
-    x = lzstring.LZString()
-    return x.compressToBase64(json_string)
+# JSON strings, or the NaN / Infinity values that json.dumps() writes for floats
+json_nan_re = re.compile(r'"(?:[^"\\]|\\.)*"|-?Infinity|NaN')
+
+def dump_json(data):
+    """ JSON dump data for JSON.parse(), which doesn't handle `NaN` but does handle `null`.
+    Values are replaced outside of strings only, so sample names are left alone. """
+    json_string = json.dumps(data)
+    if 'NaN' in json_string or 'Infinity' in json_string:
+        json_string = json_nan_re.sub(lambda m: m.group(0) if m.group(0)[0] == '"' else 'null', json_string)
+    return json_string
+
+def compress_zlib(json_string):
+    """ Deflate with zlib and base64 encode. Decoded in the report by mqc_inflate() """
+    return base64.b64encode(zlib.compress(json_string.encode('utf-8'))).decode('ascii')
+
+def compress_lzstring(json_string):
+    """ Compress with lzstring. Slow, but decoded by any browser with LZString """
+    return lzstring.LZString().compressToBase64(json_string)
+
+# Plot data compression backends. Each has a matching decoder in multiqc_plotdata.js
+compression_backends = OrderedDict([
+    ('zlib', compress_zlib),
+    ('lzstring', compress_lzstring),
+])
+
+def compression_backend():
+    """ Name of the compression backend to use, from config.plot_data_compression """
+    backend = getattr(config, 'plot_data_compression', 'zlib')
+    if backend not in compression_backends:
+        logger.warning("Unknown plot data compression '{}', using zlib. Choose from: {}".format(
+            backend, ', '.join(compression_backends.keys())))
+        backend = 'zlib'
+    return backend
+
+def compress_json(data, backend=None):
+    """ Take a Python data object. Convert to JSON and compress using
+    the configured compression backend (zlib by default) """
+    if backend is None:
+        backend = compression_backend()
+    return compression_backends[backend](dump_json(data))
+
+def compress_plot(pid, backend='zlib'):
+    """ Compress the JSON for one plot, with long line graph series downsampled.
+    Returns the JSON length, the compressed string and the number of series downsampled """
+    pdata = plot_data[pid]
+    num_downsampled = 0
+    if pdata.get('plot_type') == 'xy_line':
+        from multiqc.plots import linegraph
+        pdata, num_downsampled = linegraph.downsample_plot(pdata)
+    json_string = dump_json(pdata)
+    return len(json_string), compression_backends[backend](json_string), num_downsampled
+
+def compress_plot_data(backend='zlib'):
+    """
+    Compress the data for each plot separately, so that the report only has
+    to decompress a plot when it is shown. Uses a pool of processes if
+    config.plot_workers is more than one. Returns an OrderedDict of
+    {plot ID: base64 compressed JSON}
+    """
+    start = time.time()
+    pids = list(plot_data.keys())
+    workers = min(plot_pool.num_workers(), len(pids))
+    compressed = None
+    if workers > 1 and hasattr(os, 'fork'):
+        try:
+            ctx = multiprocessing.get_context('fork')
+        except AttributeError:
+            ctx = multiprocessing # Python 2, forks on all platforms that support it
+        try:
+            # Forked workers already have the plot data, so only the plot IDs are sent to them
+            pool = ctx.Pool(workers)
+            try:
+                compressed = pool.map(functools.partial(compress_plot, backend=backend), pids, chunksize=1)
+            finally:
+                pool.terminate()
+                pool.join()
+        except Exception as e:
+            logger.debug("Could not compress plot data in {} processes: {}".format(workers, e))
+    if compressed is None:
+        compressed = [ compress_plot(pid, backend) for pid in pids ]
+    num_downsampled = sum([ c[2] for c in compressed ])
+    if num_downsampled > 0:
+        logger.info("Downsampled {} long line graph series in the report plot data".format(num_downsampled))
+    json_size = sum([ c[0] for c in compressed ])
+    compressed_size = sum([ len(c[1]) for c in compressed ])
+    logger.info("Compressed plot data with {}: {:,.0f} kB to {:,.0f} kB in {:.2f}s".format(
+        backend, json_size / 1024.0, compressed_size / 1024.0, time.time() - start))
+    return OrderedDict([ (pid, c[1]) for pid, c in zip(pids, compressed) ])
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+""" MultiQC run state. Saves the report output of each module along with
+the size and modification time of the files that it was given, so that
+an --incremental run only runs the modules whose files have been added,
+changed or removed since the last report. """
+
+from __future__ import print_function
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+from multiqc import config
+from multiqc.utils import data_bundle, module_pool, report
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+state_fn = 'multiqc_run_state.pkl'
+
+# Report globals that modules add to, see module_pool.empty_report()
+report_globals = ['general_stats_data', 'general_stats_headers', 'data_sources', 'plot_data',
+                  'saved_raw_data', 'lint_errors', 'num_hc_plots', 'num_mpl_plots']
+
+# Config that changes between runs without changing the output of modules
+run_config_keys = [
+    'analysis_dir', 'creation_date', 'working_dir', 'output_dir', 'output_fn', 'output_fn_name',
+    'data_dir', 'data_tmp_dir', 'data_dir_name', 'plots_dir', 'plots_tmp_dir', 'force',
+    'title', 'report_comment', 'template', 'kwargs', 'megaqc_access_token', 'no_version_check',
+    'discovery_threads', 'discovery_cache', 'discovery_cache_dir', 'discovery_cache_max_age', 'discovery_streaming',
+    'module_workers', 'incremental', 'plot_workers', 'template_cache', 'template_cache_dir',
+    'shared_assets_dir', 'shared_assets_url'
+]
+
+def config_hash():
+    """ Hash of the config, ignoring anything that only changes the report file names or speed """
+    conf = dict()
+    for k, v in vars(config).items():
+        if k.startswith('_') or k in run_config_keys:
+            continue
+        if v is None or isinstance(v, (bool, int, float, list, dict, type(''), type(u''))):
+            conf[k] = v
+    conf_json = json.dumps(conf, sort_keys=True, default=str)
+    return hashlib.sha1(conf_json.encode('utf-8')).hexdigest()
+
+def module_key(mod_dict):
+    """ Modules can be run more than once with different config """
+    return json.dumps(list(mod_dict.items())[0], sort_keys=True, default=str)
+
+def module_keys(this_module):
+    """
+    Search keys for a module. Search keys start with the module name,
+    as when the search patterns are chosen in report.get_filelist().
+    """
+    mod_names = [this_module.lower()]
+    if this_module == 'custom_content':
+        mod_names.extend([ k.lower() for k in getattr(config, 'custom_data', {}).keys() ])
+    return [ key for key in report.files if key.split('/', 1)[0].lower() in mod_names ]
+
+def module_files(this_module):
+    """
+    Size and modification time of the files found for a module, as
+    {search key: {path: [size, mtime]}}.
+    """
+    fingerprints = dict()
+    for key in module_keys(this_module):
+        fingerprints[key] = dict([
+            (os.path.abspath(os.path.join(f['root'], f['fn'])), [f.get('filesize'), f.get('mtime')])
+            for f in report.files[key]
+        ])
+    return fingerprints
+
+def compare_files(old, new):
+    """ Count the added, changed and removed files between two module_files() results """
+    added = changed = removed = 0
+    for key in set(old.keys()) | set(new.keys()):
+        old_files = old.get(key, {})
+        new_files = new.get(key, {})
+        added += len([ p for p in new_files if p not in old_files ])
+        removed += len([ p for p in old_files if p not in new_files ])
+        changed += len([ p for p in new_files if p in old_files and list(new_files[p]) != list(old_files[p]) ])
+    return added, changed, removed
+
+@contextmanager
+def capture():
+    """
+    Collect what a module adds to the report globals. The globals are emptied
+    while the module runs and what it added is merged back afterwards, even if
+    it breaks. Yields a dict which gets a copy of the added state that can be
+    pickled, if the module finished.
+    """
+    previous = dict([ (k, getattr(report, k)) for k in report_globals ])
+    num_html_ids = module_pool.empty_report()
+    captured = dict()
+    try:
+        yield captured
+        captured.update(module_pool.report_state(num_html_ids))
+    finally:
+        added = dict([ (k, getattr(report, k)) for k in report_globals ])
+        added['html_ids'] = list() # Already in the report
+        for k, v in previous.items():
+            setattr(report, k, v)
+        module_pool.merge_state(added)
+
+
+class RunState(object):
+    """
+    Saved state of the last run for a report. Loaded from its data directory,
+    module output is reused with run() if none of the module's files have changed.
+    The new state is written to the new data directory with save().
+    """
+
+    def __init__(self, data_dir, plots_dir=None):
+        self.data_dir = data_dir
+        self.plots_dir = plots_dir
+        self.config_hash = config_hash()
+        self.entries = dict()
+        self.new_entries = OrderedDict()
+        self.num_reused = 0
+        self.load()
+
+    def load(self):
+        fn = os.path.join(self.data_dir, state_fn)
+        if not os.path.exists(fn):
+            logger.info("No saved run state found in '{}', running all modules".format(os.path.relpath(self.data_dir)))
+            return
+        try:
+            with open(fn, 'rb') as f:
+                saved = pickle.load(f)
+        except Exception as e:
+            logger.warn("Could not load saved run state, running all modules: {}".format(e))
+            return
+        if saved.get('version') != config.version:
+            logger.info("Saved run state is from MultiQC v{}, running all modules".format(saved.get('version')))
+        elif saved.get('config_hash') != self.config_hash:
+            logger.info("Config has changed since the last run, running all modules")
+        else:
+            self.entries = saved['entries']
+            logger.info("Loaded saved run state for {} modules".format(len(self.entries)))
+
+    def can_reuse(self, mod_dict):
+        """ True if there is saved output for a module and its files are the same """
+        entry = self.entries.get(module_key(mod_dict))
+        if entry is None:
+            return False
+        this_module = list(mod_dict.keys())[0]
+        report.wait_for_files(module_keys(this_module))
+        return compare_files(entry['files'], module_files(this_module)) == (0, 0, 0)
+
+    def run(self, mod_dict, run_func):
+        """
+        Return the saved output for a module if its files haven't changed.
+        Otherwise return the output of run_func() and save it for next time.
+        Raises UserWarning if no samples were found, like the module itself.
+        """
+        this_module = list(mod_dict.keys())[0]
+        key = module_key(mod_dict)
+        report.wait_for_files(module_keys(this_module))
+        files = module_files(this_module)
+        entry = self.entries.get(key)
+        if entry is not None:
+            added, changed, removed = compare_files(entry['files'], files)
+            if added + changed + removed > 0:
+                logger.info("{} - {} new, {} changed and {} removed files since the last run".format(this_module, added, changed, removed))
+            else:
+                output = self.restore(this_module, entry)
+                if output is not None:
+                    self.new_entries[key] = entry
+                    self.num_reused += 1
+                    if len(output) == 0:
+                        raise UserWarning
+                    return output
+
+        try:
+            with capture() as captured:
+                output = run_func()
+        except UserWarning:
+            self.new_entries[key] = { 'files': files, 'output': None }
+            raise
+        if type(output) != list:
+            output = [output]
+        # Pickled when saved, after any flat plots have been drawn into the module HTML
+        self.new_entries[key] = { 'files': files, 'modules': output, 'state': captured }
+        return output
+
+    def restore(self, this_module, entry):
+        """ Add the saved output of a module to the report. Returns None if it can't be used. """
+        if entry['output'] is None:
+            logger.debug("{} - No files have changed, no samples found last time".format(this_module))
+            return list()
+        try:
+            modules, state = pickle.loads(entry['output'])
+        except Exception as e:
+            logger.debug("{} - Could not load the saved module output, running again: {}".format(this_module, e))
+            return None
+        clashes = set(state['html_ids']) & set(report.html_ids)
+        if len(clashes) > 0:
+            logger.debug("{} - HTML IDs clash with earlier modules, running again: {}".format(this_module, ', '.join(clashes)))
+            return None
+        if not self.copy_files(this_module, state):
+            return None
+        module_pool.merge_state(state)
+        logger.info("{} - No files have changed, using the output from the last run".format(this_module))
+        return modules
+
+    def copy_files(self, this_module, state):
+        """
+        Copy the data files and exported plots that the module made last time to the
+        new report. Files are named after saved raw data or HTML IDs. Returns False
+        if a data file is missing.
+        """
+        names = set(state['saved_raw_data'].keys()) | set(state['html_ids'])
+        copies = list()
+        if config.data_dir is not None and config.data_format == 'sqlite':
+            old_bundle = data_bundle.get_bundle_fn(self.data_dir)
+            if not data_bundle.copy_tables(old_bundle, state['saved_raw_data'].keys(), names):
+                logger.debug("{} - Data tables from the last run are missing, running again".format(this_module))
+                return False
+        elif config.data_dir is not None:
+            data_fns = dict([ (os.path.splitext(fn)[0], fn) for fn in os.listdir(self.data_dir) ])
+            for name in state['saved_raw_data'].keys():
+                if name not in data_fns:
+                    logger.debug("{} - Data file '{}' from the last run is missing, running again".format(this_module, name))
+                    return False
+            for name in names:
+                if name in data_fns:
+                    copies.append((os.path.join(self.data_dir, data_fns[name]), os.path.join(config.data_dir, data_fns[name])))
+        if config.export_plots and self.plots_dir is not None and os.path.isdir(self.plots_dir):
+            for fformat in os.listdir(self.plots_dir):
+                fdir = os.path.join(self.plots_dir, fformat)
+                if not os.path.isdir(fdir):
+                    continue
+                for fn in os.listdir(fdir):
+                    if os.path.splitext(fn)[0] in names:
+                        copies.append((os.path.join(fdir, fn), os.path.join(config.plots_dir, fformat, fn)))
+        for src, dest in copies:
+            if not os.path.exists(os.path.dirname(dest)):
+                os.makedirs(os.path.dirname(dest))
+            shutil.copyfile(src, dest)
+        return True
+
+    def save(self, data_dir):
+        """ Save the state of this run to the data directory """
+        for key in list(self.new_entries.keys()):
+            entry = self.new_entries[key]
+            if 'modules' not in entry:
+                continue
+            try:
+                output = pickle.dumps((module_pool.module_shells(entry['modules']), entry['state']), protocol=2)
+            except Exception as e:
+                logger.debug("Could not save the module output for next time: {}".format(e))
+                del self.new_entries[key]
+            else:
+                self.new_entries[key] = { 'files': entry['files'], 'output': output }
+        saved = {
+            'version': config.version,
+            'config_hash': self.config_hash,
+            'entries': self.new_entries
+        }
+        with open(os.path.join(data_dir, state_fn), 'wb') as f:
+            pickle.dump(saved, f, protocol=2)
+        logger.debug("Saved run state for {} modules, {} reused from the last run".format(len(self.new_entries), self.num_reused))
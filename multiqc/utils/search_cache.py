@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+""" MultiQC file search cache. Remembers which search patterns
+each file matched, so that unchanged files don't need to be read
+again on the next run over the same directories. """
+
+from __future__ import print_function
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from multiqc.utils import config
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+def get_cache_fn():
+    """ Path to the cache database, defaults to ~/.cache/multiqc/ """
+    cache_dir = config.discovery_cache_dir
+    if cache_dir is None:
+        cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser(os.path.join('~', '.cache'))), 'multiqc')
+    return os.path.join(cache_dir, 'multiqc_search_cache.db')
+
+def patterns_hash(spatterns):
+    """ Hash of the search patterns and fn_ignore_contents. Keys are kept in
+    order, as the first non-shared match stops the search for a file. """
+    sp_json = json.dumps([
+        [ [ [key, sps] for key, sps in tier.items() ] for tier in spatterns ],
+        sorted(config.fn_ignore_contents or [])
+    ], sort_keys=True)
+    return hashlib.sha1(sp_json.encode('utf-8')).hexdigest()
+
+
+class SearchCache(object):
+    """
+    On-disk cache of file search results, in a SQLite database. Each entry
+    is keyed on the file path, size, modification time and the hash of the
+    search patterns in use. Lookups can happen from several threads, new
+    results are written once at the end of the search with save().
+    Entries that haven't been used for max_age days are deleted by save(),
+    so that results for deleted files and old search patterns don't build up.
+    """
+
+    def __init__(self, spatterns, cache_fn=None, max_age=None):
+        self.cache_fn = cache_fn if cache_fn is not None else get_cache_fn()
+        self.sp_hash = patterns_hash(spatterns)
+        self.max_age = max_age if max_age is not None else config.discovery_cache_max_age
+        self.hits = 0
+        self.misses = 0
+        self.new_entries = list()
+        self.used_paths = list()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.connections = list()
+        if not os.path.exists(os.path.dirname(self.cache_fn)):
+            os.makedirs(os.path.dirname(self.cache_fn))
+        conn = self.connect()
+        with conn:
+            # Caches made by older versions don't have the last used time - start again
+            columns = [ r[1] for r in conn.execute('PRAGMA table_info(search_cache)') ]
+            if len(columns) > 0 and 'used' not in columns:
+                conn.execute('DROP TABLE search_cache')
+            conn.execute('CREATE TABLE IF NOT EXISTS search_cache (path TEXT, sp_hash TEXT, size INTEGER, mtime REAL, sp_keys TEXT, used REAL, PRIMARY KEY (path, sp_hash))')
+
+    def connect(self):
+        """ SQLite connections can't be shared between threads, so use one per thread """
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # Closed from the main thread by close(), once the search threads have finished
+            conn = sqlite3.connect(self.cache_fn, timeout=30, check_same_thread=False)
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def get(self, path, size, mtime):
+        """ Return the cached list of matching search keys for a file, or None if not known """
+        row = self.connect().execute(
+            'SELECT sp_keys FROM search_cache WHERE path = ? AND sp_hash = ? AND size = ? AND mtime = ?',
+            (path, self.sp_hash, size, mtime)
+        ).fetchone()
+        with self.lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.used_paths.append(path)
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def add(self, path, size, mtime, sp_keys):
+        """ Remember the search result for a file. Written to disk by save() """
+        self.new_entries.append((path, self.sp_hash, size, mtime, json.dumps(sp_keys)))
+
+    def save(self):
+        """ Write new results to the cache database and delete entries that haven't been used for a while """
+        now = time.time()
+        conn = self.connect()
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?)', [ e + (now,) for e in self.new_entries ])
+            conn.executemany('UPDATE search_cache SET used = ? WHERE path = ? AND sp_hash = ?', [ (now, path, self.sp_hash) for path in self.used_paths ])
+            pruned = 0
+            if self.max_age is not None:
+                pruned = conn.execute('DELETE FROM search_cache WHERE used < ?', (now - self.max_age * 86400,)).rowcount
+        logger.info("Search cache: {} hits, {} misses ({})".format(self.hits, self.misses, self.cache_fn))
+        if pruned > 0:
+            logger.debug("Search cache: deleted {} entries not used for {} days".format(pruned, self.max_age))
+        self.new_entries = list()
+        self.used_paths = list()
+
+    def close(self):
+        """ Close the connections of all threads """
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = list()
+        self.local = threading.local()
+
+
+def clear_cache(cache_fn=None):
+    """ Delete the search cache database """
+    if cache_fn is None:
+        cache_fn = get_cache_fn()
+    if os.path.exists(cache_fn):
+        os.remove(cache_fn)
+        logger.info("Deleted search cache: {}".format(cache_fn))
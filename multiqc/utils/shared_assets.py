@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+""" MultiQC shared assets. Writes the JavaScript, CSS and images used by
+reports once to a shared directory, instead of into every report. Files are
+kept in a directory for each MultiQC version and named with a hash of their
+contents, so they never change once written and can be cached by browsers
+and web servers. """
+
+from __future__ import print_function
+import hashlib
+import io
+import os
+
+from multiqc.utils import config
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+def get_assets_dir():
+    """ Versioned directory for the shared assets of this MultiQC version """
+    return os.path.join(os.path.realpath(config.shared_assets_dir), 'multiqc-{}'.format(config.short_version))
+
+def asset_filename(name, data):
+    """ File name with a hash of the file contents, eg. multiqc.0123456789.js """
+    base, ext = os.path.splitext(os.path.basename(name))
+    return '{}.{}{}'.format(base, hashlib.sha1(data).hexdigest()[:10], ext)
+
+def write_asset(name, data, report_dir):
+    """
+    Write the bytes of an asset to the shared assets directory, if it's not
+    already there. Returns the URL of the asset for a report in report_dir.
+    """
+    assets_dir = get_assets_dir()
+    fn = asset_filename(name, data)
+    path = os.path.join(assets_dir, fn)
+    if not os.path.exists(path):
+        if not os.path.exists(assets_dir):
+            os.makedirs(assets_dir)
+        # Write to a temporary name first, so that other runs never see half a file
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with io.open(tmp_path, 'wb') as f:
+            f.write(data)
+        try:
+            os.rename(tmp_path, path)
+            logger.debug("Wrote shared asset: {}".format(path))
+        except OSError:
+            os.remove(tmp_path) # Windows - another run has already written it
+    return asset_url(path, report_dir)
+
+def asset_url(path, report_dir):
+    """ URL for an asset, under shared_assets_url if set, otherwise relative to the report """
+    if config.shared_assets_url:
+        return '{}/{}/{}'.format(config.shared_assets_url.rstrip('/'), os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    try:
+        return os.path.relpath(path, report_dir).replace(os.sep, '/')
+    except ValueError:
+        # Windows - report and assets on different drives
+        return 'file:///' + path.replace(os.sep, '/').lstrip('/')
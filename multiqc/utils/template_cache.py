@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+""" MultiQC template cache. Keeps a copy of each report template, keyed
+on the contents of its files and the MultiQC version, along with compiled
+Jinja templates and pre-rendered static fragments of the report. Saves
+copying, base64 encoding and parsing the template files on every run. """
+
+from __future__ import print_function
+from distutils.dir_util import copy_tree
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+
+import jinja2
+
+from multiqc.utils import config
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+def get_cache_dir():
+    """ Path to the template cache directory, defaults to ~/.cache/multiqc/templates """
+    cache_dir = config.template_cache_dir
+    if cache_dir is None:
+        cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser(os.path.join('~', '.cache'))), 'multiqc', 'templates')
+    return cache_dir
+
+def template_hash(template_dirs):
+    """ Hash of the MultiQC version and the names and contents of all files in the template directories """
+    h = hashlib.sha1(config.version.encode('utf-8'))
+    for template_dir in template_dirs:
+        for root, dirnames, filenames in os.walk(template_dir):
+            dirnames[:] = sorted([ d for d in dirnames if d != '__pycache__' ])
+            for fn in sorted(filenames):
+                if fn.endswith('.pyc'):
+                    continue
+                path = os.path.join(root, fn)
+                h.update(os.path.relpath(path, template_dir).replace(os.sep, '/').encode('utf-8'))
+                with io.open(path, 'rb') as f:
+                    h.update(hashlib.sha1(f.read()).digest())
+    return h.hexdigest()
+
+def write_atomic(path, data):
+    """ Write a file to a temporary name and rename it, so that other runs never see half a file """
+    fd, tmp_fn = tempfile.mkstemp(dir=os.path.dirname(path))
+    with io.open(fd, 'w', encoding='utf-8') as f:
+        f.write(data)
+    try:
+        os.rename(tmp_fn, path)
+    except OSError:
+        os.remove(tmp_fn) # Windows - another run has already written it
+
+
+class TemplateCache(object):
+    """
+    A template merged with its parent template, copied once to a directory
+    named after the hash of its files. Also holds the Jinja bytecode cache
+    and pre-rendered fragments for that template.
+    """
+
+    def __init__(self, template_dirs, cache_dir=None):
+        self.cache_dir = cache_dir if cache_dir is not None else get_cache_dir()
+        self.key = template_hash(template_dirs)
+        self.path = os.path.join(self.cache_dir, self.key)
+        self.template_dir = os.path.join(self.path, 'template')
+        self.fragments_dir = os.path.join(self.path, 'fragments')
+        self.hits = 0
+        self.misses = 0
+        if os.path.isdir(self.template_dir):
+            logger.debug("Using cached template: {}".format(self.template_dir))
+        else:
+            # Copy to a temporary directory first, in case another run is doing the same
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+            for template_dir in template_dirs:
+                copy_tree(template_dir, os.path.join(tmp_dir, 'template'))
+            os.makedirs(os.path.join(tmp_dir, 'fragments'))
+            os.makedirs(os.path.join(tmp_dir, 'jinja'))
+            try:
+                os.rename(tmp_dir, self.path)
+                logger.debug("Cached template: {}".format(self.template_dir))
+            except OSError:
+                shutil.rmtree(tmp_dir) # Another run got there first
+
+    def bytecode_cache(self):
+        """ Compiled Jinja templates, so that the template files are only parsed once """
+        return jinja2.FileSystemBytecodeCache(os.path.join(self.path, 'jinja'))
+
+    def fragment(self, name, key, render):
+        """
+        Return the rendered fragment of the report for this name and key
+        (eg. the config values that it uses), calling render() to make it if
+        it isn't in the cache yet.
+        """
+        key_hash = hashlib.sha1(json.dumps([name, key], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        fn = os.path.join(self.fragments_dir, key_hash + '.html')
+        try:
+            with io.open(fn, 'r', encoding='utf-8') as f:
+                html = f.read()
+            self.hits += 1
+            return html
+        except (OSError, IOError):
+            pass
+        self.misses += 1
+        html = render()
+        try:
+            write_atomic(fn, html)
+        except (OSError, IOError) as e:
+            logger.debug("Could not save template fragment '{}' to the cache: {}".format(name, e))
+        return html
+
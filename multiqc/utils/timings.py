@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+""" MultiQC timings. Records the time, memory and number of files
+used by each module, plot and report step, so that slow runs
+can be tracked down. """
+
+from __future__ import print_function
+from collections import OrderedDict
+from contextlib import contextmanager
+import functools
+import io
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None # Windows
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+# Records for each kind of timing, eg. records['modules']['fastqc']
+records = OrderedDict()
+start_time = time.time()
+current_module = None
+
+def cpu_time():
+    """ User + system CPU time for this process, in seconds """
+    t = os.times()
+    return t[0] + t[1]
+
+def peak_rss():
+    """ Peak resident memory of this process in bytes, or None if not available """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes on Linux
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def get_record(kind, name):
+    if kind not in records:
+        records[kind] = OrderedDict()
+    if name not in records[kind]:
+        records[kind][name] = OrderedDict([
+            ('calls', 0),
+            ('wall_time', 0.0),
+            ('cpu_time', 0.0),
+            ('peak_rss_delta', 0),
+            ('files', 0),
+            ('bytes_read', 0)
+        ])
+    return records[kind][name]
+
+@contextmanager
+def timed(kind, name):
+    """ Time a block of code. Times add up over repeated calls with the same kind and name.
+    The peak RSS delta is how much the peak memory of the process went up. """
+    rec = get_record(kind, name)
+    wall_start = time.time()
+    cpu_start = cpu_time()
+    rss_start = peak_rss()
+    try:
+        yield rec
+    finally:
+        rec['calls'] += 1
+        rec['wall_time'] += time.time() - wall_start
+        rec['cpu_time'] += cpu_time() - cpu_start
+        if rss_start is not None:
+            rec['peak_rss_delta'] += peak_rss() - rss_start
+
+def timed_function(kind, name=None):
+    """ Decorator to time every call of a function. Uses the module name if no name is given.
+    Calls made while a module is running are recorded as "module/name". """
+    def decorator(func):
+        fname = name if name is not None else func.__module__.split('.')[-1]
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = fname if current_module is None else '{}/{}'.format(current_module, fname)
+            with timed(kind, key):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def module(name):
+    """ Time a module. Files read with find_log_files() while it runs are added to its record. """
+    global current_module
+    previous_module = current_module
+    current_module = name
+    try:
+        with timed('modules', name) as rec:
+            yield rec
+    finally:
+        current_module = previous_module
+
+def add_file(sp_key, num_bytes):
+    """ Count a file given to a module by find_log_files() """
+    recs = [ get_record('find_log_files', sp_key) ]
+    if current_module is not None:
+        recs.append(get_record('modules', current_module))
+    for rec in recs:
+        rec['files'] += 1
+        if num_bytes is not None:
+            rec['bytes_read'] += num_bytes
+
+def merge(new_records):
+    """ Add records from another process (see module_pool) """
+    for kind, recs in new_records.items():
+        for name, new_rec in recs.items():
+            rec = get_record(kind, name)
+            for k, v in new_rec.items():
+                rec[k] += v
+
+def reset():
+    records.clear()
+
+def write_timings(data_dir):
+    """ Save all timings to multiqc_timings.json in the data directory """
+    timings = OrderedDict([('total_wall_time', time.time() - start_time)])
+    timings.update(records)
+    fn = os.path.join(data_dir, 'multiqc_timings.json')
+    with io.open(fn, 'w', encoding='utf-8') as f:
+        jsonstr = json.dumps(timings, indent=4, ensure_ascii=False)
+        print( jsonstr.encode('utf-8', 'ignore').decode('utf-8'), file=f)
+
+def log_summary():
+    """ Print a table of the slowest steps to the debug log (shown with -v) """
+    lines = ["Timings - total {:.2f}s".format(time.time() - start_time)]
+    row = "  {:<40} {:>6} {:>10} {:>10} {:>12} {:>8} {:>10}"
+    lines.append(row.format('Name', 'Calls', 'Wall (s)', 'CPU (s)', 'Peak RSS +MB', 'Files', 'MB read'))
+    for kind, recs in records.items():
+        lines.append("  {}:".format(kind))
+        for name, rec in sorted(recs.items(), key=lambda r: r[1]['wall_time'], reverse=True):
+            lines.append(row.format(
+                name[:40], rec['calls'],
+                '{:.2f}'.format(rec['wall_time']),
+                '{:.2f}'.format(rec['cpu_time']),
+                '{:.1f}'.format(rec['peak_rss_delta'] / 1048576.0),
+                rec['files'],
+                '{:.1f}'.format(rec['bytes_read'] / 1048576.0)
+            ))
+    logger.debug("\n".join(lines))
@@ -3,6 +3,7 @@
 """ MultiQC Utility functions, used in a variety of places. """
 
 from __future__ import print_function
+from collections import OrderedDict
 import io
 import json
 import os
@@ -12,6 +13,10 @@ import shutil
 import sys
 
 from multiqc import config
+from multiqc.utils import data_bundle
+
+# Binary column based data formats, written with pyarrow (optional dependency)
+columnar_formats = ['parquet', 'arrow']
 
 def robust_rmtree(path, logger=None, max_retries=10):
     """Robustly tries to delete paths.
@@ -52,6 +57,11 @@ def write_data_file(data, fn, sort_cols=False, data_format=None):
         # Add relevant file extension to filename
         if data_format is None:
             data_format = config.data_format
+
+        # All tables go in one file in the data directory
+        if data_format == 'sqlite':
+            data_bundle.write_table(fn, data)
+            return
         fn = '{}.{}'.format(fn, config.data_format_extensions[data_format])
 
         # JSON encoder class to handle lambda functions
@@ -64,6 +74,17 @@ def write_data_file(data, fn, sort_cols=False, data_format=None):
                         return None
                 return json.JSONEncoder.default(self, obj)
 
+        # Binary formats - one typed column per field
+        if data_format in columnar_formats:
+            h = data_headers(data, sort_cols)
+            samples = sorted(data.keys())
+            columns = OrderedDict()
+            columns['Sample'] = [ str(sn) for sn in samples ]
+            for k in h[1:]:
+                columns[k] = [ data[sn].get(k) for sn in samples ]
+            write_columnar(columns, os.path.join(config.data_dir, fn), data_format)
+            return
+
         # Save file
         with io.open (os.path.join(config.data_dir, fn), 'w', encoding='utf-8') as f:
             if data_format == 'json':
@@ -74,13 +95,7 @@ def write_data_file(data, fn, sort_cols=False, data_format=None):
             else:
                 # Default - tab separated output
                 # Get all headers
-                h = ['Sample']
-                for sn in sorted(data.keys()):
-                    for k in data[sn].keys():
-                        if type(data[sn][k]) is not dict and k not in h:
-                            h.append(str(k))
-                if sort_cols:
-                    h = sorted(h)
+                h = data_headers(data, sort_cols)
 
                 # Get the rows
                 rows = [ "\t".join(h) ]
@@ -92,3 +107,48 @@ def write_data_file(data, fn, sort_cols=False, data_format=None):
                 body = '\n'.join(rows)
 
                 print( body.encode('utf-8', 'ignore').decode('utf-8'), file=f)
+
+
+def data_headers(data, sort_cols=False):
+    """ Column headers for a data file: 'Sample' and then every field
+    that isn't a dict, in the order that they are first found """
+    h = ['Sample']
+    seen = set(h)
+    for sn in sorted(data.keys()):
+        for k, v in data[sn].items():
+            if type(v) is not dict and k not in seen:
+                seen.add(k)
+                h.append(str(k))
+    if sort_cols:
+        h = sorted(h)
+    return h
+
+
+def columnar_available():
+    """ Can the columnar data formats be written? Needs pyarrow. """
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        return False
+
+
+def write_columnar(columns, path, data_format='parquet'):
+    """ Write a dict of column name: list of values to a zstd compressed
+    Parquet or Arrow IPC (Feather) file. Column types are found by pyarrow,
+    columns that can't be typed (eg. a mix of numbers and text) are saved
+    as text. Missing values are saved as nulls. """
+    import pyarrow as pa
+    arrays = list()
+    for vals in columns.values():
+        try:
+            arrays.append(pa.array(vals))
+        except (pa.ArrowException, TypeError, ValueError, OverflowError):
+            arrays.append(pa.array([ None if v is None else str(v) for v in vals ], type=pa.string()))
+    table = pa.Table.from_arrays(arrays, names=[ str(k) for k in columns.keys() ])
+    if data_format == 'arrow':
+        import pyarrow.feather
+        pyarrow.feather.write_feather(table, path, compression='zstd')
+    else:
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(table, path, compression='zstd')
@@ -66,6 +66,9 @@ setup(
     zip_safe = False,
     scripts = ['scripts/multiqc'],
     install_requires = install_requires,
+    extras_require = {
+        'arrow': ['pyarrow']
+    },
     entry_points = {
         'multiqc.modules.v1': [
             'adapterRemoval = multiqc.modules.adapterRemoval:MultiqcModule',
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+""" MultiQC plot micro-benchmarks. Times the table, line graph and bar graph
+builders with growing numbers of samples and prints the time per sample.
+The time per sample should stay about the same as the number of samples grows.
+
+Uses the MultiQC found on the Python path, eg:
+
+    PYTHONPATH=/path/to/MultiQC python test/benchmarks/plot_benchmarks.py """
+
+from __future__ import print_function, division
+from collections import OrderedDict
+import click
+import json
+import random
+import time
+
+from multiqc.utils import config, report
+from multiqc.plots import bargraph, linegraph, table
+
+def table_data(num_samples, num_cols, rng):
+    data = OrderedDict()
+    for i in range(num_samples):
+        data['sample_{:06d}'.format(i)] = dict([ ('col_{}'.format(c), rng.uniform(0, 1e6)) for c in range(num_cols) ])
+    headers = OrderedDict([ ('col_{}'.format(c), {'format': '{:,.1f}', 'suffix': ' M', 'modify': lambda x: x / 1e3}) for c in range(num_cols) ])
+    return data, headers
+
+def plot_table(num_samples, rng):
+    data, headers = table_data(num_samples, 20, rng)
+    return table.plot(data, headers, {'id': 'benchmark_table', 'no_beeswarm': True})
+
+def plot_linegraph(num_samples, rng):
+    data = OrderedDict()
+    for i in range(num_samples):
+        data['sample_{:06d}'.format(i)] = dict([ (x, rng.uniform(0, 100)) for x in range(50) ])
+    return linegraph.plot(data, {'id': 'benchmark_linegraph'})
+
+def plot_bargraph(num_samples, rng):
+    data = OrderedDict()
+    for i in range(num_samples):
+        data['sample_{:06d}'.format(i)] = dict([ ('cat_{}'.format(c), rng.randint(0, 1000)) for c in range(5) ])
+    return bargraph.plot(data, None, {'id': 'benchmark_bargraph'})
+
+benchmarks = OrderedDict([
+    ('table', plot_table),
+    ('linegraph', plot_linegraph),
+    ('bargraph', plot_bargraph),
+])
+
+def reset_report():
+    report.html_ids = list()
+    report.plot_data = dict()
+    report.saved_raw_data = dict()
+    report.num_hc_plots = 0
+    report.num_mpl_plots = 0
+
+
+@click.command()
+@click.option('-s', '--samples', 'sizes', default='100,1000,10000', show_default=True,
+              help="Comma separated numbers of samples")
+@click.option('-p', '--plot', 'plots', multiple=True, type=click.Choice(list(benchmarks.keys())),
+              help="Only benchmark these plot types (default: all)")
+@click.option('-r', '--repeats', default=3, show_default=True, help="Number of runs for each number of samples, the fastest is used")
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help="Also save the results to this JSON file")
+def run_benchmarks(sizes, plots, repeats, output):
+    """ Time the MultiQC plot builders for growing numbers of samples """
+    sizes = [ int(s) for s in sizes.split(',') ]
+    plots = list(plots) if len(plots) > 0 else list(benchmarks.keys())
+
+    # Interactive plots only, with no data files, to time building the HTML and plot data
+    config.plots_force_interactive = True
+    config.data_dir = None
+    config.export_plots = False
+
+    results = OrderedDict()
+    print("{:<12} {:>10} {:>12} {:>16}".format('Plot', 'Samples', 'Time (s)', 'Per sample (us)'))
+    for name in plots:
+        results[name] = OrderedDict()
+        for num_samples in sizes:
+            times = list()
+            for repeat in range(repeats):
+                rng = random.Random(repeat)
+                reset_report()
+                start = time.time()
+                benchmarks[name](num_samples, rng)
+                times.append(time.time() - start)
+            best = min(times)
+            results[name][num_samples] = best
+            print("{:<12} {:>10} {:>12.3f} {:>16.1f}".format(name, num_samples, best, best / num_samples * 1e6))
+
+    if output is not None:
+        with open(output, 'w') as fh:
+            json.dump(results, fh, indent=4)
+
+
+if __name__ == '__main__':
+    run_benchmarks()
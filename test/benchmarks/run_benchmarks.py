@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+""" MultiQC benchmarks. Generates synthetic logs for the heaviest modules
+at different numbers of samples, runs MultiQC on them and saves the time
+taken by each phase of the run to a JSON file. Runs fully offline.
+
+Compare the JSON from two MultiQC versions to spot performance regressions. """
+
+from __future__ import print_function, division
+from collections import OrderedDict
+import click
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synthetic_logs
+
+module_names = [ name for name, func in synthetic_logs.generators ]
+
+# Config for every run: no network access and no user config files
+offline_config = [
+    'no_version_check: true',
+    'megaqc_url: false',
+]
+
+
+def get_data(data_dir, num_samples, modules, seed):
+    """ Generate synthetic logs, or reuse them if made before with the same settings """
+    name = '{}_samples_seed{}_{}'.format(num_samples, seed, '-'.join(modules))
+    path = os.path.join(data_dir, name)
+    done_fn = os.path.join(path, '.benchmark_data_complete')
+    if not os.path.exists(done_fn):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        click.echo("Generating logs for {} samples in {}".format(num_samples, path), err=True)
+        start = time.time()
+        synthetic_logs.generate(path, num_samples, modules, seed)
+        io.open(done_fn, 'w').close()
+        click.echo("  took {:.1f}s".format(time.time() - start), err=True)
+    return path
+
+
+def phase_times(timings, modules):
+    """ Split the timings saved by MultiQC into the phases of a run """
+    plots = timings.get('plots', {})
+    report = timings.get('report', {})
+    mod_times = OrderedDict()
+    for m in modules:
+        rec = timings.get('modules', {}).get(m)
+        if rec is None:
+            continue
+        # Plots are made while the module runs. The rest of the module time is mostly
+        # parsing, but also includes finding files, tables and everything else
+        plot_time = sum([ p['wall_time'] for name, p in plots.items() if name.startswith('{}/'.format(m)) ])
+        mod_times[m] = OrderedDict([
+            ('wall_time', rec['wall_time']),
+            ('module_other', rec['wall_time'] - plot_time),
+            ('plotting', plot_time),
+            ('files', rec['files']),
+            ('bytes_read', rec['bytes_read']),
+            ('peak_rss_delta', rec['peak_rss_delta'])
+        ])
+    phases = OrderedDict([
+        ('discovery', sum([ report.get(k, {}).get('wall_time', 0) for k in ['file_search', 'file_search_wait'] ])),
+        ('module_other', sum([ t['module_other'] for t in mod_times.values() ])),
+        ('plotting', sum([ t['plotting'] for t in mod_times.values() ])),
+        # General Statistics table, made after the modules have run
+        ('table', sum([ p['wall_time'] for name, p in plots.items() if '/' not in name ])),
+        ('compression', report.get('compress_plot_data', {}).get('wall_time', 0)),
+        ('rendering', sum([ t['wall_time'] for t in timings.get('template', {}).values() ])),
+    ])
+    return phases, mod_times
+
+
+def run_multiqc(multiqc_cmd, data_path, modules, extra_args):
+    """ Run MultiQC and return the wall time and its saved timings """
+    outdir = tempfile.mkdtemp(prefix='multiqc_benchmark_')
+    try:
+        cmd = multiqc_cmd + [data_path, '-o', outdir, '-f']
+        for m in modules:
+            cmd.extend(['-m', m])
+        for c in offline_config:
+            cmd.extend(['--cl_config', c])
+        cmd.extend(extra_args)
+        start = time.time()
+        with open(os.devnull, 'w') as devnull:
+            exit_code = subprocess.call(cmd, stdout=devnull, stderr=devnull)
+        wall_time = time.time() - start
+        if exit_code != 0:
+            raise click.ClickException("MultiQC exited with code {}: {}".format(exit_code, ' '.join(cmd)))
+        timings_fn = os.path.join(outdir, 'multiqc_data', 'multiqc_timings.json')
+        if not os.path.exists(timings_fn):
+            raise click.ClickException("MultiQC did not save any timings - this version may be too old")
+        with io.open(timings_fn, encoding='utf-8') as fh:
+            timings = json.load(fh, object_pairs_hook=OrderedDict)
+        report_size = os.path.getsize(os.path.join(outdir, 'multiqc_report.html'))
+    finally:
+        shutil.rmtree(outdir)
+    return wall_time, timings, report_size
+
+
+@click.command()
+@click.option('-s', '--samples', 'sizes', default='10,1000', show_default=True,
+              help="Comma separated numbers of samples to benchmark, eg. 10,1000,10000,50000")
+@click.option('-m', '--module', 'modules', multiple=True, type=click.Choice(module_names),
+              help="Only benchmark these modules (default: all)")
+@click.option('-r', '--repeats', default=1, show_default=True, help="Number of runs for each number of samples")
+@click.option('--seed', default=1, show_default=True, help="Seed for the synthetic logs")
+@click.option('-d', '--data-dir', type=click.Path(file_okay=False),
+              help="Keep the synthetic logs here and reuse them for later benchmarks (default: temporary directory)")
+@click.option('-o', '--output', default='multiqc_benchmarks.json', show_default=True, type=click.Path(dir_okay=False),
+              help="JSON file to save the results to")
+@click.option('--multiqc', 'multiqc_cmd', default='multiqc', show_default=True,
+              help="Command used to run MultiQC, eg. 'python scripts/multiqc'")
+@click.argument('multiqc_args', nargs=-1, type=click.UNPROCESSED)
+def run_benchmarks(sizes, modules, repeats, seed, data_dir, output, multiqc_cmd, multiqc_args):
+    """
+    Benchmark MultiQC on synthetic logs.
+
+    Any extra arguments after -- are given to MultiQC, eg:
+
+        run_benchmarks.py -s 10,1000 -- --module-workers 4
+    """
+    modules = list(modules) if len(modules) > 0 else module_names
+    sizes = [ int(s) for s in sizes.split(',') ]
+    multiqc_cmd = multiqc_cmd.split()
+    try:
+        multiqc_version = subprocess.check_output(multiqc_cmd + ['--version']).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise click.ClickException("Could not run MultiQC with '{}': {}".format(' '.join(multiqc_cmd), e))
+
+    tmp_data_dir = None
+    if data_dir is None:
+        data_dir = tmp_data_dir = tempfile.mkdtemp(prefix='multiqc_benchmark_data_')
+    results = OrderedDict([
+        ('multiqc_version', multiqc_version),
+        ('multiqc_args', list(multiqc_args)),
+        ('python_version', platform.python_version()),
+        ('platform', platform.platform()),
+        ('date', datetime.datetime.now().isoformat()),
+        ('seed', seed),
+        ('modules', modules),
+        ('runs', list())
+    ])
+    try:
+        for num_samples in sizes:
+            data_path = get_data(data_dir, num_samples, modules, seed)
+            for repeat in range(repeats):
+                click.echo("Running MultiQC on {} samples (run {} of {})".format(num_samples, repeat + 1, repeats), err=True)
+                wall_time, timings, report_size = run_multiqc(multiqc_cmd, data_path, modules, list(multiqc_args))
+                phases, mod_times = phase_times(timings, modules)
+                results['runs'].append(OrderedDict([
+                    ('num_samples', num_samples),
+                    ('repeat', repeat),
+                    ('wall_time', wall_time),
+                    ('report_size', report_size),
+                    ('phases', phases),
+                    ('modules', mod_times),
+                    ('timings', timings)
+                ]))
+                click.echo("  {:.1f}s: {}".format(wall_time, ', '.join([ '{} {:.2f}s'.format(k, v) for k, v in phases.items() ])), err=True)
+    finally:
+        if tmp_data_dir is not None:
+            shutil.rmtree(tmp_data_dir)
+
+    with io.open(output, 'w', encoding='utf-8') as fh:
+        fh.write(u'{}\n'.format(json.dumps(results, indent=4)))
+    click.echo("Saved results to {}".format(output), err=True)
+
+
+if __name__ == '__main__':
+    run_benchmarks()
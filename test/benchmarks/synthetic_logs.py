@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+""" Generators for synthetic log files, used by run_benchmarks.py.
+Each generator writes realistic output for one tool for a number of
+samples. The same seed always gives the same files. """
+
+from __future__ import print_function, division
+import gzip
+import io
+import json
+import os
+import random
+import struct
+import zipfile
+
+
+def sample_names(num_samples):
+    return ['sample_{:06d}'.format(i) for i in range(num_samples)]
+
+
+def fastqc(outdir, num_samples, rng):
+    """ FastQC zip files, each with a fastqc_data.txt file """
+    read_len = 101
+    for s_name in sample_names(num_samples):
+        total = rng.randint(1000000, 50000000)
+        gc = rng.randint(38, 55)
+        l = ['##FastQC\t0.11.5']
+        l.append('>>Basic Statistics\tpass')
+        l.append('#Measure\tValue')
+        l.append('Filename\t{}_R1.fastq.gz'.format(s_name))
+        l.append('File type\tConventional base calls')
+        l.append('Encoding\tSanger / Illumina 1.9')
+        l.append('Total Sequences\t{}'.format(total))
+        l.append('Sequences flagged as poor quality\t0')
+        l.append('Sequence length\t{}'.format(read_len))
+        l.append('%GC\t{}'.format(gc))
+        l.append('>>END_MODULE')
+        l.append('>>Per base sequence quality\tpass')
+        l.append('#Base\tMean\tMedian\tLower Quartile\tUpper Quartile\t10th Percentile\t90th Percentile')
+        for b in range(1, read_len + 1):
+            q = 36 - (b / read_len) * rng.uniform(2, 8)
+            l.append('{}\t{:.4f}\t{:.1f}\t{:.1f}\t{:.1f}\t{:.1f}\t{:.1f}'.format(b, q, round(q), q - 2, q + 2, q - 6, q + 3))
+        l.append('>>END_MODULE')
+        l.append('>>Per sequence quality scores\tpass')
+        l.append('#Quality\tCount')
+        for q in range(2, 42):
+            l.append('{}\t{:.1f}'.format(q, total * (q / 861.0) ** 2))
+        l.append('>>END_MODULE')
+        l.append('>>Per base sequence content\twarn')
+        l.append('#Base\tG\tA\tT\tC')
+        for b in range(1, read_len + 1):
+            g = gc / 2 + rng.uniform(-2, 2)
+            c = gc - g
+            a = (100 - gc) / 2 + rng.uniform(-2, 2)
+            l.append('{}\t{:.4f}\t{:.4f}\t{:.4f}\t{:.4f}'.format(b, g, a, 100 - gc - a, c))
+        l.append('>>END_MODULE')
+        l.append('>>Per sequence GC content\tpass')
+        l.append('#GC Content\tCount')
+        for g in range(0, 101):
+            l.append('{}\t{:.1f}'.format(g, total * max(0, 1 - abs(g - gc) / 25.0) / 25.0))
+        l.append('>>END_MODULE')
+        l.append('>>Per base N content\tpass')
+        l.append('#Base\tN-Count')
+        for b in range(1, read_len + 1):
+            l.append('{}\t{:.4f}'.format(b, rng.uniform(0, 0.05)))
+        l.append('>>END_MODULE')
+        l.append('>>Sequence Length Distribution\tpass')
+        l.append('#Length\tCount')
+        l.append('{}\t{:.1f}'.format(read_len, total))
+        l.append('>>END_MODULE')
+        l.append('>>Sequence Duplication Levels\twarn')
+        dedup = rng.uniform(40, 95)
+        l.append('#Total Deduplicated Percentage\t{:.4f}'.format(dedup))
+        l.append('#Duplication Level\tPercentage of deduplicated\tPercentage of total')
+        for lvl in ['1', '2', '3', '4', '5', '6', '7', '8', '9', '>10', '>50', '>100', '>500', '>1k', '>5k', '>10k+']:
+            l.append('{}\t{:.4f}\t{:.4f}'.format(lvl, rng.uniform(0, 10), rng.uniform(0, 10)))
+        l.append('>>END_MODULE')
+        l.append('>>Overrepresented sequences\twarn')
+        l.append('#Sequence\tCount\tPercentage\tPossible Source')
+        for i in range(rng.randint(1, 5)):
+            seq = ''.join(rng.choice('ACGT') for _ in range(50))
+            l.append('{}\t{}\t{:.4f}\tNo Hit'.format(seq, total // 500, rng.uniform(0.1, 2)))
+        l.append('>>END_MODULE')
+        l.append('>>Adapter Content\tpass')
+        l.append('#Position\tIllumina Universal Adapter\tIllumina Small RNA Adapter\tNextera Transposase Sequence\tSOLID Small RNA Adapter')
+        for b in range(1, read_len - 10):
+            l.append('{}\t{:.4f}\t0.0\t0.0\t0.0'.format(b, b * rng.uniform(0, 0.01)))
+        l.append('>>END_MODULE')
+        d_name = '{}_R1_fastqc'.format(s_name)
+        with zipfile.ZipFile(os.path.join(outdir, '{}.zip'.format(d_name)), 'w', zipfile.ZIP_DEFLATED) as z:
+            z.writestr('{}/'.format(d_name), '')
+            z.writestr('{}/fastqc_data.txt'.format(d_name), '\n'.join(l) + '\n')
+
+
+def picard_header(tool, s_name):
+    return [
+        '## htsjdk.samtools.metrics.StringHeader',
+        '# {} INPUT=[{}.bam] OUTPUT={}.txt'.format(tool, s_name, s_name),
+        '## htsjdk.samtools.metrics.StringHeader',
+        '# Started on: Mon Jan 01 00:00:00 GMT 2018',
+        ''
+    ]
+
+
+def picard(outdir, num_samples, rng):
+    """ Picard MarkDuplicates, InsertSizeMetrics and AlignmentSummaryMetrics files """
+    for s_name in sample_names(num_samples):
+        pairs = rng.randint(1000000, 20000000)
+        dups = int(pairs * rng.uniform(0.05, 0.5))
+        l = picard_header('picard.sam.markduplicates.MarkDuplicates', s_name)
+        l.append('## METRICS CLASS\tpicard.sam.DuplicationMetrics')
+        l.append('LIBRARY\tUNPAIRED_READS_EXAMINED\tREAD_PAIRS_EXAMINED\tSECONDARY_OR_SUPPLEMENTARY_RDS\tUNMAPPED_READS\tUNPAIRED_READ_DUPLICATES\tREAD_PAIR_DUPLICATES\tREAD_PAIR_OPTICAL_DUPLICATES\tPERCENT_DUPLICATION\tESTIMATED_LIBRARY_SIZE')
+        l.append('{}\t{}\t{}\t0\t{}\t{}\t{}\t{}\t{:.6f}\t{}'.format(s_name, rng.randint(1000, 9000), pairs, rng.randint(1000, 90000), rng.randint(100, 900), dups, dups // 20, dups / pairs, pairs * 3))
+        l.append('')
+        with io.open(os.path.join(outdir, '{}.markdups_metrics.txt'.format(s_name)), 'w') as fh:
+            fh.write(u'\n'.join(l) + u'\n')
+
+        mean_insert = rng.uniform(200, 400)
+        l = picard_header('picard.analysis.CollectInsertSizeMetrics', s_name)
+        l.append('## METRICS CLASS\tpicard.analysis.InsertSizeMetrics')
+        l.append('MEDIAN_INSERT_SIZE\tMEDIAN_ABSOLUTE_DEVIATION\tMIN_INSERT_SIZE\tMAX_INSERT_SIZE\tMEAN_INSERT_SIZE\tSTANDARD_DEVIATION\tREAD_PAIRS\tPAIR_ORIENTATION')
+        l.append('{:.0f}\t40\t20\t1000\t{:.4f}\t60.5\t{}\tFR'.format(mean_insert, mean_insert, pairs))
+        l.append('')
+        l.append('## HISTOGRAM\tjava.lang.Integer')
+        l.append('insert_size\tAll_Reads.fr_count')
+        for i in range(20, 1000):
+            l.append('{}\t{}'.format(i, int(pairs / 100.0 * max(0, 1 - abs(i - mean_insert) / 200.0))))
+        l.append('')
+        with io.open(os.path.join(outdir, '{}.insert_size_metrics.txt'.format(s_name)), 'w') as fh:
+            fh.write(u'\n'.join(l) + u'\n')
+
+        l = picard_header('picard.analysis.CollectAlignmentSummaryMetrics', s_name)
+        l.append('## METRICS CLASS\tpicard.analysis.AlignmentSummaryMetrics')
+        l.append('CATEGORY\tTOTAL_READS\tPF_READS\tPCT_PF_READS\tPF_READS_ALIGNED\tPF_ALIGNED_BASES\tPF_HQ_ALIGNED_READS\tMEAN_READ_LENGTH\tPCT_PF_READS_ALIGNED\tPCT_CHIMERAS\tSAMPLE\tLIBRARY\tREAD_GROUP')
+        aligned = rng.uniform(0.8, 0.99)
+        l.append('PAIR\t{}\t{}\t1\t{}\t{}\t{}\t101\t{:.6f}\t0.01\t\t\t'.format(pairs * 2, pairs * 2, int(pairs * 2 * aligned), int(pairs * 2 * 101 * aligned), int(pairs * 2 * aligned * 0.9), aligned))
+        l.append('')
+        with io.open(os.path.join(outdir, '{}.alignment_summary_metrics.txt'.format(s_name)), 'w') as fh:
+            fh.write(u'\n'.join(l) + u'\n')
+
+
+def qualimap(outdir, num_samples, rng):
+    """ Qualimap BamQC genome_results.txt and raw_data_qualimapReport histograms """
+    for s_name in sample_names(num_samples):
+        qc_dir = os.path.join(outdir, '{}.qc'.format(s_name))
+        raw_dir = os.path.join(qc_dir, 'raw_data_qualimapReport')
+        os.makedirs(raw_dir)
+        reads = rng.randint(1000000, 50000000)
+        mapped = int(reads * rng.uniform(0.8, 0.99))
+        mean_cov = rng.uniform(10, 60)
+        with io.open(os.path.join(qc_dir, 'genome_results.txt'), 'w') as fh:
+            fh.write(u'BamQC report\n-----------------------------------\n\n>>>>>>> Input\n\n')
+            fh.write(u'     bam file = {}.bam\n     outfile = {}.qc/genome_results.txt\n\n'.format(s_name, s_name))
+            fh.write(u'>>>>>>> Globals\n\n')
+            fh.write(u'     number of reads = {:,}\n     number of mapped reads = {:,} ({:.2f}%)\n'.format(reads, mapped, 100.0 * mapped / reads))
+            fh.write(u'     number of sequenced bases = {:,} bp\n     number of mapped bases = {:,} bp\n\n'.format(reads * 101, mapped * 101))
+            fh.write(u'>>>>>>> Insert size\n\n     mean insert size = {:.4f}\n     median insert size = 300\n\n'.format(rng.uniform(250, 350)))
+            fh.write(u'>>>>>>> Mapping quality\n\n     mean mapping quality = {:.4f}\n\n'.format(rng.uniform(30, 60)))
+            fh.write(u'>>>>>>> Coverage\n\n     mean coverageData = {:.4f}X\n'.format(mean_cov))
+        with io.open(os.path.join(raw_dir, 'coverage_histogram.txt'), 'w') as fh:
+            fh.write(u'#Coverage\tNumber of genomic locations\n')
+            for c in range(0, 200):
+                fh.write(u'{:.1f}\t{:.1f}\n'.format(c, int(3.0e7 * max(0, 1 - abs(c - mean_cov) / mean_cov))))
+        with io.open(os.path.join(raw_dir, 'insert_size_histogram.txt'), 'w') as fh:
+            fh.write(u'#Insert size\tOccurrences\n')
+            for i in range(0, 1000, 2):
+                fh.write(u'{:.1f}\t{:.1f}\n'.format(i, reads / 100.0 * max(0, 1 - abs(i - 300) / 200.0)))
+        with io.open(os.path.join(raw_dir, 'genome_fraction_coverage.txt'), 'w') as fh:
+            fh.write(u'#Coverage (X)\tCoverage (%)\n')
+            for c in range(1, 101):
+                fh.write(u'{:.1f}\t{:.4f}\n'.format(c, 100.0 * max(0, 1 - c / (2 * mean_cov))))
+        with io.open(os.path.join(raw_dir, 'mapped_reads_gc-content_distribution.txt'), 'w') as fh:
+            fh.write(u'#GC Content (%)\tSample\tHUMAN (hg19)\n')
+            for g in range(0, 100):
+                fh.write(u'{:.1f}\t{:.6f}\t{:.6f}\n'.format(g, max(0, 1 - abs(g - 45) / 20.0) / 20.0, max(0, 1 - abs(g - 41) / 20.0) / 20.0))
+
+
+def samtools(outdir, num_samples, rng):
+    """ samtools stats output """
+    for s_name in sample_names(num_samples):
+        total = rng.randint(1000000, 50000000)
+        mapped = int(total * rng.uniform(0.8, 0.99))
+        sn = [
+            ('raw total sequences', total),
+            ('filtered sequences', 0),
+            ('sequences', total),
+            ('is sorted', 1),
+            ('1st fragments', total // 2),
+            ('last fragments', total // 2),
+            ('reads mapped', mapped),
+            ('reads mapped and paired', mapped - 1000),
+            ('reads unmapped', total - mapped),
+            ('reads properly paired', mapped - 5000),
+            ('reads paired', total),
+            ('reads duplicated', int(total * rng.uniform(0.05, 0.3))),
+            ('reads MQ0', rng.randint(1000, 100000)),
+            ('reads QC failed', 0),
+            ('non-primary alignments', rng.randint(1000, 100000)),
+            ('total length', total * 101),
+            ('bases mapped', mapped * 101),
+            ('bases mapped (cigar)', mapped * 100),
+            ('bases trimmed', 0),
+            ('bases duplicated', 0),
+            ('mismatches', mapped),
+            ('error rate', '{:.6e}'.format(rng.uniform(0.001, 0.01))),
+            ('average length', 101),
+            ('maximum length', 101),
+            ('average quality', '{:.1f}'.format(rng.uniform(30, 38))),
+            ('insert size average', '{:.1f}'.format(rng.uniform(250, 350))),
+            ('insert size standard deviation', '{:.1f}'.format(rng.uniform(50, 80))),
+            ('inward oriented pairs', mapped // 2 - 1000),
+            ('outward oriented pairs', 500),
+            ('pairs with other orientation', 100),
+            ('pairs on different chromosomes', 400),
+        ]
+        with io.open(os.path.join(outdir, '{}.stats'.format(s_name)), 'w') as fh:
+            fh.write(u'# This file was produced by samtools stats (1.3+htslib-1.3) and can be plotted using plot-bamstats\n')
+            fh.write(u'# The command line was:  stats {}.bam\n'.format(s_name))
+            fh.write(u'# Summary Numbers. Use `grep ^SN | cut -f 2-` to extract this part.\n')
+            for k, v in sn:
+                fh.write(u'SN\t{}:\t{}\n'.format(k, v))
+
+
+def salmon(outdir, num_samples, rng):
+    """ Salmon quant directories: aux_info/meta_info.json, GC and sequence
+    bias models and libParams/flenDist.txt """
+    nrow, ncol = 3, 25
+    context_length = 21
+    for s_name in sample_names(num_samples):
+        s_dir = os.path.join(outdir, s_name)
+        os.makedirs(os.path.join(s_dir, 'aux_info'))
+        os.makedirs(os.path.join(s_dir, 'libParams'))
+        processed = rng.randint(1000000, 50000000)
+        mapped = int(processed * rng.uniform(0.6, 0.95))
+        meta = {
+            'salmon_version': '0.8.2',
+            'samp_type': 'none',
+            'num_libraries': 1,
+            'library_types': ['ISR'],
+            'frag_dist_length': 1001,
+            'gc_bias_correct': True,
+            'seq_bias_correct': True,
+            'num_bias_bins': 4096,
+            'mapping_type': 'mapping',
+            'num_targets': 107389,
+            'num_bootstraps': 0,
+            'num_processed': processed,
+            'num_mapped': mapped,
+            'percent_mapped': 100.0 * mapped / processed,
+            'call': 'quant',
+        }
+        with io.open(os.path.join(s_dir, 'aux_info', 'meta_info.json'), 'w') as fh:
+            fh.write(u'{}\n'.format(json.dumps(meta, indent=4)))
+        with io.open(os.path.join(s_dir, 'cmd_info.json'), 'w') as fh:
+            fh.write(u'{}\n'.format(json.dumps({'salmon_version': '0.8.2', 'index': 'index', 'libType': 'A', 'gcBias': '', 'seqBias': '', 'output': s_name}, indent=4)))
+        # GC bias models, as written by salmon (native byte order)
+        for fn in ['obs_gc.gz', 'exp_gc.gz']:
+            weights = [ rng.uniform(0.2, 0.4) for _ in range(nrow) ]
+            model = [ rng.uniform(0.5, 1.5) for _ in range(nrow * ncol) ]
+            data = struct.pack('@i', 0) + struct.pack('@q', nrow) + struct.pack('@q', ncol)
+            data += struct.pack('@' + 'd' * nrow, *weights) + struct.pack('@' + 'd' * nrow * ncol, *model)
+            with gzip.open(os.path.join(s_dir, 'aux_info', fn), 'wb') as fh:
+                fh.write(data)
+        for fn in ['obs3_seq.gz', 'exp3_seq.gz', 'obs5_seq.gz', 'exp5_seq.gz']:
+            data = struct.pack('@iii', context_length, 0, 0)
+            data += struct.pack('@' + 'i' * context_length * 3, *([1] * context_length * 3))
+            data += struct.pack('@q', 4) + struct.pack('@q', 4)
+            data += struct.pack('@' + 'd' * 16, *[ rng.uniform(0.5, 1.5) for _ in range(16) ])
+            data += struct.pack('@ii', 4, context_length)
+            data += struct.pack('@' + 'd' * 4 * context_length, *[ rng.uniform(0.5, 1.5) for _ in range(4 * context_length) ])
+            with gzip.open(os.path.join(s_dir, 'aux_info', fn), 'wb') as fh:
+                fh.write(data)
+        mean_len = rng.uniform(150, 300)
+        with io.open(os.path.join(s_dir, 'libParams', 'flenDist.txt'), 'w') as fh:
+            fh.write(u'\t'.join([ '{:.6g}'.format(max(0, 1 - abs(i - mean_len) / 150.0) / 150.0) for i in range(1001) ]) + u'\n')
+
+
+def custom_content(outdir, num_samples, rng):
+    """ A single Custom Content table with one row per sample """
+    cols = ['Col_{}'.format(i) for i in range(10)]
+    with io.open(os.path.join(outdir, 'benchmark_table_mqc.tsv'), 'w') as fh:
+        fh.write(u'# id: \'benchmark_table\'\n# section_name: \'Benchmark table\'\n# plot_type: \'table\'\n')
+        fh.write(u'Sample\t' + u'\t'.join(cols) + u'\n')
+        for s_name in sample_names(num_samples):
+            fh.write(s_name + u'\t' + u'\t'.join([ '{:.4f}'.format(rng.uniform(0, 1000)) for _ in cols ]) + u'\n')
+
+
+generators = [
+    ('fastqc', fastqc),
+    ('picard', picard),
+    ('qualimap', qualimap),
+    ('samtools', samtools),
+    ('salmon', salmon),
+    ('custom_content', custom_content),
+]
+
+
+def generate(outdir, num_samples, modules=None, seed=1):
+    """ Write synthetic logs for num_samples samples to outdir, in one subdirectory per module """
+    for name, func in generators:
+        if modules is not None and name not in modules:
+            continue
+        mod_dir = os.path.join(outdir, name)
+        os.makedirs(mod_dir)
+        # Separate random generator for each tool, so results don't depend on which are made
+        func(mod_dir, num_samples, random.Random('{}-{}'.format(seed, name)))
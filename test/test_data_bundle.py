@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+""" Tests for writing and reading the SQLite data bundle """
+
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+import unittest
+
+from multiqc.utils import config, data_bundle
+
+
+class TestDataBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved_data_dir = getattr(config, 'data_dir', None)
+        config.data_dir = self.tmp_dir
+        self.fastqc = OrderedDict([
+            ('S1', OrderedDict([('total', 100), ('gc', 45.5), ('status', 'pass'), ('flags', [1, 2]), ('empty', None)])),
+            ('S2', OrderedDict([('total', 200), ('gc', 50.0), ('status', 'fail'), ('flags', {'a': 1}), ('empty', None)]))
+        ])
+        data_bundle.write_table('multiqc_fastqc', self.fastqc, module='fastqc')
+        data_bundle.write_table('multiqc_picard', { 'S1': { 'dups': 0.1 } }, module='picard')
+        data_bundle.write_sources({ 'FastQC': { 'all_sections': { 'S1': '/data/S1_fastqc.zip' } } })
+        data_bundle.write_plots({ 'plot_1': { 'plot_type': 'xy_line', 'datasets': [[{ 'name': 'S1', 'data': [[1, 2]] }]] } })
+
+    def tearDown(self):
+        config.data_dir = self.saved_data_dir
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        with data_bundle.DataBundle(self.tmp_dir) as bundle:
+            self.assertEqual(bundle.modules(), ['fastqc', 'picard'])
+            self.assertEqual(bundle.tables(), ['multiqc_fastqc', 'multiqc_picard'])
+            self.assertEqual(bundle.tables(module='picard'), ['multiqc_picard'])
+            self.assertEqual(bundle.samples('multiqc_fastqc'), ['S1', 'S2'])
+            self.assertEqual(bundle.get('multiqc_fastqc'), self.fastqc)
+            self.assertEqual(list(bundle.get('multiqc_fastqc')['S1'].keys()), list(self.fastqc['S1'].keys()))
+            self.assertEqual(bundle.get('multiqc_fastqc', sample='S2'), { 'S2': self.fastqc['S2'] })
+            self.assertEqual(bundle.sample('S1'), { 'multiqc_fastqc': self.fastqc['S1'], 'multiqc_picard': { 'dups': 0.1 } })
+            self.assertEqual(bundle.sample('S1', module='picard'), { 'multiqc_picard': { 'dups': 0.1 } })
+            self.assertEqual(bundle.sources(sample='S1'), [{ 'module': 'FastQC', 'section': 'all_sections', 'sample': 'S1', 'source': '/data/S1_fastqc.zip' }])
+            self.assertEqual(bundle.plots('xy_line'), ['plot_1'])
+            self.assertEqual(bundle.plot_data('plot_1')['datasets'], [[{ 'name': 'S1', 'data': [[1, 2]] }]])
+            self.assertRaises(KeyError, bundle.plot_data, 'missing')
+
+    def test_replace_table(self):
+        data_bundle.write_table('multiqc_picard', { 'S3': { 'dups': 0.3 } }, module='picard')
+        with data_bundle.DataBundle(data_bundle.get_bundle_fn()) as bundle:
+            self.assertEqual(bundle.get('multiqc_picard'), { 'S3': { 'dups': 0.3 } })
+
+    def test_copy_tables(self):
+        old_bundle = data_bundle.get_bundle_fn()
+        config.data_dir = os.path.join(self.tmp_dir, 'new')
+        os.makedirs(config.data_dir)
+        self.assertFalse(data_bundle.copy_tables(old_bundle, ['multiqc_missing']))
+        self.assertTrue(data_bundle.copy_tables(old_bundle, ['multiqc_fastqc']))
+        with data_bundle.DataBundle(config.data_dir) as bundle:
+            self.assertEqual(bundle.tables(), ['multiqc_fastqc'])
+            self.assertEqual(bundle.get('multiqc_fastqc'), self.fastqc)
+
+    def test_missing_bundle(self):
+        self.assertRaises(IOError, data_bundle.DataBundle, os.path.join(self.tmp_dir, 'missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+""" Tests for the file search: FileHead and SearchMatcher """
+
+import io
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from multiqc.utils import config, report
+
+
+class FileSearchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_file(self, fn, lines):
+        path = os.path.join(self.tmp_dir, fn)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(u''.join([ u'{}\n'.format(l) for l in lines ]))
+        return path
+
+
+class TestFileHead(FileSearchTestCase):
+
+    def test_only_keeps_buffered_lines(self):
+        lines = [ 'line {}'.format(i) for i in range(100) ]
+        head = report.FileHead(self.write_file('log.txt', lines), max_buffer=10)
+        try:
+            self.assertEqual([ l.strip() for l in head.lines(5) ], lines[:5])
+            self.assertEqual([ l.strip() for l in head.lines() ], lines)
+            self.assertEqual(len(head.read_lines), 10)
+            # Read again from the start after going past the buffer
+            self.assertEqual([ l.strip() for l in head.lines(20) ], lines[:20])
+            self.assertEqual([ l.strip() for l in head.lines() ], lines)
+        finally:
+            head.close()
+
+    def test_no_buffer(self):
+        lines = [ 'line {}'.format(i) for i in range(20) ]
+        head = report.FileHead(self.write_file('log.txt', lines), max_buffer=0)
+        try:
+            self.assertEqual([ l.strip() for l in head.lines(3) ], lines[:3])
+            self.assertEqual([ l.strip() for l in head.lines() ], lines)
+            self.assertEqual(head.read_lines, [])
+        finally:
+            head.close()
+
+    def test_short_file_is_read_once(self):
+        lines = [ 'a', 'b', 'c' ]
+        head = report.FileHead(self.write_file('log.txt', lines), max_buffer=10)
+        self.assertEqual([ l.strip() for l in head.lines() ], lines)
+        self.assertTrue(head.finished)
+        self.assertEqual([ l.strip() for l in head.lines() ], lines)
+
+
+class TestSearchMatcher(FileSearchTestCase):
+
+    def test_same_as_search_file(self):
+        spatterns = [{
+            'first': [{ 'contents': 'FIRST_LINE', 'num_lines': 2, 'shared': True }],
+            'last': [{ 'fn': '*.log', 'contents': 'LAST_LINE', 'shared': True }],
+            'name': [{ 'fn': 'name_*.txt' }]
+        }]
+        matcher = report.SearchMatcher(spatterns)
+        lines = [ 'FIRST_LINE' ] + [ 'filler' ] * 500 + [ 'LAST_LINE' ]
+        for fn, lines in [('a.log', lines), ('b.txt', lines), ('name_c.txt', ['x']), ('d.log', lines[1:])]:
+            self.write_file(fn, lines)
+            f = { 'fn': fn, 'root': self.tmp_dir }
+            expected = [ key for key, sps in spatterns[0].items() if report.search_file(sps[0], f) ]
+            self.assertEqual(sorted(matcher.search(f)), sorted(expected), fn)
+
+    def test_fn_pattern_not_hidden_by_ignore_contents(self):
+        spatterns = [{ 'zipped': [{ 'fn': '*.zip', 'contents': 'ZIP_LOG' }], 'any': [{ 'contents': 'ZIP_LOG', 'shared': True }] }]
+        matcher = report.SearchMatcher(spatterns, ignore_contents=['*.zip'])
+        self.write_file('log.zip', ['ZIP_LOG'])
+        self.assertEqual(matcher.search({ 'fn': 'log.zip', 'root': self.tmp_dir }), ['zipped'])
+        # A file name pattern that doesn't look like the ignored extension
+        matcher = report.SearchMatcher([{ 'log': [{ 'fn': 'log*', 'contents': 'ZIP_LOG' }] }], ignore_contents=['*.zip'])
+        self.assertEqual(matcher.search({ 'fn': 'log.zip', 'root': self.tmp_dir }), ['log'])
+        # Patterns with only contents don't open the file
+        spatterns = [{ 'any': [{ 'contents': 'ZIP_LOG' }] }]
+        matcher = report.SearchMatcher(spatterns, ignore_contents=['*.zip'])
+        self.assertEqual(matcher.search({ 'fn': 'log.zip', 'root': self.tmp_dir }), [])
+        self.assertEqual(matcher.opens_avoided, 1)
+
+    def test_fn_re_backreference(self):
+        spatterns = [{ 'mymod': [{ 'fn_re': r'^(\w+)_\1\.txt$' }], 'other': [{ 'fn_re': r'^(\d)\.log$' }] }]
+        matcher = report.SearchMatcher(spatterns)
+        for fn in ['ab_ab.txt', 'ab_cd.txt', '1.log']:
+            self.write_file(fn, ['x'])
+            f = { 'fn': fn, 'root': self.tmp_dir }
+            expected = [ key for key, sps in spatterns[0].items() if report.search_file(sps[0], f) ]
+            self.assertEqual(matcher.search(f), expected, fn)
+        self.assertEqual(matcher.search({ 'fn': 'ab_ab.txt', 'root': self.tmp_dir }), ['mymod'])
+
+    def test_candidate_keys(self):
+        spatterns = [{
+            'name': [{ 'fn': '*.log' }],
+            'contents': [{ 'contents': 'HELLO' }],
+            'both': [{ 'fn': 'mod_*', 'contents': 'HELLO' }]
+        }]
+        matcher = report.SearchMatcher(spatterns, ignore_contents=['*.bai'])
+        self.assertEqual(matcher.candidate_keys('a.log'), set(['name', 'contents']))
+        self.assertEqual(matcher.candidate_keys('mod_a.txt'), set(['both', 'contents']))
+        self.assertEqual(matcher.candidate_keys('mod_a.bai'), set(['both']))
+        self.assertEqual(matcher.candidate_keys('a.bai'), set())
+        # Everything that search() finds is a candidate
+        for fn in ['a.log', 'mod_a.txt', 'mod_a.bai', 'a.txt']:
+            self.write_file(fn, ['HELLO'])
+            found = matcher.search({ 'fn': fn, 'root': self.tmp_dir })
+            self.assertTrue(set(found).issubset(matcher.candidate_keys(fn)), fn)
+
+    def test_default_patterns_not_hidden_by_ignore_contents(self):
+        """ Every module search pattern with a file name finds the same files
+        with the default fn_ignore_contents as search_file() does without it """
+        for key, sps in config.sp.items():
+            if not isinstance(sps, list):
+                sps = [sps]
+            for sp in sps:
+                if sp.get('fn') is None:
+                    continue
+                # A file name that matches the glob
+                fn = re.sub(r'\[(.)[^\]]*\]', r'\1', sp['fn']).replace('*', 'x').replace('?', 'x')
+                for ignore_glob in config.fn_ignore_contents:
+                    # Also try the file name with each extension in fn_ignore_contents
+                    if sp['fn'].endswith('*'):
+                        fn_ignored = fn + ignore_glob.lstrip('*')
+                    else:
+                        fn_ignored = fn
+                    self.write_file(fn_ignored, [ sp.get('contents', 'x') ])
+                    f = { 'fn': fn_ignored, 'root': self.tmp_dir }
+                    matcher = report.SearchMatcher([{ key: [sp] }], ignore_contents=config.fn_ignore_contents)
+                    expected = [key] if report.search_file(sp, f) else []
+                    self.assertEqual(matcher.search(f), expected, '{}: {}'.format(key, fn_ignored))
+                    os.remove(os.path.join(self.tmp_dir, fn_ignored))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+""" Tests for the heatmap matrix and clustering """
+
+import unittest
+
+import numpy as np
+
+from multiqc.plots import heatmap
+
+
+class TestHeatmap(unittest.TestCase):
+
+    def test_heatmap_matrix(self):
+        matrix, present = heatmap.heatmap_matrix([[1, 2, 3], [4, None], [5, 6, 7]])
+        self.assertEqual(matrix.shape, (3, 3))
+        self.assertEqual(matrix[0].tolist(), [1, 2, 3])
+        self.assertTrue(np.isnan(matrix[1, 1]))
+        self.assertEqual(present.tolist(), [[True, True, True], [True, True, False], [True, True, True]])
+        self.assertEqual(heatmap.matrix_triples(matrix, present)[:4], [[0, 0, 1.0], [1, 0, 2.0], [2, 0, 3.0], [0, 1, 4.0]])
+
+    def test_cluster_order_groups_similar_rows(self):
+        # Two groups of rows, interleaved
+        rng = np.random.RandomState(1)
+        vals = np.vstack([ rng.normal(0 if i % 2 == 0 else 10, 0.1, 5) for i in range(10) ])
+        order = heatmap.cluster_order(vals)
+        self.assertEqual(sorted(order.tolist()), list(range(10)))
+        groups = [ i % 2 for i in order ]
+        self.assertIn(groups, [[0] * 5 + [1] * 5, [1] * 5 + [0] * 5])
+
+    def test_cluster_order_small(self):
+        self.assertEqual(heatmap.cluster_order(np.zeros((2, 3))).tolist(), [0, 1])
+
+    def test_cluster_matrix_max(self):
+        vals = np.array([[0.0], [10.0], [0.1], [10.1]])
+        present = np.ones(vals.shape, dtype=bool)
+        matrix, present, xcats, ycats = heatmap.cluster_matrix(vals, present, ['x'], ['a', 'b', 'c', 'd'])
+        self.assertIn(set(ycats[:2]), [set(['a', 'c']), set(['b', 'd'])])
+        # Too many rows to cluster, the order is kept
+        matrix, present, xcats, ycats = heatmap.cluster_matrix(vals, present, ['x'], ['a', 'b', 'c', 'd'], cluster_max=3)
+        self.assertEqual(ycats, ['a', 'b', 'c', 'd'])
+        self.assertEqual(matrix.tolist(), vals.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
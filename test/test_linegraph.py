@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+""" Tests for downsampling long line graph series """
+
+import unittest
+
+import numpy as np
+
+from multiqc.plots import linegraph
+
+
+class TestDownsample(unittest.TestCase):
+
+    def setUp(self):
+        x = np.arange(5000, dtype=float)
+        self.x = x
+        self.y = np.sin(x / 100.0) * 100 + (x % 7)
+        self.pairs = [ [int(a), float(b)] for a, b in zip(self.x, self.y) ]
+
+    def check_indices(self, idx, n, numpoints):
+        self.assertLessEqual(len(idx), numpoints)
+        self.assertEqual(idx[0], 0)
+        self.assertEqual(idx[-1], n - 1)
+        # Sorted without duplicates
+        self.assertTrue((np.diff(idx) > 0).all())
+
+    def test_lttb_indices(self):
+        for numpoints in [3, 4, 5, 10, 999, 1000]:
+            idx = linegraph.lttb_indices(self.x, self.y, numpoints)
+            self.check_indices(idx, len(self.y), numpoints)
+        self.assertEqual(len(linegraph.lttb_indices(self.x, self.y, 1000)), 1000)
+
+    def test_minmax_indices(self):
+        for numpoints in [3, 4, 5, 10, 999, 1000]:
+            idx = linegraph.minmax_indices(self.x, self.y, numpoints)
+            self.check_indices(idx, len(self.y), numpoints)
+        # Keeps the highest and lowest points
+        idx = linegraph.minmax_indices(self.x, self.y, 100)
+        self.assertIn(int(np.argmax(self.y)), idx)
+        self.assertIn(int(np.argmin(self.y)), idx)
+
+    def test_short_series_unchanged(self):
+        for method in ['lttb', 'minmax']:
+            self.assertEqual(linegraph.downsample_pairs(self.pairs[:10], 10, method), self.pairs[:10])
+
+    def test_downsample_pairs(self):
+        for method in ['lttb', 'minmax']:
+            ds = linegraph.downsample_pairs(self.pairs, 500, method)
+            self.assertLessEqual(len(ds), 500)
+            self.assertEqual(ds[0], self.pairs[0])
+            self.assertEqual(ds[-1], self.pairs[-1])
+            for pair in ds:
+                self.assertIn(pair, self.pairs)
+        # Series that aren't all numbers are left alone
+        pairs = [ [i, 'a'] for i in range(10) ]
+        self.assertEqual(linegraph.downsample_pairs(pairs, 5), pairs)
+
+    def test_downsample_plot_keeps_plot_data(self):
+        pdata = { 'plot_type': 'xy_line', 'config': { 'downsample_points': 100 },
+                  'datasets': [[ { 'name': 'a', 'data': self.pairs }, { 'name': 'b', 'data': self.pairs[:10] } ]] }
+        ds, num_downsampled = linegraph.downsample_plot(pdata)
+        self.assertEqual(num_downsampled, 1)
+        self.assertEqual(len(ds['datasets'][0][0]['data']), 100)
+        self.assertEqual(ds['datasets'][0][1]['data'], self.pairs[:10])
+        self.assertEqual(len(pdata['datasets'][0][0]['data']), len(self.pairs))
+        pdata['config']['downsample_points'] = False
+        self.assertIs(linegraph.downsample_plot(pdata)[0], pdata)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+""" Tests for the table colour scales """
+
+import unittest
+
+import numpy as np
+import spectra
+
+from multiqc.utils import mqc_colour
+
+
+def spectra_colour(scale, val):
+    """ Colour from spectra, as get_colour() used to work it out """
+    domain_nums = list( np.linspace(scale.minval, scale.maxval, len(scale.colours)) )
+    my_scale = spectra.scale(scale.colours).domain(domain_nums)
+    rgb_converter = lambda x: max(0, min(1, 1+((x-1)*0.3)))
+    return spectra.rgb( *[rgb_converter(v) for v in my_scale(val).rgb] ).hexcode
+
+
+class TestColourScale(unittest.TestCase):
+
+    def test_same_as_spectra(self):
+        for name, minval, maxval in [('GnBu', 0, 100), ('RdYlGn-rev', 0, 1), ('Set1', 10, 250), ('Blues', 3, 3)]:
+            scale = mqc_colour.mqc_colour_scale(name, minval, maxval)
+            vals = list(np.linspace(scale.minval, scale.maxval, 501)) + scale.domain
+            expected = [ spectra_colour(scale, v) for v in vals ]
+            self.assertEqual(scale.interpolate_array(vals), expected, name)
+            self.assertEqual([ scale.interpolate(v) for v in vals ], expected, name)
+
+    def test_out_of_domain(self):
+        scale = mqc_colour.mqc_colour_scale('GnBu', 0, 100)
+        self.assertEqual(scale.interpolate_array([-1, 50, 101]), ['', spectra_colour(scale, 50), ''])
+
+    def test_get_colour_list(self):
+        scale = mqc_colour.mqc_colour_scale('GnBu', 0, 100)
+        vals = [ 5, '50%', 'abc', None, 150, 5 ]
+        self.assertEqual(scale.get_colour_list(vals), [ scale.get_colour(v) for v in vals ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+""" Tests for compressing the plot data in the report """
+
+import base64
+import json
+import unittest
+import zlib
+
+import lzstring
+
+from multiqc.utils import report
+
+
+class TestPlotCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_plot_data = report.plot_data
+        report.plot_data = {
+            'bars': { 'plot_type': 'bar_graph', 'samples': [u'sample "1"', u'sämple NaN'], 'datasets': [[1, 2.5, None]] },
+            'nan': { 'plot_type': 'scatter', 'datasets': [[ { 'x': float('nan'), 'y': float('inf'), 'name': 'NaN' } ]] }
+        }
+
+    def tearDown(self):
+        report.plot_data = self.saved_plot_data
+
+    def test_zlib_round_trip(self):
+        json_len, compressed, num_downsampled = report.compress_plot('bars', 'zlib')
+        json_string = zlib.decompress(base64.b64decode(compressed)).decode('utf-8')
+        self.assertEqual(len(json_string), json_len)
+        self.assertEqual(json.loads(json_string), report.plot_data['bars'])
+        self.assertEqual(num_downsampled, 0)
+
+    def test_lzstring_round_trip(self):
+        json_len, compressed, num_downsampled = report.compress_plot('bars', 'lzstring')
+        self.assertEqual(json.loads(lzstring.LZString().decompressFromBase64(compressed)), report.plot_data['bars'])
+
+    def test_nan_is_null(self):
+        compressed = report.compress_plot('nan', 'zlib')[1]
+        data = json.loads(zlib.decompress(base64.b64decode(compressed)).decode('utf-8'))
+        self.assertEqual(data['datasets'][0][0], { 'x': None, 'y': None, 'name': 'NaN' })
+
+    def test_compress_plot_data(self):
+        compressed = report.compress_plot_data('zlib')
+        self.assertEqual(sorted(compressed.keys()), ['bars', 'nan'])
+        self.assertEqual(compressed['bars'], report.compress_plot('bars', 'zlib')[1])
+        self.assertEqual(report.compress_json(report.plot_data['bars'], 'zlib'), compressed['bars'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+""" Tests for the on-disk file search cache """
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from multiqc.utils import search_cache
+
+
+class TestSearchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_fn = os.path.join(self.tmp_dir, 'cache.db')
+        self.spatterns = [{ 'mod': [{ 'fn': '*.log' }] }]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def num_rows(self):
+        conn = sqlite3.connect(self.cache_fn)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_round_trip(self):
+        cache = search_cache.SearchCache(self.spatterns, self.cache_fn)
+        self.assertIsNone(cache.get('/a.log', 10, 1.0))
+        cache.add('/a.log', 10, 1.0, ['mod'])
+        cache.save()
+        cache.close()
+        cache = search_cache.SearchCache(self.spatterns, self.cache_fn)
+        self.assertEqual(cache.get('/a.log', 10, 1.0), ['mod'])
+        self.assertIsNone(cache.get('/a.log', 11, 1.0))
+        cache.close()
+
+    def test_old_entries_are_pruned(self):
+        cache = search_cache.SearchCache(self.spatterns, self.cache_fn, max_age=1)
+        cache.add('/old.log', 10, 1.0, ['mod'])
+        cache.add('/used.log', 10, 1.0, ['mod'])
+        cache.save()
+        # Pretend that both were last used two days ago
+        conn = cache.connect()
+        with conn:
+            conn.execute('UPDATE search_cache SET used = ?', (time.time() - 2 * 86400,))
+        cache.get('/used.log', 10, 1.0)
+        cache.save()
+        cache.close()
+        self.assertEqual(self.num_rows(), 1)
+        cache = search_cache.SearchCache(self.spatterns, self.cache_fn)
+        self.assertEqual(cache.get('/used.log', 10, 1.0), ['mod'])
+        cache.close()
+
+    def test_close_closes_all_threads(self):
+        cache = search_cache.SearchCache(self.spatterns, self.cache_fn)
+        threads = [ threading.Thread(target=cache.get, args=('/a.log', 1, 1.0)) for i in range(3) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(cache.connections), 4)
+        conns = list(cache.connections)
+        cache.close()
+        for conn in conns:
+            self.assertRaises(sqlite3.ProgrammingError, conn.execute, 'SELECT 1')
+
+
+if __name__ == '__main__':
+    unittest.main()